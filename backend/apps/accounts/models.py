@@ -21,6 +21,9 @@ class User(AbstractUser):
     
     class Meta:
         db_table = 'users'
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='users_created_id_idx'),
+        ]
     
     def __str__(self):
         return f"{self.username} ({self.role})"
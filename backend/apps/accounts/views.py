@@ -8,6 +8,7 @@ from django.db.models import Q
 from .models import User
 from .serializers import UserSerializer, RegisterSerializer, UserUpdateSerializer
 from .permissions import IsAdminOnly
+from supermarket_analysis.pagination import UserPagination
 
 
 @api_view(['POST'])
@@ -85,6 +86,7 @@ class UserListCreateView(generics.ListCreateAPIView):
     queryset = User.objects.select_related('shop').all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated, IsAdminOnly]
+    pagination_class = UserPagination
     
     def get_queryset(self):
         """
@@ -114,7 +116,7 @@ class UserListCreateView(generics.ListCreateAPIView):
                 Q(username__icontains=search) | Q(email__icontains=search)
             )
         
-        return queryset.order_by('-created_at')
+        return queryset.order_by('-created_at', '-id')
     
     def get_serializer_class(self):
         """
@@ -1,20 +1,26 @@
 """
 Alert generation logic
 """
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 from .models import Alert
 from apps.inventory.models import Stock
 
 
-def create_low_stock_alert(stock):
+# Alert types raised (and resolved) by stock levels
+STOCK_ALERT_TYPES = ['low_stock', 'stockout_risk']
+
+
+def get_low_stock_alert_details(stock):
     """
-    Create a low stock alert if stock is below threshold
+    Work out the alert a stock level should raise
     
     Args:
-        stock: Stock instance
+        stock: Stock instance (product and shop should already be loaded)
     
     Returns:
-        Alert instance or None
+        (alert_type, severity, message) tuple or None if stock is healthy
     """
     if stock.quantity > stock.min_threshold:
         return None
@@ -33,34 +39,124 @@ def create_low_stock_alert(stock):
         alert_type = 'low_stock'
         message = f"{stock.product.name} is below minimum threshold at {stock.shop.name} ({stock.quantity} units, threshold: {stock.min_threshold})"
     
-    # Check if similar alert already exists (not read)
-    existing_alert = Alert.objects.filter(
-        shop=stock.shop,
-        product=stock.product,
-        alert_type=alert_type,
+    return alert_type, severity, message
+
+
+def evaluate_low_stock_alerts(stocks):
+    """
+    Create or escalate low stock alerts for many stock records at once
+    
+    Existing unread alerts for all (shop, product) pairs are fetched in one
+    query, then new alerts are written with bulk_create and escalated ones
+    with bulk_update, so the cost does not grow with the number of stocks.
+    Unread stock alerts of records that are back above their threshold are
+    resolved (marked read) with one UPDATE.
+    
+    Args:
+        stocks: Iterable of Stock instances (with product and shop loaded)
+    
+    Returns:
+        List of Alert instances (new, escalated or already existing)
+    """
+    # Keep only the latest state of each (shop, product) pair
+    pending = {}
+    recovered = set()
+    for stock in stocks:
+        details = get_low_stock_alert_details(stock)
+        key = (stock.shop_id, stock.product_id)
+        if details:
+            pending[key] = (stock, details)
+            recovered.discard(key)
+        else:
+            pending.pop(key, None)
+            recovered.add(key)
+    
+    now = timezone.now()
+    if recovered:
+        recovered_q = Q()
+        for shop_id, product_id in recovered:
+            recovered_q |= Q(shop_id=shop_id, product_id=product_id)
+        Alert.objects.filter(recovered_q, alert_type__in=STOCK_ALERT_TYPES, is_read=False).update(
+            is_read=True, read_at=now
+        )
+    
+    if not pending:
+        return []
+    
+    # One query for every unread alert that could match
+    existing_alerts = {}
+    candidates = Alert.objects.filter(
+        shop_id__in={shop_id for shop_id, _ in pending},
+        product_id__in={product_id for _, product_id in pending},
+        alert_type__in={details[0] for _, details in pending.values()},
         is_read=False
-    ).first()
-    
-    if existing_alert:
-        # Update existing alert if severity increased
-        if severity == 'critical' and existing_alert.severity != 'critical':
-            existing_alert.severity = severity
-            existing_alert.message = message
-            existing_alert.created_at = timezone.now()  # Update timestamp
-            existing_alert.save()
-            return existing_alert
-        return existing_alert
-    
-    # Create new alert
-    alert = Alert.objects.create(
-        shop=stock.shop,
-        product=stock.product,
-        alert_type=alert_type,
-        message=message,
-        severity=severity
-    )
-    
-    return alert
+    ).order_by('-created_at')
+    for alert in candidates:
+        # Newest alert wins, same as .first() on the default ordering
+        existing_alerts.setdefault((alert.shop_id, alert.product_id, alert.alert_type), alert)
+    
+    alerts = []
+    to_create = []
+    to_update = []
+    
+    for (shop_id, product_id), (stock, (alert_type, severity, message)) in pending.items():
+        existing_alert = existing_alerts.get((shop_id, product_id, alert_type))
+        
+        if existing_alert:
+            # Update existing alert if severity increased
+            if severity == 'critical' and existing_alert.severity != 'critical':
+                existing_alert.severity = severity
+                existing_alert.message = message
+                existing_alert.created_at = now  # Update timestamp
+                to_update.append(existing_alert)
+            alerts.append(existing_alert)
+            continue
+        
+        alert = Alert(
+            shop_id=shop_id,
+            product_id=product_id,
+            alert_type=alert_type,
+            message=message,
+            severity=severity
+        )
+        to_create.append(alert)
+        alerts.append(alert)
+    
+    if to_create:
+        Alert.objects.bulk_create(to_create)
+    if to_update:
+        Alert.objects.bulk_update(to_update, ['severity', 'message', 'created_at'])
+    
+    return alerts
+
+
+def schedule_low_stock_alerts(stocks):
+    """
+    Evaluate low stock alerts once the current transaction commits
+    
+    Nothing is written if the transaction rolls back, and the alert
+    queries run after the stock row locks have been released.
+    
+    Args:
+        stocks: Iterable of Stock instances changed in the transaction
+    """
+    stocks = list(stocks)
+    if stocks:
+        transaction.on_commit(lambda: evaluate_low_stock_alerts(stocks))
+
+
+def create_low_stock_alert(stock):
+    """
+    Create a low stock alert if stock is below threshold
+    
+    Args:
+        stock: Stock instance
+    
+    Returns:
+        Alert instance or None
+    """
+    alerts = evaluate_low_stock_alerts([stock])
+    return alerts[0] if alerts else None
 
 
 def check_and_create_stock_alerts(shop=None, product=None):
@@ -74,25 +170,12 @@ def check_and_create_stock_alerts(shop=None, product=None):
     Returns:
         List of created alerts
     """
-    alerts_created = []
-    
-    # Build query
-    stocks = Stock.objects.select_related('shop', 'product').all()
+    # Only low stock can raise an alert; stocks_low_stock_idx finds those rows
+    stocks = Stock.objects.select_related('shop', 'product').low_stock()
     
     if shop:
         stocks = stocks.filter(shop=shop)
     if product:
         stocks = stocks.filter(product=product)
     
-    # Check each stock
-    for stock in stocks:
-        if stock.quantity <= stock.min_threshold:
-            alert = create_low_stock_alert(stock)
-            if alert:
-                alerts_created.append(alert)
-    
-    return alerts_created
-
-
-
-
+    return evaluate_low_stock_alerts(stocks)
@@ -0,0 +1,154 @@
+"""
+Combined dashboard summary (one request instead of six)
+"""
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection
+from django.db.models import Count, Q
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from apps.shops.models import Shop
+from apps.products.models import Category, Product
+from apps.sales.reports import (
+    get_shop_scope,
+    get_report_range,
+    get_top_products_limit,
+    invalid_date_response,
+    invalid_limit_response,
+    invalid_period_response,
+    build_sales_report,
+    build_payment_methods_report,
+    build_top_products_report,
+)
+from apps.sales.rollups import REPORT_PERIODS
+from apps.sales.report_cache import cached_report
+from .models import Alert
+
+
+def run_in_own_connection(func):
+    """
+    Wrap a section so the worker thread closes its database connection when done
+    """
+    def wrapper():
+        try:
+            return func()
+        finally:
+            connection.close()
+    return wrapper
+
+
+def run_sections(sections):
+    """
+    Run independent dashboard sections concurrently
+    
+    Each section runs in a worker thread with its own database connection,
+    so total latency is that of the slowest section. Inside an open
+    transaction (e.g. ATOMIC_REQUESTS or tests) the sections run in order
+    instead, since other connections cannot see uncommitted rows.
+    
+    Args:
+        sections: Dict of name -> zero-argument callable
+    
+    Returns:
+        Dict of name -> section result
+    """
+    if connection.in_atomic_block or len(sections) < 2:
+        return {name: func() for name, func in sections.items()}
+    
+    with ThreadPoolExecutor(max_workers=len(sections)) as executor:
+        futures = {
+            name: executor.submit(run_in_own_connection(func))
+            for name, func in sections.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+
+def get_alert_counts(shop_q):
+    """Unread alert counts by severity in one query"""
+    return Alert.objects.filter(shop_q, is_read=False).aggregate(
+        unread=Count('id'),
+        **{
+            severity: Count('id', filter=Q(severity=severity))
+            for severity, _ in Alert.SEVERITY_CHOICES
+        }
+    )
+
+
+def get_catalog_counts():
+    """Shop, category and product totals"""
+    return {
+        'shops': Shop.objects.count(),
+        'categories': Category.objects.count(),
+        'products': Product.objects.count(),
+    }
+
+
+class DashboardSummaryView(APIView):
+    """
+    Everything the dashboard needs in a single round trip
+    
+    GET /api/analytics/dashboard/?period=daily&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD&shop_id=1&limit=5
+    
+    Dates, role scoping and shop filter are resolved once and shared by the
+    period series, payment mix, top products and alert counts. Sales sections
+    are null for staff, matching the permissions of the report endpoints.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        period = request.query_params.get('period', 'daily')
+        
+        if period not in REPORT_PERIODS:
+            return invalid_period_response()
+        
+        try:
+            limit = get_top_products_limit(request.query_params.get('limit', None), default=5)
+        except ValueError:
+            return invalid_limit_response()
+        
+        try:
+            start_date, end_date = get_report_range(
+                period,
+                request.query_params.get('start_date', None),
+                request.query_params.get('end_date', None)
+            )
+        except ValueError:
+            return invalid_date_response()
+        
+        shop_q = get_shop_scope(request)
+        
+        sections = {
+            'counts': get_catalog_counts,
+            'alerts': lambda: get_alert_counts(shop_q),
+        }
+        
+        if request.user.role in ['admin', 'sales_manager']:
+            # The period series shares cache entries with SalesReportView; the
+            # other sections default to the period's range, unlike their endpoints
+            sections.update({
+                'sales': lambda: cached_report(
+                    request, 'sales', start_date, end_date,
+                    lambda: build_sales_report(period, shop_q, start_date, end_date),
+                    period=period, fill_gaps=False
+                ),
+                'payment_methods': lambda: cached_report(
+                    request, 'dashboard_payment_methods', start_date, end_date,
+                    lambda: build_payment_methods_report(shop_q, start_date, end_date),
+                    period=period
+                ),
+                'top_products': lambda: cached_report(
+                    request, 'dashboard_top_products', start_date, end_date,
+                    lambda: build_top_products_report(shop_q, start_date, end_date, limit),
+                    period=period, limit=limit
+                ),
+            })
+        
+        results = run_sections(sections)
+        
+        return Response({
+            'counts': results['counts'],
+            'alerts': results['alerts'],
+            'sales': results.get('sales'),
+            'payment_methods': results.get('payment_methods', []),
+            'top_products': results.get('top_products', []),
+        })
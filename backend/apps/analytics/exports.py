@@ -0,0 +1,126 @@
+"""
+Streaming exports of sales data
+"""
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
+from apps.sales.models import SaleItem
+from apps.sales.permissions import IsSalesManagerOrAdmin
+from apps.sales.reports import parse_report_date
+from .renderers import CSVRenderer, NDJSONRenderer
+
+
+# (column name, SaleItem lookup) for every exported line item row
+EXPORT_COLUMNS = [
+    ('sale_id', 'sale_id'),
+    ('transaction_date', 'sale__transaction_date'),
+    ('shop_id', 'sale__shop_id'),
+    ('shop_name', 'sale__shop__name'),
+    ('staff_id', 'sale__staff_id'),
+    ('payment_method', 'sale__payment_method'),
+    ('product_id', 'product_id'),
+    ('product_name', 'product__name'),
+    ('quantity', 'quantity'),
+    ('unit_price', 'unit_price'),
+    ('subtotal', 'subtotal'),
+    ('sale_discount', 'sale__discount'),
+    ('sale_tax', 'sale__tax'),
+    ('sale_final_amount', 'sale__final_amount'),
+]
+
+
+class Echo:
+    """
+    File-like object that hands back what is written to it,
+    so csv.writer output can be yielded row by row
+    """
+    
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, names=None):
+    """
+    Yield CSV lines (header first) for an iterable of value tuples
+    
+    names defaults to the sales export columns.
+    """
+    names = names or [name for name, _ in EXPORT_COLUMNS]
+    writer = csv.writer(Echo())
+    yield writer.writerow(names)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(rows, names=None):
+    """
+    Yield one JSON object per line for an iterable of value tuples
+    
+    names defaults to the sales export columns.
+    """
+    names = names or [name for name, _ in EXPORT_COLUMNS]
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+class SalesExportView(APIView):
+    """
+    Stream sales line items as flat CSV or NDJSON rows
+    
+    GET /api/analytics/export-sales-data/?format=csv|ndjson&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD&shop_id=1&product_id=1
+    
+    Rows are read through a server-side cursor and written as they arrive,
+    so memory use stays flat however many years of history are exported.
+    """
+    permission_classes = [IsAuthenticated, IsSalesManagerOrAdmin]
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+    
+    CHUNK_SIZE = 2000
+    
+    def get(self, request):
+        start_date = request.query_params.get('start_date', None)
+        end_date = request.query_params.get('end_date', None)
+        shop_id = request.query_params.get('shop_id', None)
+        product_id = request.query_params.get('product_id', None)
+        
+        queryset = SaleItem.objects.all()
+        
+        # Filter by user role
+        if request.user.role in ['sales_manager', 'staff'] and request.user.shop:
+            queryset = queryset.filter(sale__shop=request.user.shop)
+        
+        if shop_id:
+            queryset = queryset.filter(sale__shop_id=shop_id)
+        
+        if product_id:
+            queryset = queryset.filter(product_id=product_id)
+        
+        try:
+            if start_date:
+                queryset = queryset.filter(sale__transaction_date__gte=parse_report_date(start_date))
+            if end_date:
+                queryset = queryset.filter(sale__transaction_date__lte=parse_report_date(end_date))
+        except ValueError:
+            return Response(
+                {'error': 'Invalid date. Use YYYY-MM-DD or an ISO 8601 datetime.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        rows = queryset.order_by('sale__transaction_date', 'sale_id', 'id').values_list(
+            *[lookup for _, lookup in EXPORT_COLUMNS]
+        ).iterator(chunk_size=self.CHUNK_SIZE)
+        
+        if request.accepted_renderer.format == 'ndjson':
+            response = StreamingHttpResponse(stream_ndjson(rows), content_type='application/x-ndjson')
+            filename = 'sales_export.ndjson'
+        else:
+            response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv')
+            filename = 'sales_export.csv'
+        
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
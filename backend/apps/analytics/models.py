@@ -35,6 +35,7 @@ class Alert(models.Model):
         indexes = [
             models.Index(fields=['shop', 'is_read'], name='alerts_shop_read_idx'),
             models.Index(fields=['alert_type', 'severity'], name='alerts_type_severity_idx'),
+            models.Index(fields=['-created_at', '-id'], name='alerts_created_id_idx'),
         ]
     
     def __str__(self):
@@ -0,0 +1,70 @@
+"""
+Renderers for analytics exports and reports
+
+The export view streams its own response body; the CSV/NDJSON renderers let
+?format=csv / ?format=ndjson pass DRF content negotiation and render
+error payloads in the requested format.
+"""
+import csv
+import io
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Render a dict as key,value rows (used for error responses)
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return ''
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for key, value in data.items():
+            writer.writerow([key, value])
+        return buffer.getvalue()
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Render data as a single JSON line (used for error responses)
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return ''
+        return json.dumps(data, cls=DjangoJSONEncoder) + '\n'
+
+
+def to_columns(rows):
+    """
+    Turn a list of dicts into one list per key
+    
+    [{'a': 1, 'b': 2}, {'a': 3, 'b': 4}] -> {'a': [1, 3], 'b': [2, 4]}
+    """
+    if not rows:
+        return {}
+    return {key: [row[key] for row in rows] for key in rows[0]}
+
+
+class ColumnarRenderer(JSONRenderer):
+    """
+    JSON with the `data` rows of a report as one array per field
+    
+    Large reports are mostly repeated key names in row form; in columns each
+    key appears once and the period axis is shared by every metric.
+    """
+    format = 'columnar'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and isinstance(data.get('data'), list):
+            data = {**data, 'data': to_columns(data['data'])}
+        return super().render(data, accepted_media_type, renderer_context)
@@ -1,3 +1,228 @@
-from django.test import TestCase
+import csv
+import io
+import json
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from apps.inventory.models import Stock
+from apps.sales.tests import SalesFixtureMixin
+from .alerts import evaluate_low_stock_alerts, schedule_low_stock_alerts
+from .exports import EXPORT_COLUMNS
+from .models import Alert
 
-# Create your tests here.
+
+class SalesExportTests(SalesFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        self.first = self.sell([(self.products[0], 1), (self.products[1], 2)])
+        self.second = self.sell([(self.products[2], 3)], payment_method='card')
+        self.other_shop = self.sell([(self.products[0], 4)], shop=self.shops[1], user=self.south_staff)
+        self.api.force_authenticate(self.admin)
+    
+    def export(self, **params):
+        response = self.api.get('/api/analytics/export-sales-data/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+    
+    def test_csv_has_one_row_per_line_item(self):
+        rows = list(csv.DictReader(io.StringIO(self.export())))
+        
+        self.assertEqual(list(rows[0]), [name for name, _ in EXPORT_COLUMNS])
+        self.assertEqual(
+            [(int(row['sale_id']), int(row['product_id']), int(row['quantity'])) for row in rows],
+            [
+                (self.first.id, self.products[0].id, 1),
+                (self.first.id, self.products[1].id, 2),
+                (self.second.id, self.products[2].id, 3),
+                (self.other_shop.id, self.products[0].id, 4),
+            ]
+        )
+        self.assertEqual(rows[2]['payment_method'], 'card')
+        self.assertEqual(rows[1]['subtotal'], '20.00')
+    
+    def test_ndjson_has_one_object_per_line(self):
+        rows = [json.loads(line) for line in self.export(format='ndjson', product_id=self.products[0].id).splitlines()]
+        
+        self.assertEqual([row['sale_id'] for row in rows], [self.first.id, self.other_shop.id])
+        self.assertEqual(rows[1]['shop_name'], 'South')
+    
+    def test_manager_only_exports_own_shop(self):
+        self.api.force_authenticate(self.manager)
+        
+        rows = list(csv.DictReader(io.StringIO(self.export())))
+        
+        self.assertEqual({int(row['shop_id']) for row in rows}, {self.shops[0].id})
+    
+    def test_rejects_bad_dates_and_staff(self):
+        response = self.api.get('/api/analytics/export-sales-data/', {'start_date': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+        
+        self.api.force_authenticate(self.staff)
+        self.assertEqual(self.api.get('/api/analytics/export-sales-data/').status_code, 403)
+
+
+class DashboardTests(SalesFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        # Leaves 4 of product 0 in the first shop, below its threshold of 5
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sell([(self.products[0], 96), (self.products[1], 2)])
+        self.sell([(self.products[1], 1)], payment_method='card')
+        self.sell([(self.products[2], 7)], shop=self.shops[1], user=self.south_staff)
+    
+    def get_dashboard(self, user, **params):
+        self.api.force_authenticate(user)
+        response = self.api.get('/api/analytics/dashboard/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+    
+    def test_sections_for_admin(self):
+        data = self.get_dashboard(self.admin)
+        
+        self.assertEqual(data['counts'], {'shops': 2, 'categories': 1, 'products': 5})
+        self.assertEqual(data['alerts']['unread'], 1)
+        self.assertEqual(data['sales']['summary']['total_sales'], 3)
+        self.assertEqual(
+            {row['payment_method']: row['count'] for row in data['payment_methods'] if row['count']},
+            {'cash': 2, 'card': 1}
+        )
+        self.assertEqual(
+            [(row['product_id'], row['total_quantity']) for row in data['top_products']],
+            [(self.products[0].id, 96.0), (self.products[2].id, 7.0), (self.products[1].id, 3.0)]
+        )
+    
+    def test_sections_are_scoped_to_the_managers_shop(self):
+        data = self.get_dashboard(self.manager, limit=1)
+        
+        self.assertEqual(data['sales']['summary']['total_sales'], 2)
+        self.assertEqual(len(data['top_products']), 1)
+        self.assertEqual(data['alerts']['unread'], Alert.objects.filter(shop=self.shops[0]).count())
+    
+    def test_staff_get_no_sales_sections(self):
+        data = self.get_dashboard(self.staff)
+        
+        self.assertIsNone(data['sales'])
+        self.assertEqual(data['payment_methods'], [])
+        self.assertEqual(data['top_products'], [])
+        self.assertEqual(data['counts']['products'], 5)
+    
+    def test_rejects_bad_period(self):
+        self.api.force_authenticate(self.admin)
+        
+        self.assertEqual(self.api.get('/api/analytics/dashboard/', {'period': 'fortnightly'}).status_code, 400)
+    
+    def test_rejects_bad_limit_and_clamps_the_rest(self):
+        self.api.force_authenticate(self.admin)
+        
+        self.assertEqual(self.api.get('/api/analytics/dashboard/', {'limit': 'x'}).status_code, 400)
+        self.assertEqual(len(self.get_dashboard(self.admin, limit=-3)['top_products']), 1)
+        self.assertEqual(len(self.get_dashboard(self.admin, limit=10 ** 9)['top_products']), 3)
+
+
+class ConcurrentDashboardTests(SalesFixtureMixin, TransactionTestCase):
+    """Outside a transaction the sections run in worker threads"""
+    
+    def test_sections_from_worker_threads(self):
+        self.create_fixtures()
+        self.sell([(self.products[0], 6)])
+        self.assertFalse(connection.in_atomic_block)
+        self.api.force_authenticate(self.admin)
+        
+        data = self.api.get('/api/analytics/dashboard/').data
+        
+        self.assertEqual(data['sales']['summary']['total_sales'], 1)
+        self.assertEqual(data['top_products'][0]['total_quantity'], 6.0)
+        self.assertEqual(data['counts']['shops'], 2)
+
+
+class LowStockAlertTests(SalesFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        self.stocks = list(Stock.objects.select_related('shop', 'product').filter(shop=self.shops[0]).order_by('id'))
+    
+    def low(self, quantity):
+        for stock in self.stocks:
+            stock.quantity = quantity
+        return self.stocks
+    
+    def test_one_select_and_one_insert_per_batch(self):
+        with self.assertNumQueries(2):
+            alerts = evaluate_low_stock_alerts(self.low(3))
+        
+        self.assertEqual(len(alerts), 5)
+        self.assertEqual(set(Alert.objects.values_list('alert_type', 'severity')), {('low_stock', 'medium')})
+    
+    def test_reevaluating_does_not_duplicate(self):
+        evaluate_low_stock_alerts(self.low(3))
+        
+        with self.assertNumQueries(1):
+            evaluate_low_stock_alerts(self.low(4))
+        
+        self.assertEqual(Alert.objects.count(), 5)
+    
+    def test_stockout_escalates_in_one_update(self):
+        evaluate_low_stock_alerts(self.low(2))
+        
+        with self.assertNumQueries(2):
+            evaluate_low_stock_alerts(self.low(0))
+        
+        self.assertEqual(set(Alert.objects.values_list('alert_type', 'severity')), {('stockout_risk', 'critical')})
+        self.assertEqual(Alert.objects.count(), 5)
+    
+    def test_recovered_stock_resolves_its_alerts(self):
+        evaluate_low_stock_alerts(self.low(3))
+        other_shop = Stock.objects.select_related('shop', 'product').get(shop=self.shops[1], product=self.products[0])
+        other_shop.quantity = 1
+        evaluate_low_stock_alerts([other_shop])
+        
+        with self.assertNumQueries(1):
+            evaluate_low_stock_alerts(self.low(50))
+        
+        self.assertFalse(Alert.objects.filter(shop=self.shops[0], is_read=False).exists())
+        self.assertFalse(Alert.objects.get(shop=self.shops[1]).is_read)
+    
+    def test_checkout_alerts_once_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sell([(self.products[0], 96)])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sell([(self.products[0], 1)])
+        
+        alert = Alert.objects.get()
+        self.assertEqual((alert.product_id, alert.alert_type), (self.products[0].id, 'low_stock'))
+    
+    def test_restock_resolves_alert(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sell([(self.products[0], 96)])
+        stock = Stock.objects.get(shop=self.shops[0], product=self.products[0])
+        self.api.force_authenticate(self.manager)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api.patch(f'/api/inventory/stock/{stock.id}/', {'quantity': 60}, format='json')
+        
+        self.assertTrue(Alert.objects.get().is_read)
+    
+    def test_nothing_fires_on_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    schedule_low_stock_alerts(self.low(0))
+                    raise ValueError
+            except ValueError:
+                pass
+        
+        self.assertEqual(callbacks, [])
+        self.assertFalse(Alert.objects.exists())
+    
+    def test_failed_checkout_raises_no_alert(self):
+        self.api.force_authenticate(self.staff)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post('/api/sales/', {
+                'shop': self.shops[0].id, 'payment_method': 'cash', 'discount': '0', 'tax': '0',
+                'items': [
+                    {'product': self.products[0].id, 'quantity': 98, 'unit_price': '10.00'},
+                    {'product': self.products[1].id, 'quantity': 101, 'unit_price': '10.00'},
+                ],
+            }, format='json')
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Alert.objects.exists())
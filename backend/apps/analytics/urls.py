@@ -3,6 +3,8 @@ URL patterns for analytics app
 """
 from django.urls import path
 from .views import AlertListView, AlertMarkReadView, AlertMarkAllReadView
+from .exports import SalesExportView
+from .dashboard import DashboardSummaryView
 
 app_name = 'analytics'
 
@@ -15,6 +17,12 @@ urlpatterns = [
     
     # Mark all alerts as read
     path('alerts/mark-all-read/', AlertMarkAllReadView.as_view(), name='alert-mark-all-read'),
+    
+    # Streaming sales export (CSV / NDJSON)
+    path('analytics/export-sales-data/', SalesExportView.as_view(), name='export-sales-data'),
+    
+    # Combined dashboard summary
+    path('analytics/dashboard/', DashboardSummaryView.as_view(), name='dashboard-summary'),
 ]
 
 
@@ -8,6 +8,7 @@ from django.utils import timezone
 from .models import Alert
 from .serializers import AlertSerializer, AlertMarkReadSerializer
 from .permissions import CanViewAlerts
+from supermarket_analysis.pagination import AlertPagination
 
 
 class AlertListView(generics.ListAPIView):
@@ -19,6 +20,7 @@ class AlertListView(generics.ListAPIView):
     queryset = Alert.objects.select_related('shop', 'product', 'read_by').all()
     serializer_class = AlertSerializer
     permission_classes = [IsAuthenticated, CanViewAlerts]
+    pagination_class = AlertPagination
     
     def get_queryset(self):
         """
@@ -56,7 +58,7 @@ class AlertListView(generics.ListAPIView):
         if product_id:
             queryset = queryset.filter(product_id=product_id)
         
-        return queryset.order_by('-created_at')
+        return queryset.order_by('-created_at', '-id')
 
 
 class AlertMarkReadView(generics.GenericAPIView):
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Stock
+from .models import Stock, StockHistory, StockSnapshot
 
 
 @admin.register(Stock)
@@ -21,3 +21,28 @@ class StockAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(StockHistory)
+class StockHistoryAdmin(admin.ModelAdmin):
+    list_display = ['stock', 'change_type', 'previous_quantity', 'new_quantity', 'change', 'changed_by', 'created_at']
+    list_filter = ['change_type', 'stock__shop']
+    search_fields = ['stock__product__name', 'stock__shop__name']
+    date_hierarchy = 'created_at'
+    
+    # The ledger is append-only
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['stock', 'quantity', 'taken_at']
+    list_filter = ['stock__shop']
+    date_hierarchy = 'taken_at'
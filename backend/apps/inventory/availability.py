@@ -0,0 +1,87 @@
+"""
+In-process cache of stock quantities for availability lookups
+
+Billing screens poll quantities for the products on a bill; those reads are
+served from the 'availability' cache and only missing entries are loaded,
+in one query. Every stock write drops its (shop, product) entries once the
+transaction commits, so the next read sees the committed quantity.
+
+Entries are dropped rather than overwritten with the new value: commit
+callbacks of concurrent writers can run in either order, and a late
+callback must not put back an older quantity. The cache is per process, so
+writes made by other workers are only picked up when AVAILABILITY_CACHE_TTL
+expires; checkout itself always re-reads stock from the database.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from .models import Stock
+
+
+CACHE_ALIAS = 'availability'
+
+# Seconds an entry may be served; bounds staleness across worker processes
+TTL = getattr(settings, 'AVAILABILITY_CACHE_TTL', 30)
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def availability_key(shop_id, product_id):
+    return f'avail:{shop_id}:{product_id}'
+
+
+def get_availability(shop_id, product_ids):
+    """
+    Current quantity of each product in a shop
+    
+    Args:
+        shop_id: Shop ID
+        product_ids: Iterable of product IDs
+    
+    Returns:
+        Dict of product_id -> quantity; products the shop has no stock
+        record for are reported (and cached) as 0
+    """
+    cache = get_cache()
+    product_ids = list(dict.fromkeys(product_ids))
+    keys = {availability_key(shop_id, product_id): product_id for product_id in product_ids}
+    
+    cached = cache.get_many(keys)
+    quantities = {keys[key]: quantity for key, quantity in cached.items()}
+    
+    missing = [product_id for product_id in product_ids if product_id not in quantities]
+    if missing:
+        loaded = dict.fromkeys(missing, 0)
+        loaded.update(
+            Stock.objects.filter(shop_id=shop_id, product_id__in=missing).values_list('product_id', 'quantity')
+        )
+        cache.set_many(
+            {availability_key(shop_id, product_id): quantity for product_id, quantity in loaded.items()},
+            TTL
+        )
+        quantities.update(loaded)
+    
+    return {product_id: quantities[product_id] for product_id in product_ids}
+
+
+def invalidate_availability(pairs):
+    """Drop cached quantities for (shop_id, product_id) pairs"""
+    get_cache().delete_many([availability_key(shop_id, product_id) for shop_id, product_id in set(pairs)])
+
+
+def schedule_availability_invalidation(stocks):
+    """
+    Drop the cached quantities of stock records once the current transaction commits
+    
+    Args:
+        stocks: Iterable of Stock instances written in the transaction
+    """
+    pairs = [(stock.shop_id, stock.product_id) for stock in stocks]
+    if pairs:
+        transaction.on_commit(lambda: invalidate_availability(pairs))
+
+
+def clear_availability_cache():
+    get_cache().clear()
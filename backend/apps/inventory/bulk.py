@@ -0,0 +1,219 @@
+"""
+Bulk stock adjustments (stock-takes)
+
+A whole stock-take is validated in one pass against rows fetched with a
+handful of queries, and written with one bulk UPDATE (plus one INSERT for
+products the shop did not stock yet). Either every row is applied or none.
+"""
+import csv
+import io
+from django.db import transaction
+from django.utils import timezone
+from apps.shops.models import Shop
+from apps.products.models import Product
+from .models import Stock
+from .history import record_stock_changes
+from .availability import schedule_availability_invalidation
+
+
+# Quantities are counted values (stock-take) or signed changes
+MODE_SET = 'set'
+MODE_ADJUST = 'adjust'
+BULK_MODES = [MODE_SET, MODE_ADJUST]
+
+# Largest number of rows accepted in one request
+MAX_BULK_ROWS = 20000
+
+BULK_FIELDS = ['shop', 'product', 'quantity', 'min_threshold', 'max_capacity']
+
+
+def parse_csv_rows(upload):
+    """
+    Read stock rows from an uploaded CSV file
+    
+    The header names the columns; `shop_id` / `product_id` are accepted
+    for `shop` / `product`, and blank cells count as missing.
+    """
+    text = io.StringIO(upload.read().decode('utf-8-sig'))
+    rows = []
+    for row in csv.DictReader(text):
+        rows.append({
+            (name or '').strip().removesuffix('_id'): value.strip()
+            for name, value in row.items()
+            if value is not None and value.strip() != ''
+        })
+    return rows
+
+
+def parse_int(value):
+    """int() of a JSON number or CSV cell, rejecting fractions and booleans"""
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(value)
+        return int(value)
+    return int(value)
+
+
+def clean_rows(rows):
+    """
+    Convert raw rows to integers
+    
+    Returns:
+        (cleaned, errors): cleaned is a list of (row number, dict) for rows
+        that parsed, errors a list of {'row', 'errors'} dicts
+    """
+    cleaned = []
+    errors = []
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({'row': number, 'errors': {'non_field_errors': 'Each row must be an object.'}})
+            continue
+        
+        values = {}
+        row_errors = {}
+        for field in BULK_FIELDS:
+            value = row.get(field, row.get(f'{field}_id'))
+            if value is None or value == '':
+                if field in ['shop', 'product', 'quantity']:
+                    row_errors[field] = 'This field is required.'
+                continue
+            try:
+                values[field] = parse_int(value)
+            except (TypeError, ValueError):
+                row_errors[field] = 'A whole number is required.'
+        
+        if row_errors:
+            errors.append({'row': number, 'errors': row_errors})
+        else:
+            cleaned.append((number, values))
+    return cleaned, errors
+
+
+def bulk_adjust_stock(rows, user, mode=MODE_SET, notes=None):
+    """
+    Validate and apply many stock rows in one transaction
+    
+    Args:
+        rows: List of dicts with shop, product, quantity and optionally
+            min_threshold and max_capacity
+        user: Requesting user; sales managers may only touch their own shop
+        mode: MODE_SET (quantity is the counted level) or MODE_ADJUST
+            (quantity is added to the current level)
+        notes: Ledger note, defaults to "Bulk stock adjustment"
+    
+    Returns:
+        (result, errors): result holds the updated/created/unchanged counts
+        and is None when any row failed, in which case nothing was written
+    """
+    cleaned, errors = clean_rows(rows)
+    
+    with transaction.atomic():
+        shop_ids = {values['shop'] for _, values in cleaned}
+        product_ids = {values['product'] for _, values in cleaned}
+        
+        # Every row the request can touch, locked for the rest of the transaction.
+        # Locked in (shop_id, product_id) order like checkout and transfers
+        # (lock_stocks), not Stock's default name ordering, so they cannot deadlock
+        existing = {
+            (stock.shop_id, stock.product_id): stock
+            for stock in Stock.objects.select_for_update(of=('self',)).select_related('shop', 'product').filter(
+                shop_id__in=shop_ids, product_id__in=product_ids
+            ).order_by('shop_id', 'product_id')
+        }
+        shops = Shop.objects.in_bulk(shop_ids)
+        products = Product.objects.in_bulk(product_ids)
+        
+        seen = set()
+        plans = []
+        for number, values in cleaned:
+            key = (values['shop'], values['product'])
+            stock = existing.get(key)
+            row_errors = {}
+            
+            if key in seen:
+                row_errors['non_field_errors'] = 'Duplicate shop and product.'
+            seen.add(key)
+            
+            if values['shop'] not in shops:
+                row_errors['shop'] = 'Shop not found.'
+            elif user.role == 'sales_manager' and values['shop'] != user.shop_id:
+                row_errors['shop'] = 'You can only adjust stock for your own shop.'
+            if values['product'] not in products:
+                row_errors['product'] = 'Product not found.'
+            
+            current = stock.quantity if stock else 0
+            quantity = current + values['quantity'] if mode == MODE_ADJUST else values['quantity']
+            min_threshold = values.get('min_threshold', stock.min_threshold if stock else 0)
+            max_capacity = values.get('max_capacity', stock.max_capacity if stock else None)
+            
+            if quantity < 0:
+                row_errors['quantity'] = f'Quantity cannot go below zero (currently {current}).'
+            elif max_capacity is not None and quantity > max_capacity:
+                row_errors['quantity'] = f'Quantity cannot exceed maximum capacity of {max_capacity}.'
+            if min_threshold < 0:
+                row_errors['min_threshold'] = 'Ensure this value is greater than or equal to 0.'
+            elif max_capacity is not None and min_threshold > max_capacity:
+                row_errors['min_threshold'] = 'Minimum threshold cannot exceed maximum capacity.'
+            if max_capacity is not None and max_capacity < 0:
+                row_errors['max_capacity'] = 'Ensure this value is greater than or equal to 0.'
+            
+            if row_errors:
+                errors.append({'row': number, 'errors': row_errors})
+            else:
+                plans.append((key, stock, quantity, min_threshold, max_capacity))
+        
+        if errors:
+            errors.sort(key=lambda error: error['row'])
+            return None, errors
+        
+        now = timezone.now()
+        to_update = []
+        to_create = []
+        changes = []
+        unchanged = 0
+        for (shop_id, product_id), stock, quantity, min_threshold, max_capacity in plans:
+            if stock is None:
+                to_create.append(Stock(
+                    shop=shops[shop_id],
+                    product=products[product_id],
+                    quantity=quantity,
+                    min_threshold=min_threshold,
+                    max_capacity=max_capacity,
+                ))
+                continue
+            if (stock.quantity, stock.min_threshold, stock.max_capacity) == (quantity, min_threshold, max_capacity):
+                unchanged += 1
+                continue
+            changes.append((stock, stock.quantity))
+            stock.quantity = quantity
+            stock.min_threshold = min_threshold
+            stock.max_capacity = max_capacity
+            # bulk_update skips auto_now
+            stock.last_updated = now
+            to_update.append(stock)
+        
+        if to_update:
+            Stock.objects.bulk_update(
+                to_update, ['quantity', 'min_threshold', 'max_capacity', 'last_updated'], batch_size=1000
+            )
+        if to_create:
+            Stock.objects.bulk_create(to_create, batch_size=1000)
+            changes.extend((stock, None) for stock in to_create)
+        
+        record_stock_changes(changes, 'manual', changed_by=user, notes=notes or 'Bulk stock adjustment')
+        
+        touched = to_update + to_create
+        if touched:
+            from apps.analytics.alerts import schedule_low_stock_alerts
+            from apps.sales.report_cache import schedule_report_invalidation
+            schedule_low_stock_alerts(touched)
+            schedule_report_invalidation({stock.shop_id for stock in touched})
+            schedule_availability_invalidation(touched)
+    
+    return {
+        'updated': len(to_update),
+        'created': len(to_create),
+        'unchanged': unchanged,
+    }, []
@@ -0,0 +1,143 @@
+"""
+Stock movement ledger and point-in-time stock levels
+"""
+from datetime import datetime, timezone as dt_timezone
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import Stock, StockHistory, StockSnapshot
+
+
+def record_stock_changes(changes, change_type, reference_id=None, changed_by=None, notes=None):
+    """
+    Append ledger rows for stock records whose quantity was just changed
+    
+    Call inside the transaction that saved the new quantities; all rows are
+    written with a single INSERT.
+    
+    Args:
+        changes: Iterable of (stock, previous_quantity), stock.quantity
+            holding the new value. previous_quantity is None for a stock
+            record just created: its opening entry (from 0) is written even
+            when it opens empty, so stock_levels_at knows it existed.
+        change_type: One of StockHistory.CHANGE_TYPE_CHOICES
+        reference_id: Optional related Sale or Transfer ID
+        changed_by: Optional user who made the change
+        notes: Optional free text
+    """
+    created_at = timezone.now()
+    entries = [
+        StockHistory(
+            stock_id=stock.id,
+            previous_quantity=previous_quantity or 0,
+            new_quantity=stock.quantity,
+            change=stock.quantity - (previous_quantity or 0),
+            change_type=change_type,
+            reference_id=reference_id,
+            notes=notes,
+            changed_by=changed_by,
+            created_at=created_at,
+        )
+        for stock, previous_quantity in changes
+        if previous_quantity is None or stock.quantity != previous_quantity
+    ]
+    if entries:
+        StockHistory.objects.bulk_create(entries)
+
+
+def take_stock_snapshot(shop_id=None, batch_size=1000):
+    """
+    Copy the current quantity of every stock record into StockSnapshot
+    
+    The stock rows are locked (in the same shop, product order checkout and
+    transfers use) while they are read. Writers that already changed a row
+    commit first and are included; later writers wait and stamp their ledger
+    rows after taken_at. So every ledger row is either in the snapshot or
+    after it, which stock_levels_at relies on.
+    
+    Returns:
+        Number of snapshot rows written
+    """
+    stocks = Stock.objects.all()
+    if shop_id:
+        stocks = stocks.filter(shop_id=shop_id)
+    
+    with transaction.atomic():
+        quantities = list(
+            stocks.select_for_update(no_key=True).order_by('shop_id', 'product_id').values_list('id', 'quantity')
+        )
+        # Stamped after the read, once in-flight writers have committed
+        taken_at = timezone.now()
+        StockSnapshot.objects.bulk_create(
+            [StockSnapshot(stock_id=stock_id, quantity=quantity, taken_at=taken_at) for stock_id, quantity in quantities],
+            batch_size=batch_size
+        )
+    return len(quantities)
+
+
+def stock_levels_at(when, stocks=None):
+    """
+    Stock quantities as they were at a point in time
+    
+    Each stock record starts from its latest snapshot taken at or before
+    `when` and applies the ledger changes between that snapshot and `when`.
+    The snapshot is resolved once per stock and the ledger is joined on
+    (stock_id, created_at range), so only that slice of history is read
+    through stock_history_stock_time_idx. Records without a snapshot
+    (created later) start from zero, which their creation entry in the
+    ledger accounts for.
+    
+    Args:
+        when: Aware datetime
+        stocks: Optional Stock queryset to limit the result (default: all)
+    
+    Returns:
+        Dict of stock_id -> quantity at `when`, for stock records that existed then
+    """
+    if stocks is None:
+        stocks = Stock.objects.all()
+    
+    # Let the ORM compile the stock filters; the per-stock snapshot lookup
+    # and the range join are not expressible with it
+    scope_sql, scope_params = stocks.order_by().values('id').query.sql_with_params()
+    quote = connection.ops.quote_name
+    snapshots = quote(StockSnapshot._meta.db_table)
+    history = quote(StockHistory._meta.db_table)
+    
+    if connection.vendor == 'postgresql':
+        # One backward probe of the (stock, taken_at) index per stock
+        latest_snapshot = (
+            f'SELECT scope.id AS stock_id, latest.quantity, latest.taken_at FROM scope '
+            f'LEFT JOIN LATERAL (SELECT quantity, taken_at FROM {snapshots} '
+            f'WHERE stock_id = scope.id AND taken_at <= %s ORDER BY taken_at DESC LIMIT 1) AS latest ON TRUE'
+        )
+    else:
+        latest_snapshot = (
+            f'SELECT scope.id AS stock_id, s.quantity, s.taken_at FROM scope '
+            f'LEFT JOIN {snapshots} AS s ON s.stock_id = scope.id AND s.taken_at = '
+            f'(SELECT MAX(taken_at) FROM {snapshots} WHERE stock_id = scope.id AND taken_at <= %s)'
+        )
+    
+    sql = (
+        f'WITH scope (id) AS ({scope_sql}), snap AS ({latest_snapshot}) '
+        f'SELECT snap.stock_id, snap.quantity, SUM(h.change), COUNT(h.id) FROM snap '
+        f'LEFT JOIN {history} AS h ON h.stock_id = snap.stock_id '
+        f'AND h.created_at > COALESCE(snap.taken_at, %s) AND h.created_at <= %s '
+        f'GROUP BY snap.stock_id, snap.quantity'
+    )
+    adapt = connection.ops.adapt_datetimefield_value
+    params = (
+        *scope_params,
+        adapt(when),
+        adapt(datetime.min.replace(tzinfo=dt_timezone.utc)),
+        adapt(when),
+    )
+    
+    levels = {}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for stock_id, snapshot_quantity, change, change_count in cursor.fetchall():
+            # Neither a snapshot nor a ledger entry: the record did not exist yet
+            if snapshot_quantity is None and not change_count:
+                continue
+            levels[stock_id] = (snapshot_quantity or 0) + (change or 0)
+    return levels
@@ -0,0 +1,16 @@
+"""
+Snapshot current stock quantities for point-in-time stock queries
+"""
+from django.core.management.base import BaseCommand
+from apps.inventory.history import take_stock_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Copy every stock quantity into stock_snapshots (run periodically, e.g. nightly)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--shop-id', type=int, help='Only snapshot this shop')
+    
+    def handle(self, *args, **options):
+        written = take_stock_snapshot(shop_id=options['shop_id'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} stock snapshot rows.'))
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def take_initial_snapshot(apps, schema_editor):
+    """Baseline snapshot of current quantities, the start of the ledger"""
+    Stock = apps.get_model('inventory', 'Stock')
+    StockSnapshot = apps.get_model('inventory', 'StockSnapshot')
+    
+    taken_at = django.utils.timezone.now()
+    snapshots = [
+        StockSnapshot(stock_id=stock_id, quantity=quantity, taken_at=taken_at)
+        for stock_id, quantity in Stock.objects.values_list('id', 'quantity').iterator()
+    ]
+    StockSnapshot.objects.bulk_create(snapshots, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('inventory', '0001_initial'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('taken_at', models.DateTimeField()),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='inventory.stock')),
+            ],
+            options={
+                'db_table': 'stock_snapshots',
+                'ordering': ['-taken_at'],
+                'indexes': [models.Index(fields=['taken_at'], name='stock_snapshots_time_idx')],
+                'unique_together': {('stock', 'taken_at')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StockHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('previous_quantity', models.IntegerField()),
+                ('new_quantity', models.IntegerField()),
+                ('change', models.IntegerField(help_text='new_quantity - previous_quantity')),
+                ('change_type', models.CharField(choices=[('sale', 'Sale'), ('transfer_in', 'Transfer In'), ('transfer_out', 'Transfer Out'), ('manual', 'Manual'), ('return', 'Return')], max_length=20)),
+                ('reference_id', models.IntegerField(blank=True, help_text='Related Sale ID or Transfer ID', null=True)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_changes', to=settings.AUTH_USER_MODEL)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='history', to='inventory.stock')),
+            ],
+            options={
+                'verbose_name_plural': 'stock history',
+                'db_table': 'stock_history',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['stock', 'created_at'], name='stock_history_stock_time_idx'), models.Index(fields=['created_at'], name='stock_history_time_idx')],
+            },
+        ),
+        migrations.RunPython(take_initial_snapshot, migrations.RunPython.noop),
+    ]
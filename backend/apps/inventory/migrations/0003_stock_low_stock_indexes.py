@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('inventory', '0002_stock_history'),
+    ]
+    
+    operations = [
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(condition=models.Q(('quantity__lte', models.F('min_threshold'))), fields=['shop', 'product'], name='stocks_low_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(condition=models.Q(('quantity', 0)), fields=['shop', 'product'], name='stocks_out_of_stock_idx'),
+        ),
+    ]
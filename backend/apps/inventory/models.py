@@ -1,5 +1,23 @@
 from django.db import models
+from django.db.models import Q, F
 from django.core.validators import MinValueValidator
+from django.utils import timezone
+
+
+# Predicates of the partial indexes on stocks; filter with these exact
+# expressions so the planner can match the index
+LOW_STOCK_Q = Q(quantity__lte=F('min_threshold'))
+OUT_OF_STOCK_Q = Q(quantity=0)
+
+
+class StockQuerySet(models.QuerySet):
+    def low_stock(self):
+        """Stock at or below its minimum threshold (stocks_low_stock_idx)"""
+        return self.filter(LOW_STOCK_Q)
+    
+    def out_of_stock(self):
+        """Stock with nothing left (stocks_out_of_stock_idx)"""
+        return self.filter(OUT_OF_STOCK_Q)
 
 
 class Stock(models.Model):
@@ -14,10 +32,18 @@ class Stock(models.Model):
     last_updated = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = StockQuerySet.as_manager()
+    
     class Meta:
         db_table = 'stocks'
         unique_together = ['shop', 'product']  # One stock record per product per shop
         ordering = ['shop', 'product']
+        indexes = [
+            # Only the few rows needing attention are indexed, so low-stock
+            # lists and the alert sweep never scan healthy stock
+            models.Index(fields=['shop', 'product'], condition=LOW_STOCK_Q, name='stocks_low_stock_idx'),
+            models.Index(fields=['shop', 'product'], condition=OUT_OF_STOCK_Q, name='stocks_out_of_stock_idx'),
+        ]
     
     def __str__(self):
         return f"{self.product.name} - {self.shop.name} (Qty: {self.quantity})"
@@ -31,3 +57,64 @@ class Stock(models.Model):
     def is_out_of_stock(self):
         """Check if stock is out"""
         return self.quantity == 0
+
+
+class StockHistory(models.Model):
+    """
+    Append-only ledger of stock movements
+    
+    One row per change of Stock.quantity (sales, transfers, manual edits).
+    Rows are only ever inserted, so past stock levels can be reconstructed.
+    """
+    CHANGE_TYPE_CHOICES = [
+        ('sale', 'Sale'),
+        ('transfer_in', 'Transfer In'),
+        ('transfer_out', 'Transfer Out'),
+        ('manual', 'Manual'),
+        ('return', 'Return'),
+    ]
+    
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='history')
+    previous_quantity = models.IntegerField()
+    new_quantity = models.IntegerField()
+    change = models.IntegerField(help_text="new_quantity - previous_quantity")
+    change_type = models.CharField(max_length=20, choices=CHANGE_TYPE_CHOICES)
+    reference_id = models.IntegerField(null=True, blank=True, help_text="Related Sale ID or Transfer ID")
+    notes = models.TextField(blank=True, null=True)
+    changed_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_changes')
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'stock_history'
+        ordering = ['-created_at', '-id']
+        verbose_name_plural = 'stock history'
+        indexes = [
+            models.Index(fields=['stock', 'created_at'], name='stock_history_stock_time_idx'),
+            models.Index(fields=['created_at'], name='stock_history_time_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.stock_id}: {self.previous_quantity} -> {self.new_quantity} ({self.change_type})"
+
+
+class StockSnapshot(models.Model):
+    """
+    Periodic copy of every stock quantity
+    
+    Stock at time T is the nearest snapshot before T plus the ledger changes
+    between the two, so point-in-time queries scan a bounded slice of history.
+    """
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='snapshots')
+    quantity = models.IntegerField()
+    taken_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'stock_snapshots'
+        unique_together = ['stock', 'taken_at']
+        ordering = ['-taken_at']
+        indexes = [
+            models.Index(fields=['taken_at'], name='stock_snapshots_time_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.stock_id} @ {self.taken_at:%Y-%m-%d %H:%M}: {self.quantity}"
@@ -2,7 +2,7 @@
 Serializers for inventory app
 """
 from rest_framework import serializers
-from .models import Stock
+from .models import Stock, StockHistory
 
 
 class StockSerializer(serializers.ModelSerializer):
@@ -90,5 +90,16 @@ class StockSerializer(serializers.ModelSerializer):
         return attrs
 
 
-
-
+class StockHistorySerializer(serializers.ModelSerializer):
+    """
+    Read-only serializer for stock ledger entries
+    """
+    changed_by_username = serializers.CharField(source='changed_by.username', read_only=True, default=None)
+    
+    class Meta:
+        model = StockHistory
+        fields = [
+            'id', 'stock', 'previous_quantity', 'new_quantity', 'change', 'change_type',
+            'reference_id', 'notes', 'changed_by', 'changed_by_username', 'created_at'
+        ]
+        read_only_fields = fields
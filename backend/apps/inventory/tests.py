@@ -1,3 +1,504 @@
-from django.test import TestCase
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import skipUnless
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.analytics.models import Alert
+from apps.products.models import Product
+from apps.shops.models import Shop
+from apps.transfers.execution import complete_transfer
+from apps.transfers.models import StockTransfer
+from apps.sales.tests import SalesFixtureMixin
+from .models import Stock, StockHistory, StockSnapshot
+from .availability import clear_availability_cache, get_availability, schedule_availability_invalidation
+from .bulk import MODE_ADJUST, bulk_adjust_stock
+from .history import record_stock_changes, take_stock_snapshot, stock_levels_at
 
-# Create your tests here.
+
+class StockLevelsAtTests(SalesFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        self.stock = Stock.objects.get(shop=self.shops[0], product=self.products[0])
+        take_stock_snapshot()
+        self.before_sales = timezone.now()
+        self.sell([(self.products[0], 3), (self.products[1], 1)])
+        self.between_sales = timezone.now()
+        take_stock_snapshot(shop_id=self.shops[1].id)
+        self.sell([(self.products[0], 2)])
+    
+    def test_snapshot_plus_ledger_changes(self):
+        self.assertEqual(stock_levels_at(self.before_sales)[self.stock.id], 100)
+        self.assertEqual(stock_levels_at(self.between_sales)[self.stock.id], 97)
+        self.assertEqual(stock_levels_at(timezone.now())[self.stock.id], 95)
+    
+    def test_later_snapshot_is_not_counted_twice(self):
+        take_stock_snapshot()
+        self.sell([(self.products[0], 1)])
+        
+        levels = stock_levels_at(timezone.now(), Stock.objects.filter(shop=self.shops[0]))
+        
+        self.assertEqual(levels[self.stock.id], 94)
+        self.assertEqual(len(levels), 5)
+    
+    def test_stock_created_later_starts_from_its_ledger(self):
+        product = Product.objects.create(name='New', unit_price='1.00', barcode='1234')
+        self.api.force_authenticate(self.admin)
+        response = self.api.post('/api/inventory/stock/', {
+            'shop': self.shops[0].id, 'product': product.id, 'quantity': 4, 'min_threshold': 1
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        
+        self.assertEqual(stock_levels_at(timezone.now())[response.data['id']], 4)
+        self.assertNotIn(response.data['id'], stock_levels_at(self.between_sales))
+    
+    def test_stocks_created_empty_are_listed(self):
+        created = Product.objects.create(name='Posted', unit_price='1.00', barcode='1234')
+        bulk = Product.objects.create(name='Bulk', unit_price='1.00', barcode='5678')
+        self.api.force_authenticate(self.admin)
+        response = self.api.post('/api/inventory/stock/', {
+            'shop': self.shops[0].id, 'product': created.id, 'quantity': 0, 'min_threshold': 1
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.api.post('/api/inventory/stock/bulk-adjust/', {
+            'rows': [{'shop': self.shops[1].id, 'product': bulk.id, 'quantity': 0}]
+        }, format='json').status_code, 200)
+        
+        levels = stock_levels_at(timezone.now())
+        
+        bulk_stock = Stock.objects.get(product=bulk)
+        self.assertEqual((levels[response.data['id']], levels[bulk_stock.id]), (0, 0))
+        self.assertEqual(
+            list(StockHistory.objects.filter(stock=bulk_stock).values_list('previous_quantity', 'new_quantity', 'change')),
+            [(0, 0, 0)]
+        )
+    
+    def test_one_query_for_any_number_of_stocks(self):
+        with self.assertNumQueries(1):
+            levels = stock_levels_at(timezone.now())
+        
+        self.assertEqual(len(levels), 10)
+    
+    @skipUnless(connection.vendor == 'postgresql', 'EXPLAIN output is PostgreSQL specific')
+    def test_ledger_is_read_by_stock_and_time_range(self):
+        with CaptureQueriesContext(connection) as queries:
+            stock_levels_at(timezone.now())
+        with connection.cursor() as cursor:
+            # The fixture tables are tiny; rule out the sequential scan they would get
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('EXPLAIN ' + queries[0]['sql'])
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        
+        self.assertIn('stock_history_stock_time_idx', plan)
+        self.assertNotIn('SubPlan', plan)
+    
+    def test_levels_at_endpoint(self):
+        self.api.force_authenticate(self.manager)
+        
+        response = self.api.get('/api/inventory/stock/levels-at/', {'at': self.between_sales.isoformat()})
+        
+        levels = {row['stock_id']: row['quantity'] for row in response.data['data']}
+        self.assertEqual(levels[self.stock.id], 97)
+        self.assertEqual(len(levels), 5)
+        self.assertEqual(self.api.get('/api/inventory/stock/levels-at/').status_code, 400)
+
+
+class StockUpdateTests(SalesFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        self.stock = Stock.objects.get(shop=self.shops[0], product=self.products[0])
+        self.api.force_authenticate(self.manager)
+    
+    def test_edit_is_recorded_in_the_ledger(self):
+        response = self.api.patch(f'/api/inventory/stock/{self.stock.id}/', {'quantity': 120}, format='json')
+        
+        self.assertEqual(response.status_code, 200, response.data)
+        entry = StockHistory.objects.get(stock=self.stock)
+        self.assertEqual((entry.previous_quantity, entry.new_quantity, entry.change_type), (100, 120, 'manual'))
+        self.assertEqual(entry.changed_by, self.manager)
+    
+    def test_invalid_edit_changes_nothing(self):
+        response = self.api.patch(f'/api/inventory/stock/{self.stock.id}/', {'quantity': -1}, format='json')
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StockHistory.objects.exists())
+
+
+class StockHistoryListTests(SalesFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        self.stock = Stock.objects.get(shop=self.shops[0], product=self.products[0])
+        self.sell([(self.products[0], 3)])
+        self.sell([(self.products[0], 2)])
+        StockHistory.objects.filter(change=-3).update(created_at=timezone.make_aware(timezone.datetime(2024, 3, 5, 10)))
+        self.api.force_authenticate(self.manager)
+    
+    def test_newest_first_within_dates(self):
+        url = f'/api/inventory/stock/{self.stock.id}/history/'
+        
+        self.assertEqual([entry['change'] for entry in self.api.get(url).data], [-2, -3])
+        self.assertEqual([entry['change'] for entry in self.api.get(url, {'end_date': '2024-03-06'}).data], [-3])
+        self.assertEqual([entry['change'] for entry in self.api.get(url, {'start_date': '2024-03-05T11:00:00'}).data], [-2])
+    
+    def test_rejects_invalid_dates(self):
+        url = f'/api/inventory/stock/{self.stock.id}/history/'
+        
+        for params in [{'start_date': 'yesterday'}, {'end_date': '2024-13-01'}]:
+            response = self.api.get(url, params)
+            
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.data)
+
+
+class BulkAdjustTests(SalesFixtureMixin, TestCase):
+    URL = '/api/inventory/stock/bulk-adjust/'
+    
+    def setUp(self):
+        self.create_fixtures()
+        self.new_product = Product.objects.create(name='New', unit_price='1.00', category=self.category, barcode='1234')
+        north = self.shops[0].id
+        self.rows = [
+            {'shop': north, 'product': self.products[0].id, 'quantity': 2},
+            {'shop': north, 'product': self.products[1].id, 'quantity': 100},
+            {'shop': north, 'product': self.new_product.id, 'quantity': 7, 'min_threshold': 1},
+        ]
+        self.api.force_authenticate(self.manager)
+    
+    def quantity(self, shop, product):
+        return Stock.objects.get(shop=shop, product=product).quantity
+    
+    def test_applies_rows_and_counts_them(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post(self.URL, {'rows': self.rows}, format='json')
+        
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data, {'updated': 1, 'created': 1, 'unchanged': 1})
+        self.assertEqual(self.quantity(self.shops[0], self.products[0]), 2)
+        self.assertEqual(self.quantity(self.shops[0], self.new_product), 7)
+        self.assertEqual(StockHistory.objects.filter(change_type='manual').count(), 2)
+        self.assertEqual(Alert.objects.filter(shop=self.shops[0], product=self.products[0]).count(), 1)
+    
+    def test_one_bad_row_changes_nothing(self):
+        rows = self.rows + [{'shop': self.shops[0].id, 'product': 99999, 'quantity': 'x'}]
+        
+        response = self.api.post(self.URL, {'rows': rows}, format='json')
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['row'] for error in response.data['rows']], [4])
+        self.assertEqual(set(response.data['rows'][0]['errors']), {'quantity'})
+        self.assertEqual(self.quantity(self.shops[0], self.products[0]), 100)
+        self.assertFalse(Stock.objects.filter(product=self.new_product).exists())
+        self.assertFalse(StockHistory.objects.exists())
+    
+    def test_rows_failing_late_checks_roll_back(self):
+        rows = self.rows + [
+            {'shop': self.shops[0].id, 'product': self.products[2].id, 'quantity': -1},
+            {'shop': self.shops[0].id, 'product': self.products[0].id, 'quantity': 1},
+        ]
+        
+        response = self.api.post(self.URL, {'rows': rows}, format='json')
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['row'] for error in response.data['rows']], [4, 5])
+        self.assertEqual(self.quantity(self.shops[0], self.products[0]), 100)
+        self.assertFalse(StockHistory.objects.exists())
+    
+    def test_manager_is_limited_to_own_shop(self):
+        rows = self.rows + [{'shop': self.shops[1].id, 'product': self.products[0].id, 'quantity': 1}]
+        
+        response = self.api.post(self.URL, {'rows': rows}, format='json')
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['rows'], [
+            {'row': 4, 'errors': {'shop': 'You can only adjust stock for your own shop.'}}
+        ])
+        self.assertEqual(self.quantity(self.shops[1], self.products[0]), 100)
+    
+    def test_staff_cannot_adjust(self):
+        self.api.force_authenticate(self.staff)
+        
+        self.assertEqual(self.api.post(self.URL, {'rows': self.rows}, format='json').status_code, 403)
+    
+    def test_csv_upload_in_adjust_mode(self):
+        body = f'shop_id,product_id,quantity\n{self.shops[0].id},{self.products[0].id},-5\n{self.shops[0].id},{self.products[1].id},\n'
+        upload = SimpleUploadedFile('count.csv', body.encode())
+        
+        response = self.api.post(self.URL, {'file': upload, 'mode': MODE_ADJUST}, format='multipart')
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['rows'], [{'row': 2, 'errors': {'quantity': 'This field is required.'}}])
+        
+        body = f'shop_id,product_id,quantity\n{self.shops[0].id},{self.products[0].id},-5\n'
+        upload = SimpleUploadedFile('count.csv', body.encode())
+        
+        response = self.api.post(self.URL, {'file': upload, 'mode': MODE_ADJUST}, format='multipart')
+        
+        self.assertEqual(response.data, {'updated': 1, 'created': 0, 'unchanged': 0})
+        self.assertEqual(self.quantity(self.shops[0], self.products[0]), 95)
+
+
+class LowStockTests(SalesFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        # (shop index, product index, quantity, min_threshold); thresholds are 5 elsewhere
+        for shop, product, quantity, min_threshold in [
+            (0, 0, 5, 5),
+            (0, 1, 6, 5),
+            (0, 2, 0, 5),
+            (0, 3, 0, 0),
+            (1, 0, 1, 5),
+        ]:
+            Stock.objects.filter(shop=self.shops[shop], product=self.products[product]).update(
+                quantity=quantity, min_threshold=min_threshold
+            )
+        self.api.force_authenticate(self.admin)
+    
+    def stock(self, shop, product):
+        return Stock.objects.get(shop=self.shops[shop], product=self.products[product])
+    
+    def listed(self, **params):
+        response = self.api.get('/api/inventory/stock/low-stock/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [(row['shop'], row['product']) for row in response.data]
+    
+    def test_threshold_boundaries(self):
+        self.assertEqual(
+            set(Stock.objects.low_stock()),
+            {self.stock(0, 0), self.stock(0, 2), self.stock(0, 3), self.stock(1, 0)}
+        )
+        # A zero threshold still flags an empty shelf
+        self.assertEqual(set(Stock.objects.out_of_stock()), {self.stock(0, 2), self.stock(0, 3)})
+    
+    def test_list_is_filtered_by_shop(self):
+        north, south = (shop.id for shop in self.shops)
+        products = [product.id for product in self.products]
+        
+        self.assertEqual(self.listed(), [
+            (north, products[0]), (north, products[2]), (north, products[3]), (south, products[0]),
+        ])
+        self.assertEqual(self.listed(shop_id=south), [(south, products[0])])
+        self.assertEqual(self.listed(shop_id=north, out_of_stock='true'), [(north, products[2]), (north, products[3])])
+        
+        self.api.force_authenticate(self.manager)
+        self.assertEqual(self.listed(out_of_stock='true'), [(north, products[2]), (north, products[3])])
+    
+    def test_summary_counts_per_shop(self):
+        response = self.api.get('/api/inventory/stock/low-stock/summary/')
+        
+        self.assertEqual(response.data, [
+            {'shop_id': self.shops[0].id, 'shop_name': 'North', 'low_stock': 3, 'out_of_stock': 2},
+            {'shop_id': self.shops[1].id, 'shop_name': 'South', 'low_stock': 1, 'out_of_stock': 0},
+        ])
+        self.assertEqual(
+            [row['shop_name'] for row in self.api.get('/api/inventory/stock/low-stock/summary/', {'shop_id': self.shops[1].id}).data],
+            ['South']
+        )
+        self.api.force_authenticate(self.manager)
+        self.assertEqual([row['shop_name'] for row in self.api.get('/api/inventory/stock/low-stock/summary/').data], ['North'])
+
+
+class AvailabilityTests(SalesFixtureMixin, TestCase):
+    URL = '/api/inventory/stock/availability/'
+    
+    def setUp(self):
+        self.create_fixtures()
+        clear_availability_cache()
+        self.ids = [self.products[0].id, self.products[1].id]
+        self.api.force_authenticate(self.staff)
+    
+    def quantities(self, product_ids):
+        response = self.api.get(self.URL, {'product_ids': ','.join(map(str, product_ids))})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['quantities']
+    
+    def test_repeat_lookup_is_served_from_cache(self):
+        self.assertEqual(self.quantities(self.ids), {self.ids[0]: 100, self.ids[1]: 100})
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(get_availability(self.shops[0].id, self.ids), {self.ids[0]: 100, self.ids[1]: 100})
+    
+    def test_unknown_products_are_reported_as_zero(self):
+        product = Product.objects.create(name='Unstocked', unit_price='1.00', barcode='1234')
+        
+        self.assertEqual(self.quantities([99999, product.id, self.ids[0]]), {99999: 0, product.id: 0, self.ids[0]: 100})
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(get_availability(self.shops[0].id, [99999]), {99999: 0})
+    
+    def test_committed_sale_drops_cached_quantity(self):
+        self.quantities(self.ids)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sell([(self.products[0], 4)])
+        
+        self.assertEqual(self.quantities(self.ids), {self.ids[0]: 96, self.ids[1]: 100})
+    
+    def test_committed_edit_drops_cached_quantity(self):
+        self.quantities(self.ids)
+        stock = Stock.objects.get(shop=self.shops[0], product=self.products[1])
+        self.api.force_authenticate(self.manager)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api.patch(f'/api/inventory/stock/{stock.id}/', {'quantity': 40}, format='json')
+        
+        self.api.force_authenticate(self.staff)
+        self.assertEqual(self.quantities(self.ids)[self.ids[1]], 40)
+    
+    def test_rolled_back_write_schedules_nothing(self):
+        stock = Stock.objects.get(shop=self.shops[0], product=self.products[0])
+        
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    schedule_availability_invalidation([stock])
+                    raise ValueError
+            except ValueError:
+                pass
+        
+        self.assertEqual(callbacks, [])
+    
+    def test_rejects_bad_parameters(self):
+        self.assertEqual(self.api.get(self.URL).status_code, 400)
+        self.assertEqual(self.api.get(self.URL, {'product_ids': '1,x'}).status_code, 400)
+        self.api.force_authenticate(self.admin)
+        self.assertEqual(self.api.get(self.URL, {'product_ids': '1'}).status_code, 400)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs row-level locking (PostgreSQL)')
+class ConcurrentSnapshotTests(SalesFixtureMixin, TransactionTestCase):
+    def test_snapshot_waits_for_in_flight_change(self):
+        self.create_fixtures()
+        stock = Stock.objects.get(shop=self.shops[0], product=self.products[0])
+        changed = threading.Event()
+        release = threading.Event()
+        
+        def change_stock():
+            # Ledger row stamped now, committed only after the snapshot started
+            try:
+                with transaction.atomic():
+                    locked = Stock.objects.select_for_update().get(pk=stock.pk)
+                    locked.quantity -= 5
+                    locked.save()
+                    record_stock_changes([(locked, 100)], 'manual')
+                    changed.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+        
+        def snapshot():
+            try:
+                take_stock_snapshot()
+            finally:
+                connection.close()
+        
+        writer = threading.Thread(target=change_stock)
+        writer.start()
+        changed.wait(5)
+        snapshotter = threading.Thread(target=snapshot)
+        snapshotter.start()
+        time.sleep(0.2)
+        self.assertTrue(snapshotter.is_alive())
+        release.set()
+        writer.join()
+        snapshotter.join()
+        
+        self.assertEqual(StockSnapshot.objects.get(stock=stock).quantity, 95)
+        self.assertLess(StockHistory.objects.get(stock=stock).created_at, StockSnapshot.objects.get(stock=stock).taken_at)
+        self.assertEqual(stock_levels_at(timezone.now())[stock.id], 95)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs row-level locking (PostgreSQL)')
+class ConcurrentStockUpdateTests(SalesFixtureMixin, TransactionTestCase):
+    def test_edit_during_sale_keeps_ledger_consistent(self):
+        self.create_fixtures()
+        stock = Stock.objects.get(shop=self.shops[0], product=self.products[0])
+        changed = threading.Event()
+        release = threading.Event()
+        
+        def sell():
+            try:
+                with transaction.atomic():
+                    locked = Stock.objects.select_for_update().get(pk=stock.pk)
+                    locked.quantity -= 5
+                    locked.save()
+                    record_stock_changes([(locked, 100)], 'sale')
+                    changed.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+        
+        def edit():
+            try:
+                api = APIClient()
+                api.force_authenticate(self.manager)
+                api.patch(f'/api/inventory/stock/{stock.id}/', {'quantity': 20}, format='json')
+            finally:
+                connection.close()
+        
+        seller = threading.Thread(target=sell)
+        seller.start()
+        changed.wait(5)
+        editor = threading.Thread(target=edit)
+        editor.start()
+        time.sleep(0.2)
+        release.set()
+        seller.join()
+        editor.join()
+        
+        stock.refresh_from_db()
+        self.assertEqual(stock.quantity, 20)
+        entry = StockHistory.objects.get(stock=stock, change_type='manual')
+        self.assertEqual(entry.previous_quantity, 95)
+        self.assertEqual(100 + StockHistory.objects.filter(stock=stock).aggregate(total=Sum('change'))['total'], 20)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs row-level locking (PostgreSQL)')
+class ConcurrentBulkAdjustTests(SalesFixtureMixin, TransactionTestCase):
+    """
+    Bulk adjustments racing transfer completions over the same stock rows
+    
+    The first shop is renamed so Stock's default (shop name) ordering is
+    the reverse of the (shop_id, product_id) order transfers lock in.
+    """
+    workers = 8
+    
+    def test_concurrent_bulk_adjust_and_transfers_do_not_deadlock(self):
+        self.create_fixtures()
+        north, south = self.shops
+        Shop.objects.filter(pk=north.pk).update(name='Zeta')
+        transfers = [
+            StockTransfer.objects.create(
+                from_shop=north, to_shop=south, product=self.products[i % 2], quantity=1,
+                status='approved', requested_by=self.admin, approved_by=self.admin,
+            ).pk
+            for i in range(20)
+        ]
+        rows = [
+            {'shop': shop.id, 'product': product.id, 'quantity': 1}
+            for shop in self.shops for product in self.products[:2]
+        ]
+        
+        def work(job):
+            try:
+                if job is None:
+                    bulk_adjust_stock(rows, self.admin, mode=MODE_ADJUST)
+                else:
+                    complete_transfer(job, self.admin)
+            finally:
+                connection.close()
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # Raises the first worker error, e.g. a deadlock
+            list(executor.map(work, [job for transfer in transfers for job in (transfer, None)]))
+        
+        for product in self.products[:2]:
+            stocks = Stock.objects.filter(product=product)
+            self.assertEqual(sum(stock.quantity for stock in stocks), 200 + 2 * 20)
+            for stock in stocks:
+                change = StockHistory.objects.filter(stock=stock).aggregate(total=Sum('change'))['total']
+                self.assertEqual(stock.quantity, 100 + change)
@@ -2,13 +2,22 @@
 URL patterns for inventory app
 """
 from django.urls import path
-from .views import StockListCreateView, StockRetrieveUpdateDestroyView
+from .views import (
+    StockListCreateView, StockRetrieveUpdateDestroyView, StockHistoryListView, StockLevelsAtView, StockBulkAdjustView,
+    LowStockListView, LowStockSummaryView, StockAvailabilityView,
+)
 
 app_name = 'inventory'
 
 urlpatterns = [
     path('stock/', StockListCreateView.as_view(), name='stock-list-create'),
     path('stock/<int:pk>/', StockRetrieveUpdateDestroyView.as_view(), name='stock-detail'),
+    path('stock/<int:pk>/history/', StockHistoryListView.as_view(), name='stock-history'),
+    path('stock/levels-at/', StockLevelsAtView.as_view(), name='stock-levels-at'),
+    path('stock/low-stock/', LowStockListView.as_view(), name='stock-low-stock'),
+    path('stock/low-stock/summary/', LowStockSummaryView.as_view(), name='stock-low-stock-summary'),
+    path('stock/availability/', StockAvailabilityView.as_view(), name='stock-availability'),
+    path('stock/bulk-adjust/', StockBulkAdjustView.as_view(), name='stock-bulk-adjust'),
 ]
 
 
@@ -1,13 +1,20 @@
 """
 Views for inventory app using Class-Based Views and Generic Views
 """
+import csv
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q, F
-from .models import Stock
-from .serializers import StockSerializer
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
+from django.db import transaction
+from django.db.models import Count, Q
+from .models import Stock, StockHistory
+from .history import record_stock_changes, stock_levels_at
+from .availability import get_availability, invalidate_availability, schedule_availability_invalidation
+from .bulk import BULK_MODES, MODE_SET, MAX_BULK_ROWS, parse_csv_rows, bulk_adjust_stock
+from .serializers import StockSerializer, StockHistorySerializer
 from .permissions import IsAdminOrSalesManagerOrReadOnly
+from supermarket_analysis.pagination import StockPagination, StockHistoryPagination
 
 
 class StockListCreateView(generics.ListCreateAPIView):
@@ -20,6 +27,7 @@ class StockListCreateView(generics.ListCreateAPIView):
     queryset = Stock.objects.select_related('shop', 'product', 'product__category').all()
     serializer_class = StockSerializer
     permission_classes = [IsAuthenticated, IsAdminOrSalesManagerOrReadOnly]
+    pagination_class = StockPagination
     
     def get_queryset(self):
         """
@@ -43,17 +51,17 @@ class StockListCreateView(generics.ListCreateAPIView):
         # Filter low stock items
         low_stock = self.request.query_params.get('low_stock', None)
         if low_stock and low_stock.lower() == 'true':
-            queryset = queryset.filter(quantity__lte=F('min_threshold'))
+            queryset = queryset.low_stock()
         
         # Filter out of stock items
         out_of_stock = self.request.query_params.get('out_of_stock', None)
         if out_of_stock and out_of_stock.lower() == 'true':
-            queryset = queryset.filter(quantity=0)
+            queryset = queryset.out_of_stock()
         
-        # Search by product name
+        # Search by product name or barcode prefix (trigram / pattern indexes on PostgreSQL)
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(product__name__icontains=search)
+            queryset = queryset.filter(Q(product__name__icontains=search) | Q(product__barcode__startswith=search))
         
         return queryset.order_by('shop__name', 'product__name')
     
@@ -74,7 +82,13 @@ class StockListCreateView(generics.ListCreateAPIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            stock = serializer.save()
+            with transaction.atomic():
+                stock = serializer.save()
+                
+                # Opening quantity is the first ledger entry
+                record_stock_changes([(stock, None)], 'manual', changed_by=request.user, notes='Stock record created')
+                schedule_availability_invalidation([stock])
+            
             return Response(
                 StockSerializer(stock).data,
                 status=status.HTTP_201_CREATED
@@ -106,21 +120,33 @@ class StockRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         """
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
-        serializer = self.get_serializer(instance, data=request.data, partial=partial, context={'request': request})
         
-        if serializer.is_valid():
-            stock = serializer.save()
+        with transaction.atomic():
+            # Re-read under a row lock so the ledger's previous quantity is
+            # the one this update replaces, not one a concurrent sale changed
+            instance = self.get_queryset().select_for_update(of=('self',)).get(pk=instance.pk)
+            serializer = self.get_serializer(instance, data=request.data, partial=partial, context={'request': request})
             
-            # Check and create alerts for low stock
-            from apps.analytics.alerts import create_low_stock_alert
-            create_low_stock_alert(stock)
+            if not serializer.is_valid():
+                return Response(
+                    serializer.errors,
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             
-            return Response(StockSerializer(stock).data)
+            previous_quantity = instance.quantity
+            stock = serializer.save()
+            record_stock_changes([(stock, previous_quantity)], 'manual', changed_by=request.user)
+            schedule_availability_invalidation([stock])
         
-        return Response(
-            serializer.errors,
-            status=status.HTTP_400_BAD_REQUEST
-        )
+        # Check and create alerts for low stock
+        from apps.analytics.alerts import create_low_stock_alert
+        create_low_stock_alert(stock)
+        
+        # Drop the shop's cached open-period reports
+        from apps.sales.report_cache import schedule_report_invalidation
+        schedule_report_invalidation([stock.shop_id])
+        
+        return Response(StockSerializer(stock).data)
     
     def destroy(self, request, *args, **kwargs):
         """
@@ -134,8 +160,277 @@ class StockRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         
         instance = self.get_object()
         instance.delete()
+        invalidate_availability([(instance.shop_id, instance.product_id)])
         
         return Response(
             {'message': 'Stock record deleted successfully.'},
             status=status.HTTP_204_NO_CONTENT
         )
+
+
+class StockHistoryListView(generics.ListAPIView):
+    """
+    Ledger of quantity changes for one stock record, newest first
+    
+    GET /api/inventory/stock/<pk>/history/?change_type=sale&start_date=...&end_date=...
+    """
+    serializer_class = StockHistorySerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = StockHistoryPagination
+    
+    def list(self, request, *args, **kwargs):
+        from apps.sales.reports import parse_report_date
+        
+        self.date_range = {}
+        for param, lookup in [('start_date', 'created_at__gte'), ('end_date', 'created_at__lte')]:
+            value = request.query_params.get(param, None)
+            if not value:
+                continue
+            try:
+                self.date_range[lookup] = parse_report_date(value)
+            except ValueError:
+                return Response(
+                    {'error': f'Invalid {param}. Use YYYY-MM-DD or an ISO 8601 datetime.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        return super().list(request, *args, **kwargs)
+    
+    def get_queryset(self):
+        queryset = StockHistory.objects.select_related('changed_by').filter(stock_id=self.kwargs['pk'])
+        
+        change_type = self.request.query_params.get('change_type', None)
+        if change_type:
+            queryset = queryset.filter(change_type=change_type)
+        
+        # Parsed and validated in list()
+        queryset = queryset.filter(**getattr(self, 'date_range', {}))
+        
+        return queryset.order_by('-created_at', '-id')
+
+
+class StockLevelsAtView(generics.GenericAPIView):
+    """
+    Stock quantities at a point in time, rebuilt from snapshots and the ledger
+    
+    GET /api/inventory/stock/levels-at/?at=YYYY-MM-DDTHH:MM:SS&shop_id=1&product_id=1
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        from apps.sales.reports import parse_report_date
+        
+        at = request.query_params.get('at', None)
+        if not at:
+            return Response(
+                {'error': 'at is required (YYYY-MM-DD or an ISO 8601 datetime).'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            at = parse_report_date(at)
+        except ValueError:
+            return Response(
+                {'error': 'Invalid date. Use YYYY-MM-DD or an ISO 8601 datetime.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        stocks = Stock.objects.all()
+        
+        shop_id = request.query_params.get('shop_id', None)
+        if shop_id:
+            stocks = stocks.filter(shop_id=shop_id)
+        elif request.user.role == 'sales_manager' and request.user.shop:
+            stocks = stocks.filter(shop=request.user.shop)
+        
+        product_id = request.query_params.get('product_id', None)
+        if product_id:
+            stocks = stocks.filter(product_id=product_id)
+        
+        levels = stock_levels_at(at, stocks)
+        rows = stocks.filter(id__in=levels.keys()).values('id', 'shop_id', 'product_id', 'product__name')
+        
+        return Response({
+            'at': at.isoformat(),
+            'data': [
+                {
+                    'stock_id': row['id'],
+                    'shop_id': row['shop_id'],
+                    'product_id': row['product_id'],
+                    'product_name': row['product__name'],
+                    'quantity': levels[row['id']],
+                }
+                for row in rows.order_by('shop_id', 'product__name')
+            ]
+        })
+
+
+class StockBulkAdjustView(generics.GenericAPIView):
+    """
+    Apply a stock-take or many stock adjustments in one request
+    
+    POST /api/inventory/stock/bulk-adjust/ - JSON {"mode": "set", "rows": [...]}
+    or multipart with a CSV `file` (admin/sales_manager only)
+    
+    All rows are validated before anything is written; if any row fails,
+    the per-row errors are returned and no stock is changed.
+    """
+    permission_classes = [IsAuthenticated, IsAdminOrSalesManagerOrReadOnly]
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
+    
+    def post(self, request):
+        upload = request.FILES.get('file', None)
+        if upload is not None:
+            try:
+                rows = parse_csv_rows(upload)
+            except (UnicodeDecodeError, csv.Error):
+                return Response(
+                    {'error': 'file must be a UTF-8 encoded CSV file.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            rows = request.data.get('rows', None)
+        
+        if not isinstance(rows, list) or not rows:
+            return Response(
+                {'error': 'Provide a non-empty rows list or a CSV file.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(rows) > MAX_BULK_ROWS:
+            return Response(
+                {'error': f'At most {MAX_BULK_ROWS} rows can be adjusted per request.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        options = request.data if not isinstance(request.data, list) else {}
+        mode = options.get('mode', MODE_SET)
+        if mode not in BULK_MODES:
+            return Response(
+                {'error': f'Invalid mode. Choose from: {", ".join(BULK_MODES)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        result, errors = bulk_adjust_stock(rows, request.user, mode=mode, notes=options.get('notes', None))
+        if errors:
+            return Response(
+                {'error': 'No stock was changed; fix the rows below.', 'rows': errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(result)
+
+
+def get_stock_shop_filter(request):
+    """Shop filter of a stock request: ?shop_id, else a sales manager's own shop"""
+    shop_id = request.query_params.get('shop_id', None)
+    if shop_id:
+        return Q(shop_id=shop_id)
+    if request.user.role == 'sales_manager' and request.user.shop:
+        return Q(shop=request.user.shop)
+    return Q()
+
+
+class LowStockListView(generics.ListAPIView):
+    """
+    Stock at or below its minimum threshold
+    
+    GET /api/inventory/stock/low-stock/?shop_id=1&out_of_stock=true
+    
+    Reads only the rows in the low-stock (or out-of-stock) partial index.
+    """
+    serializer_class = StockSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = StockPagination
+    
+    def get_queryset(self):
+        queryset = Stock.objects.select_related('shop', 'product', 'product__category').filter(
+            get_stock_shop_filter(self.request)
+        )
+        
+        out_of_stock = self.request.query_params.get('out_of_stock', None)
+        if out_of_stock and out_of_stock.lower() == 'true':
+            queryset = queryset.out_of_stock()
+        else:
+            queryset = queryset.low_stock()
+        
+        return queryset.order_by('shop__name', 'product__name')
+
+
+class LowStockSummaryView(generics.GenericAPIView):
+    """
+    Low and out-of-stock counts per shop
+    
+    GET /api/inventory/stock/low-stock/summary/?shop_id=1
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        # Thresholds are never negative, so out-of-stock rows are a subset of low stock
+        rows = Stock.objects.low_stock().filter(get_stock_shop_filter(request)).values(
+            'shop_id', 'shop__name'
+        ).annotate(
+            low_stock=Count('id'),
+            out_of_stock=Count('id', filter=Q(quantity=0)),
+        ).order_by('shop__name')
+        
+        return Response([
+            {
+                'shop_id': row['shop_id'],
+                'shop_name': row['shop__name'],
+                'low_stock': row['low_stock'],
+                'out_of_stock': row['out_of_stock'],
+            }
+            for row in rows
+        ])
+
+
+class StockAvailabilityView(generics.GenericAPIView):
+    """
+    Quantities only, for a set of products in one shop
+    
+    GET /api/inventory/stock/availability/?shop_id=1&product_ids=1,2,3
+    
+    Served from the per-process availability cache; see availability.py.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    # Most products accepted in one request
+    max_products = 500
+    
+    def get(self, request):
+        shop_id = request.query_params.get('shop_id', None) or request.user.shop_id
+        if not shop_id:
+            return Response(
+                {'error': 'shop_id is required.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            shop_id = int(shop_id)
+            product_ids = [
+                int(product_id)
+                for product_id in request.query_params.get('product_ids', '').split(',')
+                if product_id.strip()
+            ]
+        except ValueError:
+            return Response(
+                {'error': 'shop_id and product_ids must be whole numbers.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not product_ids:
+            return Response(
+                {'error': 'product_ids is required (comma separated).'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(product_ids) > self.max_products:
+            return Response(
+                {'error': f'At most {self.max_products} products per request.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({
+            'shop_id': shop_id,
+            'quantities': get_availability(shop_id, product_ids),
+        })
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:05
+
+from django.db import migrations
+
+
+# Trigram indexes on UPPER(name) serve the ORM's icontains/istartswith
+# lookups, which compile to UPPER(name::text) LIKE UPPER(...)
+TRIGRAM_INDEXES = [
+    ('products_name_trgm_idx', 'products', 'name'),
+    ('categories_name_trgm_idx', 'categories', 'name'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """
+    PostgreSQL with the pg_trgm contrib module only; elsewhere substring
+    searches keep scanning
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('products', '0002_keyset_pagination_indexes'),
+    ]
+    
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -34,6 +34,9 @@ class Product(models.Model):
     class Meta:
         db_table = 'products'
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', 'id'], name='products_name_id_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} - ₹{self.unit_price}"
@@ -0,0 +1,92 @@
+"""
+Ranked product search for typeahead and barcode lookups
+
+On PostgreSQL, name matching is served by the pg_trgm GIN index on
+UPPER(name) (products_name_trgm_idx) and results are ranked by trigram
+similarity. Barcode prefixes use the varchar_pattern_ops index Django
+creates for the unique barcode column. Other databases, and PostgreSQL
+servers without pg_trgm, get the same filters and a simpler rank.
+"""
+from functools import lru_cache
+from django.db import connection
+from django.db.models import Case, When, Value, IntegerField, FloatField, Func, Q
+from django.db.models.functions import Length, Upper
+from .models import Product
+
+
+# Results returned when no limit is given, and the most a caller may ask for
+SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+
+# Shortest name fragment searched; shorter terms only match barcodes or name prefixes
+MIN_CONTAINS_LENGTH = 3
+
+SEARCH_FIELDS = ['id', 'name', 'barcode', 'unit_price', 'category_id', 'category__name', 'is_active']
+
+
+class Similarity(Func):
+    """pg_trgm similarity(a, b) between 0 and 1"""
+    function = 'SIMILARITY'
+    output_field = FloatField()
+
+
+@lru_cache(maxsize=None)
+def has_trigram_support():
+    """True when the database has the pg_trgm extension installed"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def search_products(term, queryset=None, limit=SEARCH_LIMIT):
+    """
+    Products matching a search term, best match first
+    
+    Args:
+        term: Name fragment or barcode prefix
+        queryset: Optional Product queryset to search within
+        limit: Maximum number of results
+    
+    Returns:
+        Sliced queryset of Product rows, ranked by exact barcode, barcode
+        prefix, exact name, name prefix, then name substring
+    
+    Terms shorter than MIN_CONTAINS_LENGTH are matched as prefixes only,
+    since one- and two-letter fragments match most of the catalog and
+    produce no trigrams to narrow the index scan.
+    """
+    term = term.strip()
+    if queryset is None:
+        queryset = Product.objects.all()
+    if not term:
+        return queryset.none()
+    
+    name_q = Q(name__icontains=term) if len(term) >= MIN_CONTAINS_LENGTH else Q(name__istartswith=term)
+    queryset = queryset.filter(name_q | Q(barcode__startswith=term))
+    
+    rank = Case(
+        When(barcode=term, then=Value(5)),
+        When(barcode__startswith=term, then=Value(4)),
+        When(name__iexact=term, then=Value(3)),
+        When(name__istartswith=term, then=Value(2)),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+    queryset = queryset.annotate(rank=rank)
+    
+    if has_trigram_support():
+        queryset = queryset.annotate(similarity=Similarity(Upper('name'), Upper(Value(term))))
+        ordering = ['-rank', '-similarity', 'name', 'id']
+    else:
+        ordering = ['-rank', Length('name'), 'name', 'id']
+    
+    return queryset.order_by(*ordering)[:limit]
+
+
+def get_search_limit(value):
+    """Parse a ?limit parameter, clamped to 1..MAX_SEARCH_LIMIT"""
+    if value in (None, ''):
+        return SEARCH_LIMIT
+    return min(max(int(value), 1), MAX_SEARCH_LIMIT)
@@ -1,3 +1,77 @@
+from decimal import Decimal
+from unittest import skipUnless
+from django.db import connection
 from django.test import TestCase
+from rest_framework.test import APIClient
+from apps.accounts.models import User
+from .models import Category, Product
+from .search import MAX_SEARCH_LIMIT, has_trigram_support, search_products
 
-# Create your tests here.
+
+class ProductSearchTests(TestCase):
+    URL = '/api/products/search/'
+    
+    def setUp(self):
+        self.dairy = Category.objects.create(name='Dairy')
+        self.bakery = Category.objects.create(name='Bakery')
+        self.products = {}
+        for name, barcode, category in [
+            ('Chocolate Milk Shake', '5550001', self.dairy),
+            ('Milk', '5550002', self.dairy),
+            ('Milkmaid', '7770001', self.dairy),
+            ('Buttermilk', '7770002', self.dairy),
+            ('Bread', '555', self.bakery),
+            ('Mi Goreng', '8880001', self.bakery),
+        ]:
+            self.products[name] = Product.objects.create(
+                name=name, unit_price=Decimal('1.00'), category=category, barcode=barcode
+            )
+        self.staff = User.objects.create_user('staff', password='x', role='staff')
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+    
+    def search(self, **params):
+        response = self.api.get(self.URL, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [row['name'] for row in response.data]
+    
+    def test_exact_name_then_prefix_then_substring(self):
+        self.assertEqual(self.search(q='milk'), ['Milk', 'Milkmaid', 'Buttermilk', 'Chocolate Milk Shake'])
+    
+    def test_barcode_prefix(self):
+        self.assertEqual(set(self.search(q='5550')), {'Chocolate Milk Shake', 'Milk'})
+        self.assertEqual(self.search(q='5550002'), ['Milk'])
+        self.assertEqual(self.search(q='999'), [])
+    
+    def test_exact_barcode_ranks_before_prefixes(self):
+        self.assertEqual(self.search(q='555')[0], 'Bread')
+        self.assertEqual(self.search(q='555', limit=1), ['Bread'])
+    
+    def test_short_terms_only_match_name_prefixes(self):
+        # 'Buttermilk' and 'Chocolate Milk Shake' contain "mi" but do not start with it
+        self.assertEqual(self.search(q='mi'), ['Milk', 'Milkmaid', 'Mi Goreng'])
+    
+    def test_filters_and_limit(self):
+        self.products['Milkmaid'].is_active = False
+        self.products['Milkmaid'].save()
+        
+        self.assertEqual(self.search(q='milk', category_id=self.dairy.id, limit=2), ['Milk', 'Buttermilk'])
+        self.assertEqual(self.search(q='milk', is_active='false'), ['Milkmaid'])
+        self.assertEqual(len(search_products('m', limit=MAX_SEARCH_LIMIT)), 3)
+    
+    def test_rejects_missing_term_and_bad_limit(self):
+        self.assertEqual(self.api.get(self.URL).status_code, 400)
+        self.assertEqual(self.api.get(self.URL, {'q': 'milk', 'limit': 'ten'}).status_code, 400)
+    
+    @skipUnless(connection.vendor == 'postgresql', 'pg_trgm is PostgreSQL specific')
+    def test_trigram_similarity_uses_name_index(self):
+        if not has_trigram_support():
+            self.skipTest('pg_trgm is not installed')
+        with connection.cursor() as cursor:
+            # The fixture table is tiny; rule out the sequential scan it would get
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        
+        queryset = search_products('milk')
+        
+        self.assertIn('similarity', queryset.query.annotations)
+        self.assertIn('products_name_trgm_idx', queryset.explain())
@@ -7,6 +7,7 @@ from .views import (
     CategoryRetrieveUpdateDestroyView,
     ProductListCreateView,
     ProductRetrieveUpdateDestroyView,
+    ProductSearchView,
 )
 
 app_name = 'products'
@@ -18,6 +19,7 @@ urlpatterns = [
     
     # Product endpoints
     path('', ProductListCreateView.as_view(), name='product-list-create'),
+    path('search/', ProductSearchView.as_view(), name='product-search'),
     path('<int:pk>/', ProductRetrieveUpdateDestroyView.as_view(), name='product-detail'),
 ]
 
@@ -7,6 +7,8 @@ from rest_framework.permissions import IsAuthenticated
 from .models import Category, Product
 from .serializers import CategorySerializer, ProductSerializer
 from .permissions import IsAdminOrReadOnly
+from .search import SEARCH_FIELDS, search_products, get_search_limit
+from supermarket_analysis.pagination import ProductPagination
 
 
 # ============ Category Views ============
@@ -120,6 +122,7 @@ class ProductListCreateView(generics.ListCreateAPIView):
     queryset = Product.objects.select_related('category').all()
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    pagination_class = ProductPagination
     
     def get_queryset(self):
         """
@@ -145,7 +148,7 @@ class ProductListCreateView(generics.ListCreateAPIView):
         if search:
             queryset = queryset.filter(name__icontains=search)
         
-        return queryset.order_by('name')
+        return queryset.order_by('name', 'id')
     
     def create(self, request, *args, **kwargs):
         """
@@ -212,3 +215,55 @@ class ProductRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
             {'message': 'Product deleted successfully.'},
             status=status.HTTP_204_NO_CONTENT
         )
+
+
+class ProductSearchView(generics.GenericAPIView):
+    """
+    Ranked product typeahead by name fragment or barcode prefix
+    
+    GET /api/products/search/?q=milk&limit=10&category_id=1&is_active=true
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        term = request.query_params.get('q', '')
+        if not term.strip():
+            return Response(
+                {'error': 'q is required.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = get_search_limit(request.query_params.get('limit', None))
+        except ValueError:
+            return Response(
+                {'error': 'limit must be a whole number.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        queryset = Product.objects.all()
+        
+        category_id = request.query_params.get('category_id', None)
+        if category_id:
+            queryset = queryset.filter(category_id=category_id)
+        
+        # Only sellable products unless asked otherwise
+        is_active = request.query_params.get('is_active', 'true')
+        if is_active.lower() == 'true':
+            queryset = queryset.filter(is_active=True)
+        elif is_active.lower() == 'false':
+            queryset = queryset.filter(is_active=False)
+        
+        rows = search_products(term, queryset, limit).values(*SEARCH_FIELDS)
+        
+        return Response([
+            {
+                'id': row['id'],
+                'name': row['name'],
+                'barcode': row['barcode'],
+                'unit_price': str(row['unit_price']),
+                'category': row['category_id'],
+                'category_name': row['category__name'],
+                'is_active': row['is_active'],
+            }
+            for row in rows
+        ])
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Sale, SaleItem
+from .models import Sale, SaleItem, ReceiptSequence
 
 
 class SaleItemInline(admin.TabularInline):
@@ -11,15 +11,15 @@ class SaleItemInline(admin.TabularInline):
 
 @admin.register(Sale)
 class SaleAdmin(admin.ModelAdmin):
-    list_display = ['id', 'shop', 'staff', 'transaction_date', 'total_amount', 'final_amount', 'payment_method', 'item_count']
+    list_display = ['id', 'shop', 'receipt_no', 'staff', 'transaction_date', 'total_amount', 'final_amount', 'payment_method', 'item_count']
     list_filter = ['shop', 'payment_method', 'transaction_date', 'created_at']
-    search_fields = ['id', 'shop__name', 'staff__username']
-    readonly_fields = ['total_amount', 'final_amount', 'created_at', 'item_count']
+    search_fields = ['id', 'receipt_no', 'shop__name', 'staff__username']
+    readonly_fields = ['receipt_no', 'total_amount', 'final_amount', 'created_at', 'item_count']
     inlines = [SaleItemInline]
     
     fieldsets = (
         ('Basic Information', {
-            'fields': ('shop', 'staff', 'transaction_date')
+            'fields': ('shop', 'receipt_no', 'staff', 'transaction_date')
         }),
         ('Amounts', {
             'fields': ('total_amount', 'discount', 'tax', 'final_amount')
@@ -40,3 +40,9 @@ class SaleItemAdmin(admin.ModelAdmin):
     list_filter = ['sale__shop', 'product__category', 'created_at']
     search_fields = ['sale__id', 'product__name']
     readonly_fields = ['subtotal', 'created_at']
+
+
+@admin.register(ReceiptSequence)
+class ReceiptSequenceAdmin(admin.ModelAdmin):
+    list_display = ['shop', 'last_number']
+    readonly_fields = ['last_number']
@@ -0,0 +1,265 @@
+"""
+Multi-dimensional sales breakdowns
+
+Any combination of shop, category, product, payment method, staff and time
+bucket is answered by one grouped query. Breakdowns by sale attributes only
+read the sales table; category and product need the line items, so those
+group sale_items joined to their sale instead.
+"""
+import copy
+from django.db import connection
+from django.db.models import Q, F, Sum, Count, DateField, DecimalField
+from django.db.models.functions import Trunc, ExtractIsoWeekDay
+from .models import Sale, SaleItem
+from .rollups import HOURLY, DAY_OF_WEEK, PERIOD_KINDS
+
+
+# Dimension -> (id lookup, label lookup or None) on Sale
+SALE_DIMENSIONS = {
+    'shop': ('shop_id', 'shop__name'),
+    'payment_method': ('payment_method', None),
+    'staff': ('staff_id', 'staff__username'),
+}
+
+# Dimension -> (id lookup, label lookup) on SaleItem
+ITEM_DIMENSIONS = {
+    'category': ('product__category_id', 'product__category__name'),
+    'product': ('product_id', 'product__name'),
+}
+
+TIME_DIMENSION = 'time'
+
+DIMENSIONS = [*SALE_DIMENSIONS, *ITEM_DIMENSIONS, TIME_DIMENSION]
+
+
+def parse_group_by(value):
+    """
+    Parse a comma separated group_by parameter into known dimensions
+    
+    Raises ValueError for unknown or empty dimension lists.
+    """
+    dimensions = []
+    for name in (value or '').split(','):
+        name = name.strip()
+        if not name or name in dimensions:
+            continue
+        if name not in DIMENSIONS:
+            raise ValueError(name)
+        dimensions.append(name)
+    if not dimensions:
+        raise ValueError(value)
+    return dimensions
+
+
+def prefix_q(q, prefix):
+    """Copy of a Q with every lookup moved under a relation, e.g. 'sale__'"""
+    prefixed = copy.copy(q)
+    prefixed.children = [
+        prefix_q(child, prefix) if isinstance(child, Q) else (prefix + child[0], child[1])
+        for child in q.children
+    ]
+    return prefixed
+
+
+def time_bucket(field, period):
+    """Expression grouping a transaction datetime into report buckets"""
+    if period == DAY_OF_WEEK:
+        return ExtractIsoWeekDay(field)
+    if period == HOURLY:
+        return Trunc(field, 'hour')
+    return Trunc(field, PERIOD_KINDS[period], output_field=DateField())
+
+
+def breakdown_rows(dimensions, shop_q, start=None, end=None, period='daily', totals=False):
+    """
+    Sales totals grouped by the requested dimensions in a single query
+    
+    Args:
+        dimensions: List of names from DIMENSIONS
+        shop_q: Q on `shop` / `shop_id` of the sale
+        start: Optional aware datetime (inclusive)
+        end: Optional aware datetime (inclusive)
+        period: Time bucket used when 'time' is one of the dimensions
+        totals: Also return a subtotal row after each group of every leading
+            dimension and a grand total row last (see breakdown_totals)
+    
+    Returns:
+        List of dicts with the id and label of each dimension ('shop_id',
+        'shop_name', 'payment_method', ...), 'bucket' for the time dimension,
+        and total_sales, total_revenue (plus total_quantity for item breakdowns)
+    """
+    by_item = any(name in ITEM_DIMENSIONS for name in dimensions)
+    
+    if by_item:
+        # Line revenue before bill-level discount and tax
+        prefix = 'sale__'
+        queryset = SaleItem.objects.all()
+    else:
+        prefix = ''
+        queryset = Sale.objects.all()
+    
+    queryset = queryset.filter(prefix_q(shop_q, prefix))
+    if start is not None:
+        queryset = queryset.filter(**{f'{prefix}transaction_date__gte': start})
+    if end is not None:
+        queryset = queryset.filter(**{f'{prefix}transaction_date__lte': end})
+    
+    # Dimension -> {output key: lookup}, in dimension order. Labels are
+    # functionally dependent on the ids, so grouping on them too keeps the
+    # grouping as is
+    keys = {}
+    for name in dimensions:
+        if name == TIME_DIMENSION:
+            queryset = queryset.annotate(bucket=time_bucket(f'{prefix}transaction_date', period))
+            keys[name] = {'bucket': 'bucket'}
+            continue
+        if name in SALE_DIMENSIONS:
+            id_lookup, label_lookup = SALE_DIMENSIONS[name]
+            id_lookup = prefix + id_lookup
+            label_lookup = label_lookup and prefix + label_lookup
+        else:
+            id_lookup, label_lookup = ITEM_DIMENSIONS[name]
+        if label_lookup:
+            keys[name] = {f'{name}_id': id_lookup, f'{name}_name': label_lookup}
+        else:
+            keys[name] = {name: id_lookup}
+    
+    if not totals:
+        return grouped_rows(queryset, keys, by_item)
+    if connection.vendor == 'postgresql':
+        return rollup_rows(queryset, keys, by_item, period)
+    return breakdown_totals(queryset, keys, by_item)
+
+
+def breakdown_metrics(by_item):
+    """Aggregates of a breakdown over sale_items or sales"""
+    if by_item:
+        return {
+            'total_sales': Count('sale_id', distinct=True),
+            'total_quantity': Sum('quantity'),
+            'total_revenue': Sum('subtotal', output_field=DecimalField()),
+        }
+    return {
+        'total_sales': Count('id'),
+        'total_revenue': Sum('final_amount', output_field=DecimalField()),
+    }
+
+
+def grouped_rows(queryset, keys, by_item):
+    """Rows of the breakdown grouped by every dimension in `keys`"""
+    lookups = {key: lookup for dimension_keys in keys.values() for key, lookup in dimension_keys.items()}
+    metrics = breakdown_metrics(by_item)
+    
+    if not lookups:
+        rows = [queryset.aggregate(**metrics)]
+    else:
+        rows = queryset.values(*lookups.values()).annotate(**metrics).order_by(*lookups.values())
+    return [
+        {
+            **{key: row[lookup] for key, lookup in lookups.items()},
+            **{metric: row[metric] for metric in metrics},
+        }
+        for row in rows
+    ]
+
+
+def total_label(dimensions, level):
+    """
+    'total' of a row keeping the first `level` dimensions: None for plain
+    rows, the last kept dimension for subtotals, 'all' for the grand total
+    """
+    if level == len(dimensions):
+        return None
+    return dimensions[level - 1] if level else 'all'
+
+
+def breakdown_totals(queryset, keys, by_item):
+    """
+    Breakdown rows with subtotals and a grand total, one query per level
+    
+    Fallback for databases without GROUP BY ROLLUP. Rows are ordered like
+    rollup_rows: each subtotal follows the rows it adds up, the grand
+    total comes last.
+    """
+    dimensions = list(keys)
+    all_keys = [key for dimension_keys in keys.values() for key in dimension_keys]
+    
+    leveled = []
+    for level in range(len(dimensions), -1, -1):
+        kept = {name: keys[name] for name in dimensions[:level]}
+        for row in grouped_rows(queryset, kept, by_item):
+            row = {**{key: None for key in all_keys}, **row, 'total': total_label(dimensions, level)}
+            leveled.append((level, row))
+    
+    def order(entry):
+        level, row = entry
+        # Rolled up dimensions sort after the rows they add up, like NULLs do
+        # after values on PostgreSQL
+        sort_key = []
+        for index, name in enumerate(dimensions):
+            value = row[next(iter(keys[name]))]
+            sort_key.append((level <= index, value is None, value))
+        return sort_key
+    
+    leveled.sort(key=order)
+    return [row for _, row in leveled]
+
+
+def rollup_rows(queryset, keys, by_item, period):
+    """
+    Breakdown rows with subtotals and a grand total in one GROUP BY ROLLUP
+    
+    PostgreSQL only. The ORM compiles the filtered, ungrouped rows; they are
+    grouped with ROLLUP over each dimension's (id, label) columns, which the
+    ORM cannot express. Distinct sale counts are taken per level, so a bill
+    spanning two categories still counts once in its shop's subtotal.
+    """
+    quote = connection.ops.quote_name
+    dimensions = list(keys)
+    
+    lookups = {key: lookup for dimension_keys in keys.values() for key, lookup in dimension_keys.items()}
+    aliases = {key: f'd{index}' for index, key in enumerate(lookups)}
+    inputs = {aliases[key]: F(lookup) for key, lookup in lookups.items()}
+    if by_item:
+        inputs.update(m_sale=F('sale_id'), m_quantity=F('quantity'), m_revenue=F('subtotal'))
+    else:
+        inputs.update(m_sale=F('id'), m_revenue=F('final_amount'))
+    inner_sql, params = queryset.annotate(**inputs).values(*inputs).order_by().query.sql_with_params()
+    
+    columns = []
+    for key, alias in aliases.items():
+        column = alias
+        if key == 'bucket' and period == DAY_OF_WEEK:
+            # EXTRACT returns a numeric and DATE_TRUNC a timestamp; cast
+            # back to the bucket's type
+            column = f'CAST({alias} AS integer)'
+        elif key == 'bucket' and period != HOURLY:
+            column = f'CAST({alias} AS date)'
+        columns.append(f'{column} AS {quote(key)}')
+    
+    first_aliases = [aliases[next(iter(keys[name]))] for name in dimensions]
+    groupings = [f'GROUPING({alias}) AS g{index}' for index, alias in enumerate(first_aliases)]
+    metrics = ['COUNT(DISTINCT m_sale) AS total_sales']
+    if by_item:
+        metrics.append('SUM(m_quantity) AS total_quantity')
+    metrics.append('SUM(m_revenue) AS total_revenue')
+    rollup = ', '.join(
+        '(' + ', '.join(aliases[key] for key in keys[name]) + ')' for name in dimensions
+    )
+    order = ', '.join(f'GROUPING({alias}), {alias}' for alias in first_aliases)
+    
+    sql = (
+        f'SELECT {", ".join(columns + groupings + metrics)} FROM ({inner_sql}) AS lines '
+        f'GROUP BY ROLLUP ({rollup}) ORDER BY {order}'
+    )
+    
+    rows = []
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        names = [column[0] for column in cursor.description]
+        for values in cursor.fetchall():
+            row = dict(zip(names, values))
+            level = sum(1 for index in range(len(dimensions)) if not row.pop(f'g{index}'))
+            row['total'] = total_label(dimensions, level)
+            rows.append(row)
+    return rows
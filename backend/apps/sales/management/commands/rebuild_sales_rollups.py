@@ -0,0 +1,38 @@
+"""
+Rebuild the daily sales rollup table from raw sales
+"""
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from apps.sales.rollups import rebuild_daily_rollups, rebuild_product_rollups
+from apps.sales.report_cache import clear_report_cache
+
+
+class Command(BaseCommand):
+    help = 'Recompute daily_sales_rollups and product_sales_rollups from sales (all history or a date range)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--shop-id', type=int, help='Only rebuild this shop')
+        parser.add_argument('--start-date', help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end-date', help='Last day to rebuild (YYYY-MM-DD)')
+    
+    def handle(self, *args, **options):
+        try:
+            start_day = date.fromisoformat(options['start_date']) if options['start_date'] else None
+            end_day = date.fromisoformat(options['end_date']) if options['end_date'] else None
+        except ValueError:
+            raise CommandError('Dates must be in YYYY-MM-DD format.')
+        
+        filters = {
+            'shop_id': options['shop_id'],
+            'start_day': start_day,
+            'end_day': end_day,
+        }
+        
+        written = rebuild_daily_rollups(**filters)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} daily sales rollup rows.'))
+        
+        written = rebuild_product_rollups(**filters)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} product sales rollup rows.'))
+        
+        # Cached reports of closed periods may have been built from the old rows
+        clear_report_cache()
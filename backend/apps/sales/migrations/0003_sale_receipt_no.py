@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_receipt_numbers(apps, schema_editor):
+    """Number existing sales per shop in transaction order and seed the sequences"""
+    Sale = apps.get_model('sales', 'Sale')
+    ReceiptSequence = apps.get_model('sales', 'ReceiptSequence')
+    
+    # Clear Meta.ordering, or its columns make the distinct shop ids repeat
+    shop_ids = Sale.objects.order_by('shop_id').values_list('shop_id', flat=True).distinct()
+    for shop_id in shop_ids:
+        sales = list(Sale.objects.filter(shop_id=shop_id).order_by('transaction_date', 'id').only('id'))
+        for number, sale in enumerate(sales, start=1):
+            sale.receipt_no = number
+        Sale.objects.bulk_update(sales, ['receipt_no'], batch_size=1000)
+        ReceiptSequence.objects.create(shop_id=shop_id, last_number=len(sales))
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('shops', '0001_initial'),
+        ('sales', '0002_keyset_pagination_indexes'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='ReceiptSequence',
+            fields=[
+                ('shop', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='receipt_sequence', serialize=False, to='shops.shop')),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'receipt_sequences',
+            },
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='receipt_no',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Per-shop receipt number', null=True),
+        ),
+        migrations.RunPython(backfill_receipt_numbers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='sale',
+            constraint=models.UniqueConstraint(fields=('shop', 'receipt_no'), name='sales_shop_receipt_no_uniq'),
+        ),
+    ]
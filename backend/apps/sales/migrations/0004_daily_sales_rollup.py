@@ -0,0 +1,72 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_rollups(apps, schema_editor):
+    """Summarise existing sales into the rollup table"""
+    Sale = apps.get_model('sales', 'Sale')
+    DailySalesRollup = apps.get_model('sales', 'DailySalesRollup')
+    
+    aggregates = {
+        'sale_count': Count('id'),
+        'total_revenue': Sum('final_amount'),
+        'total_amount': Sum('total_amount'),
+        'total_discount': Sum('discount'),
+        'total_tax': Sum('tax'),
+    }
+    for method in ['cash', 'card', 'upi', 'other']:
+        aggregates[f'{method}_count'] = Count('id', filter=Q(payment_method=method))
+        aggregates[f'{method}_revenue'] = Sum('final_amount', filter=Q(payment_method=method))
+    
+    rows = Sale.objects.annotate(day=TruncDate('transaction_date')).values('shop_id', 'day').annotate(
+        **aggregates
+    ).order_by('shop_id', 'day')
+    
+    DailySalesRollup.objects.bulk_create(
+        [DailySalesRollup(**{key: value or 0 for key, value in row.items()}) for row in rows],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0001_initial'),
+        ('sales', '0003_sale_receipt_no'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sale_count', models.PositiveIntegerField(default=0)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('total_discount', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('total_tax', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('cash_count', models.PositiveIntegerField(default=0)),
+                ('cash_revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('card_count', models.PositiveIntegerField(default=0)),
+                ('card_revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('upi_count', models.PositiveIntegerField(default=0)),
+                ('upi_revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('other_count', models.PositiveIntegerField(default=0)),
+                ('other_revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales_rollups', to='shops.shop')),
+            ],
+            options={
+                'db_table': 'daily_sales_rollups',
+                'ordering': ['day', 'shop'],
+                'indexes': [models.Index(fields=['day'], name='rollups_day_idx')],
+                'unique_together': {('shop', 'day')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_product_rollups(apps, schema_editor):
+    """Summarise existing sale items into the per-product rollup table"""
+    SaleItem = apps.get_model('sales', 'SaleItem')
+    ProductSalesRollup = apps.get_model('sales', 'ProductSalesRollup')
+    
+    rows = SaleItem.objects.annotate(
+        shop_id=F('sale__shop_id'), day=TruncDate('sale__transaction_date')
+    ).values('shop_id', 'product_id', 'day').annotate(
+        quantity=Sum('quantity'), revenue=Sum('subtotal')
+    ).order_by('shop_id', 'day', 'product_id')
+    
+    ProductSalesRollup.objects.bulk_create(
+        [ProductSalesRollup(**{key: value or 0 for key, value in row.items()}) for row in rows],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_keyset_pagination_indexes'),
+        ('shops', '0001_initial'),
+        ('sales', '0004_daily_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='products.product')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_sales_rollups', to='shops.shop')),
+            ],
+            options={
+                'db_table': 'product_sales_rollups',
+                'ordering': ['day', 'shop', 'product'],
+                'indexes': [models.Index(fields=['day', 'product'], name='product_rollups_day_idx')],
+                'unique_together': {('shop', 'day', 'product')},
+            },
+        ),
+        migrations.RunPython(backfill_product_rollups, migrations.RunPython.noop),
+    ]
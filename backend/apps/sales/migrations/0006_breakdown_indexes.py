@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_product_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['transaction_date', 'shop', 'payment_method'], include=('staff', 'final_amount'), name='sales_breakdown_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saleitem',
+            index=models.Index(fields=['sale', 'product'], include=('quantity', 'subtotal'), name='sale_items_breakdown_idx'),
+        ),
+    ]
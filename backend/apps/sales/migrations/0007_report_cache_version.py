@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_breakdown_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportCacheVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=1)),
+            ],
+            options={
+                'db_table': 'report_cache_versions',
+            },
+        ),
+    ]
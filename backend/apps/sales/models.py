@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
@@ -15,6 +16,7 @@ class Sale(models.Model):
     ]
     
     shop = models.ForeignKey('shops.Shop', on_delete=models.CASCADE, related_name='sales')
+    receipt_no = models.PositiveIntegerField(null=True, blank=True, editable=False, help_text="Per-shop receipt number")
     staff = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True, related_name='sales_made')
     transaction_date = models.DateTimeField(auto_now_add=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, validators=[MinValueValidator(Decimal('0.00'))])
@@ -31,6 +33,16 @@ class Sale(models.Model):
         indexes = [
             models.Index(fields=['shop', 'transaction_date']),
             models.Index(fields=['staff', 'transaction_date']),
+            models.Index(fields=['-transaction_date', '-id'], name='sales_txn_date_id_idx'),
+            # Breakdowns by shop/payment/staff over a date range (covering on PostgreSQL)
+            models.Index(
+                fields=['transaction_date', 'shop', 'payment_method'],
+                include=['staff', 'final_amount'],
+                name='sales_breakdown_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'receipt_no'], name='sales_shop_receipt_no_uniq'),
         ]
     
     def __str__(self):
@@ -48,9 +60,135 @@ class Sale(models.Model):
     @property
     def item_count(self):
         """Get total number of items in this sale"""
+        # Reuse prefetched items instead of issuing a COUNT per sale
+        prefetched = getattr(self, '_prefetched_objects_cache', {})
+        if 'items' in prefetched:
+            return len(prefetched['items'])
         return self.items.count()
 
 
+class ReceiptSequence(models.Model):
+    """
+    Last receipt number issued by each shop
+    
+    One row per shop, so concurrent checkouts only contend with sales
+    at the same shop instead of on a global lock.
+    """
+    shop = models.OneToOneField('shops.Shop', on_delete=models.CASCADE, primary_key=True, related_name='receipt_sequence')
+    last_number = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'receipt_sequences'
+    
+    def __str__(self):
+        return f"{self.shop.name} - last receipt #{self.last_number}"
+    
+    @classmethod
+    def next_number(cls, shop):
+        """
+        Allocate the next receipt number for a shop
+        
+        Must run inside the sale's transaction: the row stays locked by the
+        UPDATE until commit, so numbers are gap-free and never reused.
+        """
+        with transaction.atomic():
+            cls.objects.get_or_create(shop=shop)
+            cls.objects.filter(shop=shop).update(last_number=F('last_number') + 1)
+            return cls.objects.values_list('last_number', flat=True).get(shop=shop)
+
+
+class DailySalesRollup(models.Model):
+    """
+    Pre-summed sales per shop per day
+    
+    Updated in the checkout transaction and rebuildable with
+    `manage.py rebuild_sales_rollups`. Reports read these rows
+    instead of scanning the sales table.
+    """
+    shop = models.ForeignKey('shops.Shop', on_delete=models.CASCADE, related_name='daily_sales_rollups')
+    day = models.DateField()
+    sale_count = models.PositiveIntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    total_discount = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    total_tax = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    
+    # Per payment method breakdown (see Sale.PAYMENT_METHOD_CHOICES)
+    cash_count = models.PositiveIntegerField(default=0)
+    cash_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    card_count = models.PositiveIntegerField(default=0)
+    card_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    upi_count = models.PositiveIntegerField(default=0)
+    upi_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    other_count = models.PositiveIntegerField(default=0)
+    other_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'daily_sales_rollups'
+        unique_together = ['shop', 'day']
+        ordering = ['day', 'shop']
+        indexes = [
+            models.Index(fields=['day'], name='rollups_day_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.shop.name} - {self.day} ({self.sale_count} sales)"
+
+
+class ProductSalesRollup(models.Model):
+    """
+    Units and revenue sold per shop, product and day
+    
+    Maintained on checkout alongside DailySalesRollup; powers the
+    top products report without joining sale_items.
+    """
+    shop = models.ForeignKey('shops.Shop', on_delete=models.CASCADE, related_name='product_sales_rollups')
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='sales_rollups')
+    day = models.DateField()
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    
+    class Meta:
+        db_table = 'product_sales_rollups'
+        unique_together = ['shop', 'day', 'product']
+        ordering = ['day', 'shop', 'product']
+        indexes = [
+            models.Index(fields=['day', 'product'], name='product_rollups_day_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.name} @ {self.shop.name} - {self.day} ({self.quantity} units)"
+
+
+class ReportCacheVersion(models.Model):
+    """
+    Namespace of the report cache keys
+    
+    A single row. Every cached report key includes the version, so bumping
+    it (after rollups are rebuilt) retires the entries of every server
+    process at once, whatever cache backend they use.
+    """
+    version = models.PositiveIntegerField(default=1)
+    
+    class Meta:
+        db_table = 'report_cache_versions'
+    
+    def __str__(self):
+        return f"Report cache v{self.version}"
+    
+    @classmethod
+    def current(cls):
+        obj, _ = cls.objects.get_or_create(pk=1)
+        return obj.version
+    
+    @classmethod
+    def bump(cls):
+        cls.objects.get_or_create(pk=1)
+        cls.objects.filter(pk=1).update(version=F('version') + 1)
+
+
 class SaleItem(models.Model):
     """
     Individual items in a sale (line items)
@@ -65,6 +203,14 @@ class SaleItem(models.Model):
     class Meta:
         db_table = 'sale_items'
         ordering = ['created_at']
+        indexes = [
+            # Breakdowns by product/category joined from sales (covering on PostgreSQL)
+            models.Index(
+                fields=['sale', 'product'],
+                include=['quantity', 'subtotal'],
+                name='sale_items_breakdown_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.product.name} x{self.quantity} - Sale #{self.sale.id}"
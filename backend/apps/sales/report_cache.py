@@ -0,0 +1,175 @@
+"""
+Response cache for the sales report endpoints
+
+Entries are keyed on (report, shop scope, parameters, normalized date range).
+Ranges that ended before today can no longer change and are cached for a
+long time. Ranges that include today carry the shop's generation number in
+their key; committing a sale or stock change for a shop bumps its generation,
+so stale entries are simply never read again and expire on their own.
+
+Every key also carries the ReportCacheVersion stored in the database.
+Rebuilding the rollups bumps it, which retires closed-period entries in
+every server process, not just the one running the rebuild.
+"""
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from .models import ReportCacheVersion
+from .rollups import day_start
+
+
+CACHE_ALIAS = 'reports'
+
+# Seconds to keep reports whose range ended before today
+CLOSED_TTL = getattr(settings, 'REPORT_CACHE_CLOSED_TTL', 60 * 60 * 24 * 7)
+
+# Seconds to keep reports that include today (also invalidated on writes)
+OPEN_TTL = getattr(settings, 'REPORT_CACHE_OPEN_TTL', 60 * 5)
+
+ALL_SHOPS = 'all'
+
+HITS_KEY = 'reports:stats:hits'
+MISSES_KEY = 'reports:stats:misses'
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def generation_key(shop):
+    return f'reports:gen:{shop}'
+
+
+def get_scope_shops(request):
+    """
+    Shops a report request is limited to, mirroring get_shop_scope
+    
+    Returns:
+        Sorted list of shop ids, or [ALL_SHOPS] for an unscoped request
+    """
+    shops = set()
+    if request.user.role in ['sales_manager', 'staff'] and request.user.shop:
+        shops.add(str(request.user.shop_id))
+    shop_id = request.query_params.get('shop_id', None)
+    if shop_id:
+        shops.add(str(shop_id))
+    return sorted(shops) or [ALL_SHOPS]
+
+
+def get_generations(shops):
+    """Current generation of each shop, starting a fresh one when missing"""
+    cache = get_cache()
+    keys = [generation_key(shop) for shop in shops]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # A unique value, so an evicted counter can never match old entries
+            cache.add(key, time.time_ns(), None)
+            generations[key] = cache.get(key)
+    return [str(generations[key]) for key in keys]
+
+
+def invalidate_shop_reports(shop_ids):
+    """
+    Drop the cached open-period reports of the given shops
+    
+    Unscoped (all shops) reports depend on every shop and are dropped too.
+    """
+    cache = get_cache()
+    generation = time.time_ns()
+    keys = [generation_key(shop_id) for shop_id in set(shop_ids)] + [generation_key(ALL_SHOPS)]
+    cache.set_many({key: generation for key in keys}, None)
+
+
+def schedule_report_invalidation(shop_ids):
+    """
+    Invalidate the shops' open-period reports once the current transaction commits
+    """
+    shop_ids = list(shop_ids)
+    transaction.on_commit(lambda: invalidate_shop_reports(shop_ids))
+
+
+def is_closed_range(end_date):
+    """True when a range ended before today and so can no longer change"""
+    return end_date is not None and end_date < day_start(timezone.localdate())
+
+
+def record_lookup(hit):
+    cache = get_cache()
+    key = HITS_KEY if hit else MISSES_KEY
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def get_cache_stats():
+    """Hit/miss counters of the report cache since they were last reset"""
+    counters = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / lookups if lookups else 0,
+    }
+
+
+def reset_cache_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
+
+
+def cached_report(request, report, start_date, end_date, build, **params):
+    """
+    Return a cached report or build and cache it
+    
+    Args:
+        request: The report request (for shop scope and the raw date params)
+        report: Report name, part of the cache key
+        start_date, end_date: Resolved range (either may be None)
+        build: Zero-argument callable producing the report
+        **params: Other parameters the report depends on (period, limit)
+    
+    Dates the client did not send resolve to "now"-relative defaults, so
+    they are keyed by name instead of by value.
+    """
+    cache = get_cache()
+    
+    if 'start_date' in request.query_params and start_date is not None:
+        start_part = start_date.isoformat()
+    else:
+        start_part = 'default'
+    if 'end_date' in request.query_params and end_date is not None:
+        end_part = end_date.isoformat()
+    else:
+        end_part = 'now'
+    
+    shops = get_scope_shops(request)
+    param_part = ':'.join(f'{name}={params[name]}' for name in sorted(params))
+    key = f'reports:v{ReportCacheVersion.current()}:{report}:{",".join(shops)}:{param_part}:{start_part}:{end_part}'
+    
+    closed = end_part != 'now' and is_closed_range(end_date)
+    if not closed:
+        key += ':' + ','.join(get_generations(shops))
+    
+    data = cache.get(key)
+    record_lookup(data is not None)
+    if data is None:
+        data = build()
+        cache.set(key, data, CLOSED_TTL if closed else OPEN_TTL)
+    return data
+
+
+def clear_report_cache():
+    """
+    Retire every cached report (e.g. after rollups are rebuilt)
+    
+    Bumping the shared version makes other processes miss on their old
+    entries; this process's cache is also emptied to free the memory.
+    """
+    ReportCacheVersion.bump()
+    get_cache().clear()
@@ -5,219 +5,702 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-from django.db.models import Sum, Count, Q, DecimalField
-from django.db.models.functions import TruncDate, TruncWeek, TruncMonth, TruncYear
+from rest_framework.settings import api_settings
+from django.db.models import Q
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.text import compress_string
 from datetime import timedelta
-from decimal import Decimal
-from .models import Sale, SaleItem
+import calendar
+import hashlib
+import re
+from apps.analytics.renderers import ColumnarRenderer, CSVRenderer, NDJSONRenderer
 from .permissions import IsStaffOrSalesManagerOrAdmin, IsSalesManagerOrAdmin
+from apps.accounts.permissions import IsAdminOnly
+from .rollups import (
+    PAYMENT_METHODS, PERIOD_KINDS, METRIC_FIELDS, HOURLY, DAY_OF_WEEK, REPORT_PERIODS,
+    day_start, bucket_start, period_buckets, period_totals, range_totals, product_totals, window_totals,
+)
+from .report_cache import cached_report, get_cache_stats
+from .breakdowns import DIMENSIONS, TIME_DIMENSION, parse_group_by, breakdown_rows
+from .staff_performance import STAFF_COLUMNS, staff_performance_rows
 
+try:
+    import brotli
+except ImportError:  # optional, gzip is used without it
+    brotli = None
 
-class SalesReportView(APIView):
+
+accepts_brotli = re.compile(r'\bbr\b')
+accepts_gzip = re.compile(r'\bgzip\b')
+
+
+def parse_report_date(value):
+    """
+    Parse an ISO date/datetime query parameter into an aware datetime
+    
+    Raises ValueError if the value is not a valid ISO date.
+    """
+    parsed = timezone.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+# (report metric, rollup column) of the currency totals in the sales report
+REPORT_METRICS = [
+    (metric, column) for metric, column in METRIC_FIELDS.items() if metric != 'total_sales'
+]
+
+
+def format_period(bucket, period):
+    """
+    Label for a report bucket: a date for daily reports, the hour for hourly
+    reports, the weekday name for day-of-week reports and midnight of the
+    bucket's first day otherwise
+    """
+    if period == 'daily':
+        return bucket.isoformat()
+    if period == HOURLY:
+        return timezone.localtime(bucket).isoformat()
+    if period == DAY_OF_WEEK:
+        return calendar.day_name[bucket - 1].lower()
+    return day_start(bucket).isoformat()
+
+
+def invalid_period_response():
+    return Response(
+        {'error': f'Invalid period. Use: {", ".join(REPORT_PERIODS)}'},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
+def get_fill_gaps(request):
+    """Gap-filled (dense) series are returned when ?fill_gaps=true is passed"""
+    return request.query_params.get('fill_gaps', 'false').lower() == 'true'
+
+
+# Most buckets a gap-filled report returns (about 7 months of hours or 13 years of days)
+MAX_FILLED_BUCKETS = 5000
+
+# Shortest length of each period's buckets, to bound a range's bucket count
+BUCKET_LENGTHS = {
+    HOURLY: timedelta(hours=1),
+    'daily': timedelta(days=1),
+    'weekly': timedelta(weeks=1),
+    'monthly': timedelta(days=28),
+    'yearly': timedelta(days=365),
+}
+
+
+def has_too_many_buckets(period, start_date, end_date):
+    """Whether gap-filling the range could produce more than MAX_FILLED_BUCKETS buckets"""
+    if period not in BUCKET_LENGTHS:
+        return False
+    return (end_date - start_date) // BUCKET_LENGTHS[period] + 1 > MAX_FILLED_BUCKETS
+
+
+def too_many_buckets_response():
+    return Response(
+        {'error': f'Range too long for fill_gaps. Use at most {MAX_FILLED_BUCKETS} periods.'},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
+# Most products a top products report returns
+MAX_TOP_PRODUCTS = 100
+
+
+def get_top_products_limit(value, default=10):
+    """
+    Parse a ?limit parameter, clamped to 1..MAX_TOP_PRODUCTS
+    
+    Raises ValueError if the value is not a whole number.
+    """
+    if value in (None, ''):
+        return default
+    return min(max(int(value), 1), MAX_TOP_PRODUCTS)
+
+
+def invalid_limit_response():
+    return Response(
+        {'error': 'Invalid limit. Use a whole number.'},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
+def get_shop_scope(request):
+    """
+    Q limiting reports to the shops the user may see and the requested shop_id
+    
+    Works on any model with a `shop` foreign key (sales, rollups, alerts).
+    """
+    shop_q = Q()
+    
+    # Filter by user role
+    if request.user.role in ['sales_manager', 'staff'] and request.user.shop:
+        shop_q &= Q(shop=request.user.shop)
+    
+    # Filter by shop if provided
+    shop_id = request.query_params.get('shop_id', None)
+    if shop_id:
+        shop_q &= Q(shop_id=shop_id)
+    
+    return shop_q
+
+
+def get_report_range(period, start_date=None, end_date=None):
+    """
+    Resolve the date range of a period report, applying per-period defaults
+    
+    Raises ValueError for invalid dates.
+    """
+    # Set default date range if not provided
+    if not end_date:
+        end_date = timezone.now()
+    else:
+        end_date = parse_report_date(end_date)
+    
+    if not start_date:
+        # Default to last 30 days for daily, last 12 weeks for weekly, etc.
+        if period == HOURLY:
+            start_date = end_date - timedelta(days=1)
+        elif period == 'daily':
+            start_date = end_date - timedelta(days=30)
+        elif period in ['weekly', DAY_OF_WEEK]:
+            start_date = end_date - timedelta(weeks=12)
+        elif period == 'monthly':
+            start_date = end_date - timedelta(days=365)
+        else:  # yearly
+            start_date = end_date - timedelta(days=365*5)
+    else:
+        start_date = parse_report_date(start_date)
+    
+    return start_date, end_date
+
+
+def get_optional_range(start_date=None, end_date=None):
+    """
+    Resolve an open-ended date range (either bound may be None)
+    
+    Raises ValueError for invalid dates.
+    """
+    start_date = parse_report_date(start_date) if start_date else None
+    end_date = parse_report_date(end_date) if end_date else None
+    return start_date, end_date
+
+
+def invalid_date_response():
+    return Response(
+        {'error': 'Invalid date. Use YYYY-MM-DD or an ISO 8601 datetime.'},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
+def build_sales_report(period, shop_q, start_date, end_date, fill_gaps=False):
+    """
+    Period series and summary for SalesReportView
+    
+    Args:
+        fill_gaps: Return every bucket in the range, with zeros where there
+            were no sales (day-of-week reports always have all seven days)
+    
+    Returns:
+        {'summary': {...}, 'data': [...]}
+    """
+    buckets, totals = period_totals(period, shop_q, start_date, end_date)
+    active_buckets = len(buckets)
+    
+    if fill_gaps or period == DAY_OF_WEEK:
+        buckets = {bucket: buckets.get(bucket, {}) for bucket in period_buckets(period, start_date, end_date)}
+    
+    # Format the data: one pass over the buckets, one float() per value
+    formatted_data = [
+        {
+            'period': format_period(bucket, period),
+            'total_sales': item.get('sale_count', 0),
+            **{metric: float(item.get(column, 0)) for metric, column in REPORT_METRICS},
+        }
+        for bucket, item in buckets.items()
+    ]
+    
+    # Summary statistics come from the grand totals computed with the series
+    summary = {
+        'total_sales': totals.get('sale_count', 0),
+        **{metric: float(totals.get(column, 0)) for metric, column in REPORT_METRICS},
+    }
+    summary.update({
+        'average_sale': summary['total_revenue'] / active_buckets if active_buckets else 0,
+        'period': period,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+    })
+    
+    return {
+        'summary': summary,
+        'data': formatted_data
+    }
+
+
+def build_payment_methods_report(shop_q, start_date=None, end_date=None):
+    """
+    Sales count and revenue per payment method, highest revenue first
+    """
+    totals = range_totals(shop_q, start_date, end_date)
+    
+    formatted_data = []
+    for method in PAYMENT_METHODS:
+        count = totals.get(f'{method}_count', 0)
+        if count:
+            formatted_data.append({
+                'payment_method': method,
+                'count': count,
+                'total_revenue': float(totals.get(f'{method}_revenue', 0)),
+            })
+    formatted_data.sort(key=lambda item: item['total_revenue'], reverse=True)
+    
+    return formatted_data
+
+
+def build_top_products_report(shop_q, start_date=None, end_date=None, limit=10):
+    """
+    Best selling products by quantity
+    """
+    top_products = product_totals(shop_q, start_date, end_date, limit=limit)
+    
+    formatted_data = []
+    for item in top_products:
+        formatted_data.append({
+            'product_id': item['product_id'],
+            'product_name': item['product_name'],
+            'total_quantity': float(item['quantity']),
+            'total_revenue': float(item['revenue']),
+        })
+    
+    return formatted_data
+
+
+# Windows a comparison report can be measured against
+COMPARE_TO = ['previous', 'last_year']
+
+
+def shift_months(value, months):
+    """Move a datetime by whole calendar months, clamping the day of month"""
+    month_index = value.month - 1 + months
+    year = value.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def shift_window(value, period, compare_to, periods=1):
+    """
+    Move a window bound back to the comparison window
+    
+    previous: `periods` periods earlier. last_year: one year earlier, keeping
+    the weekday for daily and weekly reports (52 weeks back).
+    """
+    if compare_to == 'last_year':
+        if period in ['daily', 'weekly']:
+            return value - timedelta(weeks=52)
+        return shift_months(value, -12)
+    if period == 'daily':
+        return value - timedelta(days=periods)
+    if period == 'weekly':
+        return value - timedelta(weeks=periods)
+    if period == 'monthly':
+        return shift_months(value, -periods)
+    return shift_months(value, -12 * periods)
+
+
+def window_periods(period, start_date, end_date):
+    """
+    Whole periods a window spans, so the previous window ends before it starts
+    
+    A 10 day window compared with the previous period of a daily report is
+    measured against the 10 days before it, not against a window one day
+    earlier that overlaps it.
+    """
+    periods = 1
+    while shift_window(end_date, period, 'previous', periods) >= start_date:
+        periods += 1
+    return periods
+
+
+def get_comparison_range(period, start_date=None, end_date=None):
+    """
+    Resolve the current window of a comparison report
+    
+    Defaults to the current period to date (e.g. this month so far).
+    Raises ValueError for invalid dates.
+    """
+    end_date = parse_report_date(end_date) if end_date else timezone.now()
+    if start_date:
+        start_date = parse_report_date(start_date)
+    else:
+        start_date = day_start(bucket_start(timezone.localtime(end_date).date(), period))
+    return start_date, end_date
+
+
+def build_comparison_report(period, compare_to, shop_q, start_date, end_date):
+    """
+    Totals of the current and comparison windows with absolute and relative change
+    """
+    periods = window_periods(period, start_date, end_date)
+    previous_start = shift_window(start_date, period, compare_to, periods)
+    previous_end = shift_window(end_date, period, compare_to, periods)
+    
+    totals = window_totals(shop_q, {
+        'current': (start_date, end_date),
+        'previous': (previous_start, previous_end),
+    })
+    
+    def summarize(values, start, end):
+        return {
+            'start_date': start.isoformat(),
+            'end_date': end.isoformat(),
+            'total_sales': values.get('sale_count', 0),
+            **{metric: float(values.get(column, 0)) for metric, column in REPORT_METRICS},
+        }
+    
+    current = summarize(totals['current'], start_date, end_date)
+    previous = summarize(totals['previous'], previous_start, previous_end)
+    
+    change = {}
+    change_pct = {}
+    for metric in METRIC_FIELDS:
+        change[metric] = current[metric] - previous[metric]
+        change_pct[metric] = round(change[metric] / previous[metric] * 100, 2) if previous[metric] else None
+    
+    return {
+        'period': period,
+        'compare_to': compare_to,
+        'current': current,
+        'previous': previous,
+        'change': change,
+        'change_pct': change_pct,
+    }
+
+
+def build_breakdown_report(dimensions, shop_q, start_date=None, end_date=None, period='daily', totals=False):
+    """
+    Sales totals for every combination of the requested dimensions
+    
+    Args:
+        totals: Add subtotal and grand total rows (see breakdown_rows)
+    """
+    formatted_data = []
+    for row in breakdown_rows(dimensions, shop_q, start_date, end_date, period, totals):
+        item = {}
+        for key, value in row.items():
+            if key == 'bucket':
+                item['period'] = value if value is None else format_period(value, period)
+            elif key == 'total_revenue':
+                item[key] = float(value or 0)
+            else:
+                item[key] = value
+        formatted_data.append(item)
+    
+    return formatted_data
+
+
+def compress_response(request, response, min_length=200):
+    """
+    Compress a rendered response with brotli or gzip, as the client accepts
+    
+    Brotli is only used when the optional `brotli` package is installed.
+    Small bodies, and bodies that would not shrink, are left as they are.
+    """
+    if len(response.content) < min_length or response.has_header('Content-Encoding'):
+        return response
+    
+    patch_vary_headers(response, ('Accept-Encoding',))
+    accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    
+    if brotli is not None and accepts_brotli.search(accept_encoding):
+        content, encoding = brotli.compress(response.content), 'br'
+    elif accepts_gzip.search(accept_encoding):
+        content, encoding = compress_string(response.content), 'gzip'
+    else:
+        return response
+    
+    if len(content) >= len(response.content):
+        return response
+    
+    response.content = content
+    response['Content-Length'] = str(len(content))
+    response['Content-Encoding'] = encoding
+    return response
+
+
+class ReportResponseMixin:
+    """
+    Columnar format, ETag and compression for report views
+    
+    ?format=columnar returns the `data` rows as one array per field. Every
+    successful response carries a weak ETag of its body, so unchanged reports
+    are answered with 304 Not Modified, and is compressed when the client
+    accepts it.
+    """
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarRenderer]
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        
+        response.render()
+        etag = 'W/"%s"' % hashlib.md5(response.content).hexdigest()
+        response['ETag'] = etag
+        
+        conditional = get_conditional_response(request, etag=etag, response=response)
+        if conditional is not response:
+            return conditional
+        
+        return compress_response(request, response)
+
+
+class SalesReportView(ReportResponseMixin, APIView):
     """
     Generate sales reports for different time periods
-    GET /api/sales/reports/?period=daily|weekly|monthly|yearly&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD
+    
+    GET /api/sales/reports/?period=hourly|daily|weekly|monthly|yearly|day-of-week&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD&fill_gaps=true&format=columnar
+    
+    Whole days are read from DailySalesRollup; only partial days at the
+    edges of the range (and hourly reports) touch the sales table.
+    Responses are cached per shop scope and range (see report_cache).
     """
     permission_classes = [IsAuthenticated, IsSalesManagerOrAdmin]
     
     def get(self, request):
         period = request.query_params.get('period', 'daily')
-        start_date = request.query_params.get('start_date', None)
-        end_date = request.query_params.get('end_date', None)
-        shop_id = request.query_params.get('shop_id', None)
-        
-        # Base queryset
-        queryset = Sale.objects.all()
-        
-        # Filter by user role
-        if request.user.role in ['sales_manager', 'staff'] and request.user.shop:
-            queryset = queryset.filter(shop=request.user.shop)
-        
-        # Filter by shop if provided
-        if shop_id:
-            queryset = queryset.filter(shop_id=shop_id)
-        
-        # Set default date range if not provided
-        if not end_date:
-            end_date = timezone.now()
-        else:
-            end_date = timezone.datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-            if timezone.is_naive(end_date):
-                end_date = timezone.make_aware(end_date)
-        
-        if not start_date:
-            # Default to last 30 days for daily, last 12 weeks for weekly, etc.
-            if period == 'daily':
-                start_date = end_date - timedelta(days=30)
-            elif period == 'weekly':
-                start_date = end_date - timedelta(weeks=12)
-            elif period == 'monthly':
-                start_date = end_date - timedelta(days=365)
-            else:  # yearly
-                start_date = end_date - timedelta(days=365*5)
-        else:
-            start_date = timezone.datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            if timezone.is_naive(start_date):
-                start_date = timezone.make_aware(start_date)
-        
-        queryset = queryset.filter(transaction_date__gte=start_date, transaction_date__lte=end_date)
-        
-        # Aggregate based on period
-        if period == 'daily':
-            queryset = queryset.annotate(period=TruncDate('transaction_date'))
-            group_by = 'period'
-        elif period == 'weekly':
-            queryset = queryset.annotate(period=TruncWeek('transaction_date'))
-            group_by = 'period'
-        elif period == 'monthly':
-            queryset = queryset.annotate(period=TruncMonth('transaction_date'))
-            group_by = 'period'
-        elif period == 'yearly':
-            queryset = queryset.annotate(period=TruncYear('transaction_date'))
-            group_by = 'period'
-        else:
-            return Response(
-                {'error': 'Invalid period. Use: daily, weekly, monthly, or yearly'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        fill_gaps = get_fill_gaps(request)
         
-        # Aggregate data
-        report_data = queryset.values(group_by).annotate(
-            total_sales=Count('id'),
-            total_revenue=Sum('final_amount', output_field=DecimalField()),
-            total_amount=Sum('total_amount', output_field=DecimalField()),
-            total_discount=Sum('discount', output_field=DecimalField()),
-            total_tax=Sum('tax', output_field=DecimalField()),
-        ).order_by(group_by)
-        
-        # Format the data
-        formatted_data = []
-        for item in report_data:
-            formatted_data.append({
-                'period': item['period'].isoformat() if item['period'] else None,
-                'total_sales': item['total_sales'],
-                'total_revenue': float(item['total_revenue'] or 0),
-                'total_amount': float(item['total_amount'] or 0),
-                'total_discount': float(item['total_discount'] or 0),
-                'total_tax': float(item['total_tax'] or 0),
-            })
+        if period not in REPORT_PERIODS:
+            return invalid_period_response()
         
-        # Calculate summary statistics
-        summary = {
-            'total_sales': sum(item['total_sales'] for item in formatted_data),
-            'total_revenue': sum(item['total_revenue'] for item in formatted_data),
-            'total_amount': sum(item['total_amount'] for item in formatted_data),
-            'total_discount': sum(item['total_discount'] for item in formatted_data),
-            'total_tax': sum(item['total_tax'] for item in formatted_data),
-            'average_sale': sum(item['total_revenue'] for item in formatted_data) / len(formatted_data) if formatted_data else 0,
-            'period': period,
-            'start_date': start_date.isoformat(),
-            'end_date': end_date.isoformat(),
-        }
+        try:
+            start_date, end_date = get_report_range(
+                period,
+                request.query_params.get('start_date', None),
+                request.query_params.get('end_date', None)
+            )
+        except ValueError:
+            return invalid_date_response()
         
-        return Response({
-            'summary': summary,
-            'data': formatted_data
-        })
+        if fill_gaps and has_too_many_buckets(period, start_date, end_date):
+            return too_many_buckets_response()
+        
+        shop_q = get_shop_scope(request)
+        return Response(cached_report(
+            request, 'sales', start_date, end_date,
+            lambda: build_sales_report(period, shop_q, start_date, end_date, fill_gaps),
+            period=period, fill_gaps=fill_gaps
+        ))
 
 
-class SalesByPaymentMethodView(APIView):
+class SalesByPaymentMethodView(ReportResponseMixin, APIView):
     """
     Get sales breakdown by payment method
+    
     GET /api/sales/reports/payment-methods/?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD
+    
+    Answered from the per-payment-method columns of DailySalesRollup.
+    Responses are cached per shop scope and range (see report_cache).
     """
     permission_classes = [IsAuthenticated, IsSalesManagerOrAdmin]
     
     def get(self, request):
-        start_date = request.query_params.get('start_date', None)
-        end_date = request.query_params.get('end_date', None)
-        shop_id = request.query_params.get('shop_id', None)
-        
-        queryset = Sale.objects.all()
-        
-        # Filter by user role
-        if request.user.role in ['sales_manager', 'staff'] and request.user.shop:
-            queryset = queryset.filter(shop=request.user.shop)
-        
-        if shop_id:
-            queryset = queryset.filter(shop_id=shop_id)
-        
-        if start_date:
-            start_date = timezone.datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            if timezone.is_naive(start_date):
-                start_date = timezone.make_aware(start_date)
-            queryset = queryset.filter(transaction_date__gte=start_date)
-        
-        if end_date:
-            end_date = timezone.datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-            if timezone.is_naive(end_date):
-                end_date = timezone.make_aware(end_date)
-            queryset = queryset.filter(transaction_date__lte=end_date)
-        
-        payment_data = queryset.values('payment_method').annotate(
-            count=Count('id'),
-            total_revenue=Sum('final_amount', output_field=DecimalField())
-        ).order_by('-total_revenue')
-        
-        formatted_data = []
-        for item in payment_data:
-            formatted_data.append({
-                'payment_method': item['payment_method'],
-                'count': item['count'],
-                'total_revenue': float(item['total_revenue'] or 0),
-            })
+        try:
+            start_date, end_date = get_optional_range(
+                request.query_params.get('start_date', None),
+                request.query_params.get('end_date', None)
+            )
+        except ValueError:
+            return invalid_date_response()
         
-        return Response({'data': formatted_data})
+        shop_q = get_shop_scope(request)
+        return Response({'data': cached_report(
+            request, 'payment_methods', start_date, end_date,
+            lambda: build_payment_methods_report(shop_q, start_date, end_date)
+        )})
 
 
-class TopProductsView(APIView):
+class TopProductsView(ReportResponseMixin, APIView):
     """
     Get top selling products
+    
     GET /api/sales/reports/top-products/?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD&limit=10
+    
+    Whole days are read from ProductSalesRollup instead of joining sale_items.
+    Responses are cached per shop scope and range (see report_cache).
     """
     permission_classes = [IsAuthenticated, IsSalesManagerOrAdmin]
     
     def get(self, request):
-        start_date = request.query_params.get('start_date', None)
-        end_date = request.query_params.get('end_date', None)
-        shop_id = request.query_params.get('shop_id', None)
-        limit = int(request.query_params.get('limit', 10))
-        
-        queryset = SaleItem.objects.select_related('sale', 'product')
-        
-        # Filter by user role
-        if request.user.role in ['sales_manager', 'staff'] and request.user.shop:
-            queryset = queryset.filter(sale__shop=request.user.shop)
-        
-        if shop_id:
-            queryset = queryset.filter(sale__shop_id=shop_id)
-        
-        if start_date:
-            start_date = timezone.datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            if timezone.is_naive(start_date):
-                start_date = timezone.make_aware(start_date)
-            queryset = queryset.filter(sale__transaction_date__gte=start_date)
-        
-        if end_date:
-            end_date = timezone.datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-            if timezone.is_naive(end_date):
-                end_date = timezone.make_aware(end_date)
-            queryset = queryset.filter(sale__transaction_date__lte=end_date)
-        
-        top_products = queryset.values('product__name', 'product__id').annotate(
-            total_quantity=Sum('quantity'),
-            total_revenue=Sum('subtotal', output_field=DecimalField())
-        ).order_by('-total_quantity')[:limit]
-        
-        formatted_data = []
-        for item in top_products:
-            formatted_data.append({
-                'product_id': item['product__id'],
-                'product_name': item['product__name'],
-                'total_quantity': float(item['total_quantity'] or 0),
-                'total_revenue': float(item['total_revenue'] or 0),
-            })
+        try:
+            limit = get_top_products_limit(request.query_params.get('limit', None))
+        except ValueError:
+            return invalid_limit_response()
+        
+        try:
+            start_date, end_date = get_optional_range(
+                request.query_params.get('start_date', None),
+                request.query_params.get('end_date', None)
+            )
+        except ValueError:
+            return invalid_date_response()
         
-        return Response({'data': formatted_data})
+        shop_q = get_shop_scope(request)
+        return Response({'data': cached_report(
+            request, 'top_products', start_date, end_date,
+            lambda: build_top_products_report(shop_q, start_date, end_date, limit),
+            limit=limit
+        )})
 
+
+class SalesComparisonView(ReportResponseMixin, APIView):
+    """
+    Period-over-period comparison (this month vs last month, this week vs
+    the same week last year, ...)
+    
+    GET /api/sales/reports/compare/?period=daily|weekly|monthly|yearly&compare_to=previous|last_year&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD
+    
+    Both windows come from the same rollup query, one FILTER per window.
+    """
+    permission_classes = [IsAuthenticated, IsSalesManagerOrAdmin]
+    
+    def get(self, request):
+        period = request.query_params.get('period', 'monthly')
+        compare_to = request.query_params.get('compare_to', 'previous')
+        
+        if period not in PERIOD_KINDS:
+            return Response(
+                {'error': f'Invalid period. Use: {", ".join(PERIOD_KINDS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if compare_to not in COMPARE_TO:
+            return Response(
+                {'error': f'Invalid compare_to. Use: {", ".join(COMPARE_TO)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            start_date, end_date = get_comparison_range(
+                period,
+                request.query_params.get('start_date', None),
+                request.query_params.get('end_date', None)
+            )
+        except ValueError:
+            return invalid_date_response()
+        
+        shop_q = get_shop_scope(request)
+        return Response(cached_report(
+            request, 'compare', start_date, end_date,
+            lambda: build_comparison_report(period, compare_to, shop_q, start_date, end_date),
+            period=period, compare_to=compare_to
+        ))
+
+
+class SalesBreakdownView(ReportResponseMixin, APIView):
+    """
+    Sales grouped by any combination of shop, category, product, payment
+    method, staff and time bucket, in one grouped query
+    
+    GET /api/sales/reports/breakdown/?group_by=shop,category,time&period=monthly&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD&totals=true
+    
+    Breakdowns by category or product report line revenue (before bill
+    discount and tax) and units sold; the others report bill revenue.
+    ?totals=true adds subtotal rows and a grand total.
+    """
+    permission_classes = [IsAuthenticated, IsSalesManagerOrAdmin]
+    
+    def get(self, request):
+        try:
+            dimensions = parse_group_by(request.query_params.get('group_by', 'shop'))
+        except ValueError:
+            return Response(
+                {'error': f'Invalid group_by. Use a comma separated list of: {", ".join(DIMENSIONS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        period = request.query_params.get('period', 'daily')
+        if period not in REPORT_PERIODS:
+            return invalid_period_response()
+        
+        try:
+            if TIME_DIMENSION in dimensions:
+                start_date, end_date = get_report_range(
+                    period,
+                    request.query_params.get('start_date', None),
+                    request.query_params.get('end_date', None)
+                )
+            else:
+                start_date, end_date = get_optional_range(
+                    request.query_params.get('start_date', None),
+                    request.query_params.get('end_date', None)
+                )
+        except ValueError:
+            return invalid_date_response()
+        
+        totals = request.query_params.get('totals', 'false').lower() == 'true'
+        shop_q = get_shop_scope(request)
+        return Response({'data': cached_report(
+            request, 'breakdown', start_date, end_date,
+            lambda: build_breakdown_report(dimensions, shop_q, start_date, end_date, period, totals),
+            group_by=','.join(dimensions), period=period, totals=totals
+        )})
+
+
+class StaffPerformanceView(APIView):
+    """
+    Sales, revenue and throughput per staff member
+    
+    GET /api/sales/reports/staff/?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD&shop_id=1&staff_id=1&format=json|csv|ndjson
+    
+    Rows are read in staff order along the (staff, transaction_date) index;
+    with format=csv or ndjson they are streamed as they are read.
+    """
+    permission_classes = [IsAuthenticated, IsSalesManagerOrAdmin]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, CSVRenderer, NDJSONRenderer]
+    
+    def get(self, request):
+        from apps.analytics.exports import stream_csv, stream_ndjson
+        
+        try:
+            start_date, end_date = get_optional_range(
+                request.query_params.get('start_date', None),
+                request.query_params.get('end_date', None)
+            )
+        except ValueError:
+            return invalid_date_response()
+        
+        rows = staff_performance_rows(
+            get_shop_scope(request), start_date, end_date,
+            staff_id=request.query_params.get('staff_id', None)
+        )
+        
+        if request.accepted_renderer.format in ['csv', 'ndjson']:
+            values = ([row[column] for column in STAFF_COLUMNS] for row in rows)
+            if request.accepted_renderer.format == 'ndjson':
+                response = StreamingHttpResponse(stream_ndjson(values, STAFF_COLUMNS), content_type='application/x-ndjson')
+            else:
+                response = StreamingHttpResponse(stream_csv(values, STAFF_COLUMNS), content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="staff_performance.{request.accepted_renderer.format}"'
+            return response
+        
+        return Response({'data': list(rows)})
+
+
+class ReportCacheStatsView(APIView):
+    """
+    Hit/miss counters of the report cache
+    
+    GET /api/sales/reports/cache-stats/
+    """
+    permission_classes = [IsAuthenticated, IsAdminOnly]
+    
+    def get(self, request):
+        return Response(get_cache_stats())
@@ -0,0 +1,600 @@
+"""
+Maintenance and query helpers for the daily sales rollup
+
+Reports split a date range into whole days, answered from DailySalesRollup,
+and at most two partial days at the edges, answered from the sales table.
+Results are exact for any range while scanning only pre-summed rows.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Sum, Count, Q, F, Case, When, Value, DecimalField, IntegerField
+from django.db.models.functions import Trunc, TruncDate, TruncHour, ExtractIsoWeekDay
+from django.utils import timezone
+from .models import Sale, SaleItem, DailySalesRollup, ProductSalesRollup
+
+
+PAYMENT_METHODS = [code for code, _ in Sale.PAYMENT_METHOD_CHOICES]
+
+# Trunc kind used for each report period
+PERIOD_KINDS = {
+    'daily': 'day',
+    'weekly': 'week',
+    'monthly': 'month',
+    'yearly': 'year',
+}
+
+HOURLY = 'hourly'
+
+# Sales profile by weekday (Monday=1 ... Sunday=7) instead of a time series
+DAY_OF_WEEK = 'day-of-week'
+
+# Every period accepted by the sales report
+REPORT_PERIODS = [*PERIOD_KINDS, HOURLY, DAY_OF_WEEK]
+
+# Report metric -> rollup column
+METRIC_FIELDS = {
+    'total_sales': 'sale_count',
+    'total_revenue': 'total_revenue',
+    'total_amount': 'total_amount',
+    'total_discount': 'total_discount',
+    'total_tax': 'total_tax',
+}
+
+
+def day_start(day):
+    """Aware datetime for local midnight at the start of a day"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def bucket_start(day, period):
+    """
+    First day of the report bucket (day/week/month/year) containing a day,
+    or its ISO weekday number for day-of-week reports
+    """
+    if period == DAY_OF_WEEK:
+        return day.isoweekday()
+    if period == 'weekly':
+        return day - timedelta(days=day.weekday())
+    if period == 'monthly':
+        return day.replace(day=1)
+    if period == 'yearly':
+        return day.replace(month=1, day=1)
+    return day
+
+
+def next_bucket(bucket, period):
+    """First day of the report bucket following the one starting on `bucket`"""
+    if period == 'weekly':
+        return bucket + timedelta(weeks=1)
+    if period == 'monthly':
+        return (bucket.replace(day=28) + timedelta(days=4)).replace(day=1)
+    if period == 'yearly':
+        return bucket.replace(year=bucket.year + 1)
+    return bucket + timedelta(days=1)
+
+
+def period_buckets(period, start, end):
+    """
+    Every bucket of a report period between two aware datetimes, in order
+    
+    Used to gap-fill report series so they have a fixed, predictable shape.
+    Keys match those returned by period_totals.
+    """
+    if period == DAY_OF_WEEK:
+        return list(range(1, 8))
+    
+    if period == HOURLY:
+        # Step in UTC so DST changes neither skip nor repeat an hour
+        hour = timezone.localtime(start).replace(minute=0, second=0, microsecond=0)
+        hour = hour.astimezone(dt_timezone.utc)
+        buckets = []
+        while hour <= end:
+            buckets.append(timezone.localtime(hour))
+            hour += timedelta(hours=1)
+        return buckets
+    
+    bucket = bucket_start(timezone.localtime(start).date(), period)
+    last = bucket_start(timezone.localtime(end).date(), period)
+    buckets = []
+    while bucket <= last:
+        buckets.append(bucket)
+        bucket = next_bucket(bucket, period)
+    return buckets
+
+
+def split_range(start=None, end=None):
+    """
+    Split [start, end] into whole days and partial-day edges
+    
+    Args:
+        start: Optional aware datetime (inclusive)
+        end: Optional aware datetime (inclusive)
+    
+    Returns:
+        (rollup_q, sales_q) - Q on DailySalesRollup.day for the whole days and
+        Q on Sale.transaction_date for the edges. Either may be None when that
+        part of the range is empty.
+    """
+    first_day = None
+    last_day = None
+    
+    if start is not None:
+        first_day = timezone.localtime(start).date()
+        if start != day_start(first_day):
+            first_day += timedelta(days=1)
+    
+    if end is not None:
+        # The end day is never complete: sales can still arrive up to `end`
+        last_day = timezone.localtime(end).date() - timedelta(days=1)
+    
+    if first_day is not None and last_day is not None and first_day > last_day:
+        # No whole day in the range, read it all from sales
+        sales_q = Q(transaction_date__gte=start, transaction_date__lte=end)
+        return None, sales_q
+    
+    rollup_q = Q()
+    sales_q = None
+    
+    if first_day is not None:
+        rollup_q &= Q(day__gte=first_day)
+        if start < day_start(first_day):
+            sales_q = Q(transaction_date__gte=start, transaction_date__lt=day_start(first_day))
+    
+    if last_day is not None:
+        rollup_q &= Q(day__lte=last_day)
+        tail_q = Q(transaction_date__gte=day_start(last_day + timedelta(days=1)), transaction_date__lte=end)
+        sales_q = tail_q if sales_q is None else sales_q | tail_q
+    
+    return rollup_q, sales_q
+
+
+def sale_aggregates(filter=None):
+    """
+    Sale aggregates matching the rollup columns
+    
+    Args:
+        filter: Optional Q restricting every aggregate (FILTER (WHERE ...))
+    """
+    def scoped(q=None):
+        if q is None:
+            return filter
+        return q if filter is None else q & filter
+    
+    aggregates = {
+        'sale_count': Count('id', filter=scoped()),
+        'total_revenue': Sum('final_amount', filter=scoped(), output_field=DecimalField()),
+        'total_amount': Sum('total_amount', filter=scoped(), output_field=DecimalField()),
+        'total_discount': Sum('discount', filter=scoped(), output_field=DecimalField()),
+        'total_tax': Sum('tax', filter=scoped(), output_field=DecimalField()),
+    }
+    for method in PAYMENT_METHODS:
+        method_q = scoped(Q(payment_method=method))
+        aggregates[f'{method}_count'] = Count('id', filter=method_q)
+        aggregates[f'{method}_revenue'] = Sum('final_amount', filter=method_q, output_field=DecimalField())
+    return aggregates
+
+
+def rollup_aggregates(filter=None):
+    """
+    Sums of every rollup counter column
+    
+    Args:
+        filter: Optional Q restricting every sum (FILTER (WHERE ...))
+    """
+    fields = list(METRIC_FIELDS.values())
+    for method in PAYMENT_METHODS:
+        fields += [f'{method}_count', f'{method}_revenue']
+    return {field: Sum(field, filter=filter) for field in fields}
+
+
+def record_sale(sale):
+    """
+    Add a newly created sale to its shop's rollup row for the day
+    
+    Call inside the sale's transaction, after totals are calculated.
+    """
+    day = timezone.localdate(sale.transaction_date)
+    method = sale.payment_method if sale.payment_method in PAYMENT_METHODS else 'other'
+    
+    with transaction.atomic():
+        DailySalesRollup.objects.get_or_create(shop_id=sale.shop_id, day=day)
+        DailySalesRollup.objects.filter(shop_id=sale.shop_id, day=day).update(
+            sale_count=F('sale_count') + 1,
+            total_revenue=F('total_revenue') + sale.final_amount,
+            total_amount=F('total_amount') + sale.total_amount,
+            total_discount=F('total_discount') + sale.discount,
+            total_tax=F('total_tax') + sale.tax,
+            **{
+                f'{method}_count': F(f'{method}_count') + 1,
+                f'{method}_revenue': F(f'{method}_revenue') + sale.final_amount,
+            }
+        )
+
+
+def record_sale_items(sale, items):
+    """
+    Add a sale's line items to the per-product rollup rows for the day
+    
+    Missing rows are inserted in one bulk_create and all counters are bumped
+    in a single UPDATE, so the cost per bill does not depend on its size.
+    
+    Args:
+        sale: Sale instance the items belong to
+        items: Iterable of SaleItem instances
+    """
+    day = timezone.localdate(sale.transaction_date)
+    quantities = {}
+    revenues = {}
+    for item in items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+        revenues[item.product_id] = revenues.get(item.product_id, 0) + item.subtotal
+    
+    if not quantities:
+        return
+    
+    with transaction.atomic():
+        ProductSalesRollup.objects.bulk_create(
+            [ProductSalesRollup(shop_id=sale.shop_id, product_id=product_id, day=day) for product_id in quantities],
+            ignore_conflicts=True
+        )
+        ProductSalesRollup.objects.filter(
+            shop_id=sale.shop_id, day=day, product_id__in=quantities.keys()
+        ).update(
+            quantity=F('quantity') + Case(
+                *[When(product_id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+                output_field=IntegerField()
+            ),
+            revenue=F('revenue') + Case(
+                *[When(product_id=product_id, then=Value(revenue)) for product_id, revenue in revenues.items()],
+                output_field=DecimalField(max_digits=14, decimal_places=2)
+            )
+        )
+
+
+def write_rollup_rows(model, rows, batch_size):
+    """bulk_create rollup rows from aggregate dicts in batches, returns the row count"""
+    written = 0
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(model(**{
+            key: (Decimal('0.00') if value is None else value) for key, value in row.items()
+        }))
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def rebuild_daily_rollups(shop_id=None, start_day=None, end_day=None, batch_size=1000):
+    """
+    Recompute rollup rows from the sales table
+    
+    Args:
+        shop_id: Optional shop to rebuild (default: all shops)
+        start_day: Optional first day to rebuild (inclusive)
+        end_day: Optional last day to rebuild (inclusive)
+        batch_size: Rows per bulk_create batch
+    
+    Returns:
+        Number of rollup rows written
+    """
+    sales = Sale.objects.all()
+    rollups = DailySalesRollup.objects.all()
+    
+    if shop_id:
+        sales = sales.filter(shop_id=shop_id)
+        rollups = rollups.filter(shop_id=shop_id)
+    if start_day:
+        sales = sales.filter(transaction_date__gte=day_start(start_day))
+        rollups = rollups.filter(day__gte=start_day)
+    if end_day:
+        sales = sales.filter(transaction_date__lt=day_start(end_day + timedelta(days=1)))
+        rollups = rollups.filter(day__lte=end_day)
+    
+    rows = sales.annotate(day=TruncDate('transaction_date')).values('shop_id', 'day').annotate(
+        **sale_aggregates()
+    ).order_by('shop_id', 'day')
+    
+    with transaction.atomic():
+        rollups.delete()
+        return write_rollup_rows(DailySalesRollup, rows, batch_size)
+
+
+def rebuild_product_rollups(shop_id=None, start_day=None, end_day=None, batch_size=1000):
+    """
+    Recompute per-product rollup rows from sale items (same arguments as rebuild_daily_rollups)
+    
+    Returns:
+        Number of rollup rows written
+    """
+    items = SaleItem.objects.all()
+    rollups = ProductSalesRollup.objects.all()
+    
+    if shop_id:
+        items = items.filter(sale__shop_id=shop_id)
+        rollups = rollups.filter(shop_id=shop_id)
+    if start_day:
+        items = items.filter(sale__transaction_date__gte=day_start(start_day))
+        rollups = rollups.filter(day__gte=start_day)
+    if end_day:
+        items = items.filter(sale__transaction_date__lt=day_start(end_day + timedelta(days=1)))
+        rollups = rollups.filter(day__lte=end_day)
+    
+    rows = items.annotate(
+        shop_id=F('sale__shop_id'), day=TruncDate('sale__transaction_date')
+    ).values('shop_id', 'product_id', 'day').annotate(
+        quantity=Sum('quantity'),
+        revenue=Sum('subtotal', output_field=DecimalField())
+    ).order_by('shop_id', 'day', 'product_id')
+    
+    with transaction.atomic():
+        rollups.delete()
+        return write_rollup_rows(ProductSalesRollup, rows, batch_size)
+
+
+def merge_totals(totals, values):
+    """Add non-null aggregate values into a running totals dict"""
+    for key, value in values.items():
+        if value is not None:
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def rollup_bucket(period):
+    """Expression grouping DailySalesRollup.day into report buckets"""
+    if period == DAY_OF_WEEK:
+        return ExtractIsoWeekDay('day')
+    return Trunc('day', PERIOD_KINDS[period])
+
+
+def bucket_rows_with_total(queryset, period):
+    """
+    Sum rollup rows per report bucket and in total in one query
+    
+    On PostgreSQL this is a single GROUP BY ROLLUP (bucket), whose extra row
+    (bucket NULL) carries the grand total. Other backends get the plain
+    grouped rows and no total, which the caller adds up while merging.
+    
+    Args:
+        queryset: Filtered DailySalesRollup queryset
+        period: 'daily', 'weekly', 'monthly', 'yearly' or 'day-of-week'
+    
+    Returns:
+        (rows, total) - list of column-sum dicts including 'bucket', and the
+        grand-total dict or None
+    """
+    aggregates = rollup_aggregates()
+    grouped = queryset.annotate(bucket=rollup_bucket(period))
+    
+    if connection.vendor != 'postgresql':
+        return list(grouped.values('bucket').annotate(**aggregates).order_by()), None
+    
+    # Let the ORM compile the filters and bucket expression, then group the
+    # result with ROLLUP, which the ORM cannot express
+    inner_sql, params = grouped.values('bucket', *aggregates).order_by().query.sql_with_params()
+    quote = connection.ops.quote_name
+    sums = ', '.join(f'SUM({quote(field)}) AS {quote(field)}' for field in aggregates)
+    # DATE_TRUNC on a date returns a timestamp and EXTRACT a numeric,
+    # cast back to the bucket's type
+    bucket_type = 'integer' if period == DAY_OF_WEEK else 'date'
+    sql = (
+        f'SELECT CAST(bucket AS {bucket_type}) AS bucket, {sums} '
+        f'FROM ({inner_sql}) AS days GROUP BY ROLLUP (bucket)'
+    )
+    
+    rows = []
+    total = {}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        for values in cursor.fetchall():
+            row = dict(zip(columns, values))
+            if row['bucket'] is None:
+                row.pop('bucket')
+                total = row
+            else:
+                rows.append(row)
+    return rows, total
+
+
+def period_totals(period, shop_q, start=None, end=None):
+    """
+    Rollup-backed totals for each report bucket in a date range, plus the
+    grand total over the whole range
+    
+    Args:
+        period: One of REPORT_PERIODS
+        shop_q: Q on `shop` / `shop_id` applied to both rollups and sales
+        start: Optional aware datetime (inclusive)
+        end: Optional aware datetime (inclusive)
+    
+    Returns:
+        (buckets, totals) - dict of bucket key (start date, start hour or ISO
+        weekday) -> dict of rollup column sums in bucket order, and a dict of
+        the same sums over all buckets
+    """
+    if period == HOURLY:
+        return hourly_totals(shop_q, start, end)
+    
+    rollup_q, sales_q = split_range(start, end)
+    buckets = {}
+    totals = {}
+    
+    if rollup_q is not None:
+        rows, total = bucket_rows_with_total(DailySalesRollup.objects.filter(shop_q, rollup_q), period)
+        for row in rows:
+            bucket = row.pop('bucket')
+            merge_totals(buckets.setdefault(bucket, {}), row)
+            if total is None:
+                merge_totals(totals, row)
+        if total:
+            merge_totals(totals, total)
+    
+    if sales_q is not None:
+        rows = Sale.objects.filter(shop_q, sales_q).annotate(
+            day=TruncDate('transaction_date')
+        ).values('day').annotate(**sale_aggregates()).order_by()
+        for row in rows:
+            day = row.pop('day')
+            merge_totals(buckets.setdefault(bucket_start(day, period), {}), row)
+            merge_totals(totals, row)
+    
+    return dict(sorted(buckets.items())), totals
+
+
+def hourly_totals(shop_q, start=None, end=None):
+    """
+    Sales totals per hour (same arguments and result as period_totals)
+    
+    Rollups are daily, so hourly buckets are always read from the sales table.
+    """
+    sales = Sale.objects.filter(shop_q)
+    if start is not None:
+        sales = sales.filter(transaction_date__gte=start)
+    if end is not None:
+        sales = sales.filter(transaction_date__lte=end)
+    
+    buckets = {}
+    totals = {}
+    rows = sales.annotate(bucket=TruncHour('transaction_date')).values('bucket').annotate(
+        **sale_aggregates()
+    ).order_by()
+    for row in rows:
+        bucket = row.pop('bucket')
+        merge_totals(buckets.setdefault(bucket, {}), row)
+        merge_totals(totals, row)
+    
+    return dict(sorted(buckets.items())), totals
+
+
+def range_totals(shop_q, start=None, end=None):
+    """
+    Rollup-backed totals for a whole date range (same arguments as period_totals)
+    
+    Returns:
+        Dict of rollup column sums
+    """
+    rollup_q, sales_q = split_range(start, end)
+    totals = {}
+    
+    if rollup_q is not None:
+        merge_totals(totals, DailySalesRollup.objects.filter(shop_q, rollup_q).aggregate(**rollup_aggregates()))
+    
+    if sales_q is not None:
+        merge_totals(totals, Sale.objects.filter(shop_q, sales_q).aggregate(**sale_aggregates()))
+    
+    return totals
+
+
+def window_totals(shop_q, windows):
+    """
+    Rollup-backed totals for several date ranges in one pass
+    
+    Each window becomes a FILTER (WHERE ...) on the same aggregate query, so
+    comparing windows reads the rollup table (and the partial edge days from
+    the sales table) once, like a single-window report.
+    
+    Args:
+        shop_q: Q on `shop` / `shop_id` applied to both rollups and sales
+        windows: Dict of name -> (start, end) aware datetimes
+    
+    Returns:
+        Dict of name -> dict of rollup column sums
+    """
+    rollup_filters = {}
+    sales_filters = {}
+    for name, (start, end) in windows.items():
+        rollup_q, sales_q = split_range(start, end)
+        if rollup_q is not None:
+            rollup_filters[name] = rollup_q
+        if sales_q is not None:
+            sales_filters[name] = sales_q
+    
+    totals = {name: {} for name in windows}
+    
+    def aggregate_windows(queryset, filters, build_aggregates):
+        aliases = {}
+        aggregates = {}
+        for index, (name, window_q) in enumerate(filters.items()):
+            for column, aggregate in build_aggregates(window_q).items():
+                alias = f'w{index}_{column}'
+                aliases[alias] = (name, column)
+                aggregates[alias] = aggregate
+        
+        any_window = Q()
+        for window_q in filters.values():
+            any_window |= window_q
+        
+        for alias, value in queryset.filter(shop_q).filter(any_window).aggregate(**aggregates).items():
+            name, column = aliases[alias]
+            merge_totals(totals[name], {column: value})
+    
+    if rollup_filters:
+        aggregate_windows(DailySalesRollup.objects.all(), rollup_filters, rollup_aggregates)
+    
+    if sales_filters:
+        aggregate_windows(Sale.objects.all(), sales_filters, sale_aggregates)
+    
+    return totals
+
+
+def product_totals(shop_q, start=None, end=None, limit=None):
+    """
+    Rollup-backed units and revenue per product for a date range, best sellers first
+    
+    The rollup rows and the edge-day sale items are combined with UNION ALL
+    and summed, ordered and cut off in the database, so only the top `limit`
+    products are fetched.
+    
+    Args:
+        shop_q: Q on `shop` / `shop_id` applied to rollups (sale items are
+            filtered through their sale)
+        start: Optional aware datetime (inclusive)
+        end: Optional aware datetime (inclusive)
+        limit: Optional number of products to return
+    
+    Returns:
+        List of {'product_id', 'product_name', 'quantity', 'revenue'} dicts
+        by descending quantity
+    """
+    rollup_q, sales_q = split_range(start, end)
+    parts = []
+    
+    if rollup_q is not None:
+        parts.append(ProductSalesRollup.objects.filter(shop_q, rollup_q).annotate(
+            product_name=F('product__name')
+        ).values('product_id', 'product_name').annotate(
+            quantity=Sum('quantity'), revenue=Sum('revenue')
+        ).order_by())
+    
+    if sales_q is not None:
+        sale_ids = Sale.objects.filter(shop_q, sales_q).values('id')
+        parts.append(SaleItem.objects.filter(sale_id__in=sale_ids).annotate(
+            product_name=F('product__name')
+        ).values('product_id', 'product_name').annotate(
+            quantity=Sum('quantity'), revenue=Sum('subtotal', output_field=DecimalField())
+        ).order_by())
+    
+    # Let the ORM compile each side, then merge them in SQL, which the ORM
+    # cannot aggregate over a union
+    compiled = [part.query.sql_with_params() for part in parts]
+    params = [param for _, part_params in compiled for param in part_params]
+    union_sql = ' UNION ALL '.join(part_sql for part_sql, _ in compiled)
+    sql = (
+        'SELECT product_id, product_name, SUM(quantity) AS quantity, SUM(revenue) AS revenue '
+        f'FROM ({union_sql}) AS products_sold '
+        'GROUP BY product_id, product_name ORDER BY quantity DESC, product_id'
+    )
+    if limit is not None:
+        sql += ' LIMIT %s'
+        params.append(limit)
+    
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, values)) for values in cursor.fetchall()]
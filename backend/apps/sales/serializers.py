@@ -3,7 +3,7 @@ Serializers for sales app
 """
 from rest_framework import serializers
 from decimal import Decimal
-from .models import Sale, SaleItem
+from .models import Sale, SaleItem, ReceiptSequence
 
 
 class SaleItemSerializer(serializers.ModelSerializer):
@@ -47,11 +47,11 @@ class SaleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Sale
         fields = [
-            'id', 'shop', 'shop_name', 'staff', 'staff_name', 'transaction_date',
+            'id', 'shop', 'shop_name', 'receipt_no', 'staff', 'staff_name', 'transaction_date',
             'total_amount', 'discount', 'tax', 'final_amount', 'payment_method',
             'notes', 'items', 'item_count', 'created_at'
         ]
-        read_only_fields = ['id', 'shop_name', 'staff_name', 'total_amount', 'final_amount', 'item_count', 'created_at']
+        read_only_fields = ['id', 'shop_name', 'receipt_no', 'staff_name', 'total_amount', 'final_amount', 'item_count', 'created_at']
     
     def validate_discount(self, value):
         """
@@ -70,6 +70,26 @@ class SaleSerializer(serializers.ModelSerializer):
         return value
 
 
+class SaleSummarySerializer(serializers.ModelSerializer):
+    """
+    Lightweight serializer for sale listings (no nested items)
+    
+    Expects the queryset to be annotated with num_items.
+    """
+    shop_name = serializers.CharField(source='shop.name', read_only=True)
+    staff_name = serializers.CharField(source='staff.username', read_only=True)
+    item_count = serializers.IntegerField(source='num_items', read_only=True)
+    
+    class Meta:
+        model = Sale
+        fields = [
+            'id', 'shop', 'shop_name', 'receipt_no', 'staff', 'staff_name', 'transaction_date',
+            'total_amount', 'discount', 'tax', 'final_amount', 'payment_method',
+            'item_count', 'created_at'
+        ]
+        read_only_fields = fields
+
+
 class SaleCreateSerializer(serializers.ModelSerializer):
     """
     Serializer for creating a new sale with items
@@ -132,64 +152,105 @@ class SaleCreateSerializer(serializers.ModelSerializer):
         """
         from django.db import transaction
         from apps.inventory.models import Stock
+        from apps.inventory.history import record_stock_changes
+        from apps.inventory.availability import schedule_availability_invalidation
+        from apps.analytics.alerts import schedule_low_stock_alerts
+        from .rollups import record_sale, record_sale_items
+        from .report_cache import schedule_report_invalidation
         
         items_data = validated_data.pop('items')
         shop = validated_data.get('shop')
         
-        # Validate stock availability BEFORE creating anything
-        stock_issues = []
-        stock_updates = []  # Store (stock, quantity) tuples for updates
-        
+        # Total requested quantity per product (a product may appear on several lines)
+        requested = {}
         for item_data in items_data:
             product = item_data['product']
-            quantity = item_data['quantity']
+            requested[product.id] = requested.get(product.id, 0) + item_data['quantity']
+        
+        with transaction.atomic():
+            # Load and lock every stock row for the bill in one query, in the
+            # (shop, product) order transfers lock rows in, so a sale racing
+            # a transfer waits for it instead of overwriting its change
+            stocks = {
+                stock.product_id: stock
+                for stock in Stock.objects.select_for_update(of=('self',)).select_related('shop', 'product').filter(
+                    shop=shop, product_id__in=requested.keys()
+                ).order_by('shop_id', 'product_id')
+            }
+            
+            # Validate stock availability BEFORE creating anything
+            stock_issues = []
+            stock_updates = []  # Store (stock, quantity) tuples for updates
             
-            try:
-                stock = Stock.objects.get(shop=shop, product=product)
-                if stock.quantity < quantity:
+            for item_data in items_data:
+                product = item_data['product']
+                if product.id not in requested:
+                    continue  # Already checked on an earlier line
+                quantity = requested.pop(product.id)
+                
+                stock = stocks.get(product.id)
+                if stock is None:
+                    stock_issues.append(
+                        f"Stock record not found for {product.name} in {shop.name}"
+                    )
+                elif stock.quantity < quantity:
                     stock_issues.append(
                         f"Insufficient stock for {product.name}. Available: {stock.quantity}, Requested: {quantity}"
                     )
                 else:
                     # Store for later update
                     stock_updates.append((stock, quantity))
-            except Stock.DoesNotExist:
-                stock_issues.append(
-                    f"Stock record not found for {product.name} in {shop.name}"
-                )
-        
-        # If any stock issues, raise error before creating anything
-        if stock_issues:
-            raise serializers.ValidationError({
-                'items': stock_issues
-            })
-        
-        # All stock checks passed - create sale and items in a transaction
-        with transaction.atomic():
+            
+            # If any stock issues, raise error before creating anything
+            if stock_issues:
+                raise serializers.ValidationError({
+                    'items': stock_issues
+                })
+            
             # Create sale
             sale = Sale.objects.create(
                 **validated_data,
+                receipt_no=ReceiptSequence.next_number(shop),
                 staff=self.context['request'].user
             )
             
             # Create sale items
+            sale_items = []
             for item_data in items_data:
-                SaleItem.objects.create(
+                sale_items.append(SaleItem.objects.create(
                     sale=sale,
                     **item_data
-                )
+                ))
             
-            # Update stock quantities and check for alerts
+            # Update stock quantities
+            stock_changes = []
             for stock, quantity in stock_updates:
+                stock_changes.append((stock, stock.quantity))
                 stock.quantity -= quantity
                 stock.save()
-                
-                # Check and create alerts for low stock
-                from apps.analytics.alerts import create_low_stock_alert
-                create_low_stock_alert(stock)
+            
+            # Append the movements to the stock ledger in one insert
+            record_stock_changes(
+                stock_changes, 'sale',
+                reference_id=sale.id,
+                changed_by=self.context['request'].user
+            )
+            
+            # Check for low stock alerts once, after the sale commits
+            schedule_low_stock_alerts(stock for stock, _ in stock_updates)
+            
+            # Billing screens re-read these quantities once the sale commits
+            schedule_availability_invalidation(stock for stock, _ in stock_updates)
             
             # Calculate totals
             sale.calculate_totals()
+            
+            # Add the sale to the rollups used by reports
+            record_sale(sale)
+            record_sale_items(sale, sale_items)
+            
+            # Drop the shop's cached open-period reports once committed
+            schedule_report_invalidation([sale.shop_id])
         
         return sale
 
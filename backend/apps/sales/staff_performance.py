@@ -0,0 +1,94 @@
+"""
+Per-staff sales and throughput figures
+
+Sales are grouped by staff member in staff_id order, which PostgreSQL
+answers by walking the (staff, transaction_date) index one staff member at a
+time with the date range as the index condition. Units sold come from a
+second query in the same order, and the two are merged as they stream in,
+so memory use does not grow with the size of the team.
+"""
+from django.db.models import Sum, Count, Min, Max, DecimalField
+from django.db.models.functions import TruncHour
+from .models import Sale, SaleItem
+from .breakdowns import prefix_q
+
+
+# Output columns, in order
+STAFF_COLUMNS = [
+    'staff_id',
+    'staff_username',
+    'total_sales',
+    'total_revenue',
+    'total_items',
+    'average_basket',
+    'items_per_sale',
+    'active_hours',
+    'sales_per_hour',
+    'first_sale',
+    'last_sale',
+]
+
+
+def staff_performance_rows(shop_q, start=None, end=None, staff_id=None, chunk_size=2000):
+    """
+    Yield one dict of STAFF_COLUMNS per staff member with sales in the range
+    
+    Args:
+        shop_q: Q on `shop` / `shop_id` of the sale
+        start: Optional aware datetime (inclusive)
+        end: Optional aware datetime (inclusive)
+        staff_id: Optional single staff member
+        chunk_size: Rows fetched per round trip
+    
+    active_hours counts the distinct clock hours with at least one sale, so
+    sales_per_hour is bills per hour actually worked at the till.
+    """
+    sales = Sale.objects.filter(shop_q, staff__isnull=False)
+    items = SaleItem.objects.filter(prefix_q(shop_q, 'sale__'), sale__staff__isnull=False)
+    
+    if staff_id:
+        sales = sales.filter(staff_id=staff_id)
+        items = items.filter(sale__staff_id=staff_id)
+    if start is not None:
+        sales = sales.filter(transaction_date__gte=start)
+        items = items.filter(sale__transaction_date__gte=start)
+    if end is not None:
+        sales = sales.filter(transaction_date__lte=end)
+        items = items.filter(sale__transaction_date__lte=end)
+    
+    staff_rows = sales.values('staff_id', 'staff__username').annotate(
+        total_sales=Count('id'),
+        total_revenue=Sum('final_amount', output_field=DecimalField()),
+        active_hours=Count(TruncHour('transaction_date'), distinct=True),
+        first_sale=Min('transaction_date'),
+        last_sale=Max('transaction_date'),
+    ).order_by('staff_id').iterator(chunk_size=chunk_size)
+    
+    unit_rows = items.values('sale__staff_id').annotate(
+        units=Sum('quantity')
+    ).order_by('sale__staff_id').iterator(chunk_size=chunk_size)
+    
+    units = next(unit_rows, None)
+    for row in staff_rows:
+        # Both streams are ordered by staff id; advance the units stream to this staff member
+        while units is not None and units['sale__staff_id'] < row['staff_id']:
+            units = next(unit_rows, None)
+        total_items = units['units'] if units is not None and units['sale__staff_id'] == row['staff_id'] else 0
+        
+        total_sales = row['total_sales']
+        total_revenue = float(row['total_revenue'] or 0)
+        active_hours = row['active_hours']
+        
+        yield {
+            'staff_id': row['staff_id'],
+            'staff_username': row['staff__username'],
+            'total_sales': total_sales,
+            'total_revenue': total_revenue,
+            'total_items': total_items,
+            'average_basket': round(total_revenue / total_sales, 2) if total_sales else 0,
+            'items_per_sale': round(total_items / total_sales, 2) if total_sales else 0,
+            'active_hours': active_hours,
+            'sales_per_hour': round(total_sales / active_hours, 2) if active_hours else 0,
+            'first_sale': row['first_sale'],
+            'last_sale': row['last_sale'],
+        }
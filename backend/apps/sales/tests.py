@@ -1,3 +1,818 @@
-from django.test import TestCase
+import csv
+import gzip
+import importlib
+import io
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
+from django.apps import apps as django_apps
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from apps.accounts.models import User
+from apps.shops.models import Shop
+from apps.products.models import Category, Product
+from apps.inventory.models import Stock
+from supermarket_analysis.pagination import SalePagination
+from .models import Sale, SaleItem, DailySalesRollup, ProductSalesRollup, ReceiptSequence, ReportCacheVersion
+from .breakdowns import breakdown_rows, parse_group_by
+from .staff_performance import STAFF_COLUMNS
+from .reports import MAX_FILLED_BUCKETS, MAX_TOP_PRODUCTS, get_top_products_limit, has_too_many_buckets, window_periods
+from .report_cache import clear_report_cache, get_cache_stats, reset_cache_stats
+from .rollups import (
+    split_range, period_totals, product_totals, window_totals, bucket_rows_with_total, rebuild_daily_rollups, rebuild_product_rollups
+)
 
-# Create your tests here.
+
+class SalesFixtureMixin:
+    """Two shops stocking five products, staff at each shop, a manager and an admin"""
+    
+    def create_fixtures(self):
+        # The report cache lives in process memory and outlives each test
+        clear_report_cache()
+        self.shops = [
+            Shop.objects.create(name='North', address='1 North Road'),
+            Shop.objects.create(name='South', address='2 South Road'),
+        ]
+        self.category = Category.objects.create(name='Dairy')
+        self.products = [
+            Product.objects.create(
+                name=f'Product {i}', unit_price=Decimal('10.00'), category=self.category, barcode=f'89{i:05d}'
+            )
+            for i in range(5)
+        ]
+        for shop in self.shops:
+            for product in self.products:
+                Stock.objects.create(shop=shop, product=product, quantity=100, min_threshold=5)
+        
+        self.admin = User.objects.create_user('admin', password='x', role='admin')
+        self.manager = User.objects.create_user('manager', password='x', role='sales_manager', shop=self.shops[0])
+        self.staff = User.objects.create_user('staff', password='x', role='staff', shop=self.shops[0])
+        self.south_staff = User.objects.create_user('south', password='x', role='staff', shop=self.shops[1])
+        self.api = APIClient()
+    
+    def sell(self, items, user=None, shop=None, payment_method='cash'):
+        """Check out a bill through the API; items are (product, quantity) pairs"""
+        self.api.force_authenticate(user or self.staff)
+        response = self.api.post('/api/sales/', {
+            'shop': (shop or self.shops[0]).id,
+            'payment_method': payment_method,
+            'discount': '0',
+            'tax': '0',
+            'items': [
+                {'product': product.id, 'quantity': quantity, 'unit_price': '10.00'}
+                for product, quantity in items
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Sale.objects.get(pk=response.data['id'])
+
+
+class PaginationTests(SalesFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        self.sales = [self.sell([(self.products[0], 1)]) for _ in range(5)]
+        self.api.force_authenticate(self.admin)
+    
+    def test_plain_list_without_page_parameters(self):
+        response = self.api.get('/api/sales/')
+        
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 5)
+    
+    def test_cursor_pages_walk_newest_first(self):
+        ids = []
+        url = '/api/sales/?page_size=2&include_items=false'
+        while url:
+            response = self.api.get(url)
+            self.assertLessEqual(len(response.data['results']), 2)
+            ids += [sale['id'] for sale in response.data['results']]
+            url = response.data['next']
+        
+        self.assertEqual(ids, [sale.id for sale in reversed(self.sales)])
+    
+    @override_settings(PAGINATE_BY_DEFAULT=True)
+    def test_paginates_every_response_when_enabled(self):
+        response = self.api.get('/api/sales/')
+        
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertIsNone(response.data['next'])
+    
+    def test_page_size_is_capped(self):
+        request = Request(APIRequestFactory().get('/api/sales/', {'page_size': 100000}))
+        
+        self.assertEqual(SalePagination().get_page_size(request), SalePagination.max_page_size)
+
+
+class SaleListQueryTests(SalesFixtureMixin, TestCase):
+    """The sales list costs a fixed number of queries however many sales it returns"""
+    
+    def setUp(self):
+        self.create_fixtures()
+        self.api.force_authenticate(self.admin)
+    
+    def add_sales(self, count):
+        for i in range(count):
+            self.sell([(product, 1) for product in self.products[:i % 3 + 1]])
+        self.api.force_authenticate(self.admin)
+    
+    def assertListQueries(self, expected, params):
+        for count in [2, 6]:
+            self.add_sales(count)
+            with self.assertNumQueries(expected):
+                response = self.api.get('/api/sales/', params)
+            self.assertEqual(response.status_code, 200)
+        return response
+    
+    def test_summary_mode_is_one_query(self):
+        response = self.assertListQueries(1, {'include_items': 'false'})
+        
+        self.assertEqual(len(response.data), 8)
+        self.assertNotIn('items', response.data[0])
+        self.assertEqual(sorted(sale['item_count'] for sale in response.data)[-1], 3)
+    
+    def test_full_mode_is_three_queries(self):
+        response = self.assertListQueries(3, {})
+        
+        self.assertEqual(len(response.data), 8)
+        self.assertEqual(response.data[0]['items'][0]['product_name'], 'Product 0')
+    
+    def test_cursor_page_keeps_the_counts(self):
+        self.add_sales(4)
+        
+        with self.assertNumQueries(1):
+            self.api.get('/api/sales/', {'include_items': 'false', 'page_size': 2})
+        with self.assertNumQueries(3):
+            self.api.get('/api/sales/', {'page_size': 2})
+
+
+class ReceiptNumberTests(SalesFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+    
+    def receipt(self, shop, receipt_no, user=None):
+        self.api.force_authenticate(user or self.admin)
+        return self.api.get(f'/api/sales/receipts/{shop.id}/{receipt_no}/')
+    
+    def test_numbers_are_sequential_per_shop(self):
+        north = [self.sell([(self.products[0], 1)]) for _ in range(3)]
+        south = self.sell([(self.products[0], 1)], user=self.south_staff, shop=self.shops[1])
+        
+        self.assertEqual([sale.receipt_no for sale in north], [1, 2, 3])
+        self.assertEqual(south.receipt_no, 1)
+        self.assertEqual(ReceiptSequence.objects.get(shop=self.shops[0]).last_number, 3)
+        self.assertEqual(ReceiptSequence.next_number(self.shops[1]), 2)
+    
+    def test_receipt_numbers_are_unique_per_shop(self):
+        sale = self.sell([(self.products[0], 1)])
+        
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Sale.objects.create(shop=self.shops[0], receipt_no=sale.receipt_no, staff=self.staff)
+        Sale.objects.create(shop=self.shops[1], receipt_no=sale.receipt_no, staff=self.south_staff)
+    
+    def test_backfill_numbers_existing_sales_in_transaction_order(self):
+        sales = [self.sell([(self.products[0], 1)]) for _ in range(3)]
+        south = self.sell([(self.products[0], 1)], user=self.south_staff, shop=self.shops[1])
+        # Oldest first once backfilled, whatever order the sales were inserted in
+        for sale, day in zip(sales, [3, 1, 2]):
+            Sale.objects.filter(pk=sale.pk).update(transaction_date=at(day), receipt_no=None)
+        Sale.objects.filter(pk=south.pk).update(receipt_no=None)
+        ReceiptSequence.objects.all().delete()
+        migration = importlib.import_module('apps.sales.migrations.0003_sale_receipt_no')
+        
+        migration.backfill_receipt_numbers(django_apps, None)
+        
+        numbers = dict(Sale.objects.values_list('pk', 'receipt_no'))
+        self.assertEqual([numbers[sale.pk] for sale in sales], [3, 1, 2])
+        self.assertEqual(numbers[south.pk], 1)
+        self.assertEqual(
+            dict(ReceiptSequence.objects.values_list('shop_id', 'last_number')),
+            {self.shops[0].id: 3, self.shops[1].id: 1}
+        )
+    
+    def test_lookup_by_shop_and_receipt_number(self):
+        self.sell([(self.products[0], 1)])
+        sale = self.sell([(self.products[1], 2)])
+        
+        response = self.receipt(self.shops[0], 2, user=self.staff)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], sale.id)
+        self.assertEqual(response.data['items'][0]['quantity'], 2)
+        self.assertEqual(self.receipt(self.shops[0], 3).status_code, 404)
+        self.assertEqual(self.receipt(self.shops[1], 2).status_code, 404)
+    
+    def test_other_shops_receipts_are_not_found(self):
+        self.sell([(self.products[0], 1)], user=self.south_staff, shop=self.shops[1])
+        
+        self.assertEqual(self.receipt(self.shops[1], 1, user=self.staff).status_code, 404)
+        self.assertEqual(self.receipt(self.shops[1], 1, user=self.manager).status_code, 404)
+        self.assertEqual(self.receipt(self.shops[1], 1, user=self.south_staff).status_code, 200)
+        self.assertEqual(self.receipt(self.shops[1], 1).status_code, 200)
+
+
+def at(day, hour=0, minute=0):
+    """Aware local datetime on a day of March 2024"""
+    return timezone.make_aware(datetime(2024, 3, day, hour, minute))
+
+
+class RollupTests(SalesFixtureMixin, TestCase):
+    """Rollup-backed totals must equal aggregates over the raw sales"""
+    
+    # (when, shop index, payment method, quantity); includes sales at and
+    # just around midnight so the partial-day edges are exercised
+    HISTORY = [
+        (at(4, 23, 30), 0, 'cash', 1),
+        (at(5), 0, 'card', 2),
+        (at(5, 12), 1, 'upi', 3),
+        (at(6, 8), 0, 'cash', 4),
+        (at(6, 18), 1, 'card', 5),
+        (at(7, 0, 30), 0, 'other', 6),
+        (at(8, 10), 0, 'cash', 7),
+    ]
+    
+    WINDOWS = [
+        (at(4, 23), at(7, 0, 30)),
+        (at(5), at(8)),
+        (at(6, 7), at(6, 19)),
+        (at(5, 12), at(8, 10)),
+    ]
+    
+    def setUp(self):
+        self.create_fixtures()
+        staff = [self.staff, self.south_staff]
+        for when, shop, method, quantity in self.HISTORY:
+            sale = self.sell([(self.products[0], quantity)], user=staff[shop], shop=self.shops[shop], payment_method=method)
+            Sale.objects.filter(pk=sale.pk).update(transaction_date=when)
+        rebuild_daily_rollups()
+    
+    def raw_totals(self, start, end, shop=None):
+        sales = Sale.objects.filter(transaction_date__gte=start, transaction_date__lte=end)
+        if shop:
+            sales = sales.filter(shop=shop)
+        return sales.aggregate(
+            sale_count=Count('id'),
+            total_revenue=Sum('final_amount'),
+            card_count=Count('id', filter=Q(payment_method='card')),
+        )
+    
+    def assertTotalsMatch(self, totals, raw):
+        self.assertEqual(totals.get('sale_count', 0), raw['sale_count'])
+        self.assertEqual(totals.get('total_revenue', 0), raw['total_revenue'] or 0)
+        self.assertEqual(totals.get('card_count', 0), raw['card_count'])
+    
+    def test_split_range_reads_edges_from_sales(self):
+        rollup_q, sales_q = split_range(at(4, 23), at(7, 0, 30))
+        
+        self.assertEqual(rollup_q, Q(day__gte=date(2024, 3, 5)) & Q(day__lte=date(2024, 3, 6)))
+        self.assertEqual(
+            sales_q,
+            Q(transaction_date__gte=at(4, 23), transaction_date__lt=at(5)) |
+            Q(transaction_date__gte=at(7), transaction_date__lte=at(7, 0, 30))
+        )
+    
+    def test_split_range_at_midnight_has_no_leading_edge(self):
+        rollup_q, sales_q = split_range(at(5), at(8))
+        
+        self.assertEqual(rollup_q, Q(day__gte=date(2024, 3, 5)) & Q(day__lte=date(2024, 3, 7)))
+        self.assertEqual(sales_q, Q(transaction_date__gte=at(8), transaction_date__lte=at(8)))
+    
+    def test_split_range_within_one_day_uses_sales_only(self):
+        rollup_q, sales_q = split_range(at(6, 7), at(6, 19))
+        
+        self.assertIsNone(rollup_q)
+        self.assertEqual(sales_q, Q(transaction_date__gte=at(6, 7), transaction_date__lte=at(6, 19)))
+    
+    def test_period_totals_match_raw_sales(self):
+        for start, end in self.WINDOWS:
+            for period in ['daily', 'weekly', 'monthly']:
+                buckets, totals = period_totals(period, Q(), start, end)
+                
+                self.assertTotalsMatch(totals, self.raw_totals(start, end))
+                self.assertEqual(sum(bucket['sale_count'] for bucket in buckets.values()), totals.get('sale_count', 0))
+    
+    def test_daily_buckets_match_raw_sales_per_day(self):
+        start, end = self.WINDOWS[0]
+        
+        buckets, _ = period_totals('daily', Q(), start, end)
+        
+        raw = Sale.objects.filter(transaction_date__gte=start, transaction_date__lte=end).annotate(
+            day=TruncDate('transaction_date')
+        ).values('day').annotate(sale_count=Count('id')).order_by('day')
+        self.assertEqual(
+            [(day, bucket['sale_count']) for day, bucket in buckets.items()],
+            [(row['day'], row['sale_count']) for row in raw]
+        )
+    
+    def test_shop_filter_applies_to_rollups_and_edges(self):
+        start, end = self.WINDOWS[3]
+        
+        _, totals = period_totals('daily', Q(shop=self.shops[1]), start, end)
+        
+        self.assertTotalsMatch(totals, self.raw_totals(start, end, shop=self.shops[1]))
+    
+    def test_window_totals_match_raw_sales(self):
+        windows = {f'w{i}': window for i, window in enumerate(self.WINDOWS)}
+        
+        totals = window_totals(Q(), windows)
+        
+        for name, (start, end) in windows.items():
+            self.assertTotalsMatch(totals[name], self.raw_totals(start, end))
+    
+    @skipUnless(connection.vendor == 'postgresql', 'GROUP BY ROLLUP is PostgreSQL specific')
+    def test_rollup_grand_total_row(self):
+        rows, total = bucket_rows_with_total(DailySalesRollup.objects.all(), 'weekly')
+        
+        self.assertEqual(total['sale_count'], sum(row['sale_count'] for row in rows))
+        self.assertEqual(total['sale_count'], Sale.objects.count())
+        self.assertEqual([row['bucket'] for row in rows], [date(2024, 3, 4)])
+    
+    def test_checkout_keeps_rollup_equal_to_rebuild(self):
+        self.sell([(self.products[1], 2)])
+        self.sell([(self.products[2], 1)], payment_method='card')
+        incremental = list(DailySalesRollup.objects.order_by('shop_id', 'day').values())
+        
+        rebuild_daily_rollups()
+        
+        rebuilt = list(DailySalesRollup.objects.order_by('shop_id', 'day').values())
+        for row in incremental + rebuilt:
+            del row['id'], row['updated_at']
+        self.assertEqual(incremental, rebuilt)
+
+
+class TopProductsReportTests(SalesFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        # (when, [(product index, quantity)])
+        history = [
+            (at(4, 22), [(0, 5), (1, 1)]),
+            (at(5, 9), [(1, 4), (2, 2)]),
+            (at(6, 13), [(2, 6), (3, 1)]),
+            (at(7, 1), [(0, 2), (4, 3)]),
+        ]
+        for when, lines in history:
+            sale = self.sell([(self.products[index], quantity) for index, quantity in lines])
+            Sale.objects.filter(pk=sale.pk).update(transaction_date=when)
+        rebuild_product_rollups()
+        self.api.force_authenticate(self.admin)
+    
+    def test_matches_sale_items_over_partial_days(self):
+        start, end = at(4, 23), at(7, 2)
+        
+        response = self.api.get('/api/sales/reports/top-products/', {
+            'start_date': start.isoformat(), 'end_date': end.isoformat(), 'limit': 3
+        })
+        
+        raw = SaleItem.objects.filter(
+            sale__transaction_date__gte=start, sale__transaction_date__lte=end
+        ).values('product_id').annotate(quantity=Sum('quantity'), revenue=Sum('subtotal')).order_by('-quantity')
+        self.assertEqual(
+            [(row['product_id'], row['total_quantity'], row['total_revenue']) for row in response.data['data']],
+            [(row['product_id'], float(row['quantity']), float(row['revenue'])) for row in raw[:3]]
+        )
+    
+    def test_limit_is_validated_and_clamped(self):
+        url = '/api/sales/reports/top-products/'
+        
+        self.assertEqual(self.api.get(url, {'limit': 'x'}).status_code, 400)
+        self.assertEqual(len(self.api.get(url, {'limit': 0}).data['data']), 1)
+        self.assertEqual(len(self.api.get(url, {'limit': 10 ** 9}).data['data']), 5)
+        self.assertEqual(get_top_products_limit(str(10 ** 9)), MAX_TOP_PRODUCTS)
+    
+    def test_top_n_is_merged_and_cut_off_in_one_query(self):
+        # Product 2 sold on whole days (rollups) and on the partial end day (sales)
+        sale = self.sell([(self.products[2], 1)])
+        Sale.objects.filter(pk=sale.pk).update(transaction_date=at(7, 0, 30))
+        
+        with self.assertNumQueries(1):
+            top = product_totals(Q(), at(4, 23), at(7, 2), limit=3)
+        
+        self.assertEqual(
+            [(row['product_id'], row['product_name'], row['quantity'], float(row['revenue'])) for row in top],
+            [
+                (self.products[2].id, 'Product 2', 9, 90.0),
+                (self.products[1].id, 'Product 1', 4, 40.0),
+                (self.products[4].id, 'Product 4', 3, 30.0),
+            ]
+        )
+        self.assertEqual(len(product_totals(Q(), at(4, 23), at(7, 2))), 5)
+        self.assertEqual(product_totals(Q(shop=self.shops[1]), at(4, 23), at(7, 2), limit=3), [])
+    
+    def test_checkout_keeps_product_rollup_equal_to_rebuild(self):
+        self.sell([(self.products[3], 3), (self.products[4], 2), (self.products[3], 1)])
+        columns = ['shop_id', 'product_id', 'day', 'quantity', 'revenue']
+        incremental = list(ProductSalesRollup.objects.order_by(*columns).values_list(*columns))
+        
+        rebuild_product_rollups()
+        
+        self.assertEqual(list(ProductSalesRollup.objects.order_by(*columns).values_list(*columns)), incremental)
+
+
+class ReportCacheTests(SalesFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        reset_cache_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sell([(self.products[0], 1)])
+        self.api.force_authenticate(self.manager)
+    
+    def test_repeat_request_is_served_from_cache(self):
+        first = self.api.get('/api/sales/reports/')
+        
+        # Only the cache version is read from the database
+        with self.assertNumQueries(1):
+            second = self.api.get('/api/sales/reports/')
+        
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(get_cache_stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+    
+    def test_committed_sale_drops_open_reports(self):
+        self.assertEqual(self.api.get('/api/sales/reports/').data['summary']['total_sales'], 1)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sell([(self.products[1], 1)])
+        self.api.force_authenticate(self.manager)
+        
+        self.assertEqual(self.api.get('/api/sales/reports/').data['summary']['total_sales'], 2)
+    
+    def test_version_bump_retires_closed_reports(self):
+        # Backdating leaves the rollups stale until they are rebuilt
+        Sale.objects.update(transaction_date=at(5, 10))
+        params = {'start_date': '2024-03-01', 'end_date': '2024-03-31'}
+        self.assertEqual(self.api.get('/api/sales/reports/', params).data['summary']['total_sales'], 0)
+        rebuild_daily_rollups()
+        
+        # What another process sees after the rebuild: its entry is still in
+        # its own cache, only the shared version has moved on
+        ReportCacheVersion.bump()
+        
+        self.assertEqual(self.api.get('/api/sales/reports/', params).data['summary']['total_sales'], 1)
+        self.assertEqual(get_cache_stats()['hits'], 0)
+    
+    def test_rebuild_command_bumps_version(self):
+        version = ReportCacheVersion.current()
+        
+        call_command('rebuild_sales_rollups', stdout=io.StringIO())
+        
+        self.assertEqual(ReportCacheVersion.current(), version + 1)
+
+
+class ReportPeriodTests(SalesFixtureMixin, TestCase):
+    URL = '/api/sales/reports/'
+    
+    def setUp(self):
+        self.create_fixtures()
+        # Monday 4th, twice on Wednesday 6th at 10h, Sunday 10th
+        for when in [at(4, 9), at(6, 10), at(6, 10, 30), at(10, 15)]:
+            sale = self.sell([(self.products[0], 1)])
+            Sale.objects.filter(pk=sale.pk).update(transaction_date=when)
+        rebuild_daily_rollups()
+        self.api.force_authenticate(self.admin)
+    
+    def report(self, **params):
+        response = self.api.get(self.URL, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [(row['period'], row['total_sales']) for row in response.data['data']]
+    
+    def test_fill_gaps_zero_fills_every_day(self):
+        params = {'period': 'daily', 'start_date': '2024-03-04', 'end_date': '2024-03-10T23:59:59'}
+        
+        self.assertEqual(self.report(**params), [('2024-03-04', 1), ('2024-03-06', 2), ('2024-03-10', 1)])
+        self.assertEqual(self.report(fill_gaps='true', **params), [
+            ('2024-03-04', 1), ('2024-03-05', 0), ('2024-03-06', 2), ('2024-03-07', 0),
+            ('2024-03-08', 0), ('2024-03-09', 0), ('2024-03-10', 1),
+        ])
+    
+    def test_hourly_buckets(self):
+        params = {'period': 'hourly', 'start_date': '2024-03-06T08:15:00', 'end_date': '2024-03-06T12:00:00'}
+        
+        self.assertEqual(self.report(**params), [('2024-03-06T10:00:00+00:00', 2)])
+        self.assertEqual(self.report(fill_gaps='true', **params), [
+            ('2024-03-06T08:00:00+00:00', 0), ('2024-03-06T09:00:00+00:00', 0), ('2024-03-06T10:00:00+00:00', 2),
+            ('2024-03-06T11:00:00+00:00', 0), ('2024-03-06T12:00:00+00:00', 0),
+        ])
+    
+    def test_day_of_week_runs_monday_to_sunday(self):
+        # The range starts on a Wednesday; Monday still comes first
+        rows = self.report(period='day-of-week', start_date='2024-03-06', end_date='2024-03-10T23:59:59')
+        
+        self.assertEqual(rows, [
+            ('monday', 0), ('tuesday', 0), ('wednesday', 2), ('thursday', 0),
+            ('friday', 0), ('saturday', 0), ('sunday', 1),
+        ])
+    
+    def test_gap_filled_ranges_are_capped(self):
+        start = at(1)
+        
+        self.assertFalse(has_too_many_buckets('hourly', start, start + timedelta(hours=MAX_FILLED_BUCKETS - 1)))
+        self.assertTrue(has_too_many_buckets('hourly', start, start + timedelta(hours=MAX_FILLED_BUCKETS)))
+        self.assertEqual(self.api.get(self.URL, {'period': 'hourly', 'fill_gaps': 'true', 'start_date': '2000-01-01'}).status_code, 400)
+        self.assertEqual(self.api.get(self.URL, {'period': 'daily', 'fill_gaps': 'true', 'start_date': '2000-01-01'}).status_code, 400)
+        self.assertEqual(len(self.report(period='hourly', start_date='2000-01-01')), 3)
+        self.assertEqual(len(self.report(period='monthly', fill_gaps='true', start_date='2000-01-01', end_date='2024-03-31')), 291)
+
+
+class ComparisonTests(SalesFixtureMixin, TestCase):
+    URL = '/api/sales/reports/compare/'
+    
+    def setUp(self):
+        self.create_fixtures()
+        # (when, quantity at 10.00); 9 March 2024 and 11 March 2023 are both Saturdays
+        history = [
+            (at(1, 10), 1),
+            (at(8, 10), 2),
+            (at(9, 10), 3),
+            (timezone.make_aware(datetime(2024, 2, 9, 10)), 4),
+            (timezone.make_aware(datetime(2023, 3, 11, 10)), 5),
+        ]
+        for when, quantity in history:
+            sale = self.sell([(self.products[0], quantity)])
+            Sale.objects.filter(pk=sale.pk).update(transaction_date=when)
+        rebuild_daily_rollups()
+        self.api.force_authenticate(self.admin)
+    
+    def compare(self, **params):
+        response = self.api.get(self.URL, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+    
+    def test_previous_period(self):
+        data = self.compare(period='daily', start_date='2024-03-09', end_date='2024-03-09T23:59:59')
+        
+        self.assertEqual(data['previous']['start_date'], '2024-03-08T00:00:00+00:00')
+        self.assertEqual((data['current']['total_revenue'], data['previous']['total_revenue']), (30.0, 20.0))
+        self.assertEqual(data['change']['total_revenue'], 10.0)
+        self.assertEqual(data['change_pct']['total_revenue'], 50.0)
+    
+    def test_previous_month_to_date(self):
+        data = self.compare(period='monthly', start_date='2024-03-01', end_date='2024-03-09T23:59:59')
+        
+        self.assertEqual(
+            (data['previous']['start_date'], data['previous']['end_date']),
+            ('2024-02-01T00:00:00+00:00', '2024-02-09T23:59:59+00:00')
+        )
+        self.assertEqual((data['current']['total_sales'], data['previous']['total_sales']), (3, 1))
+        self.assertEqual(data['change_pct']['total_sales'], 200.0)
+        self.assertEqual(data['change_pct']['total_revenue'], 50.0)
+    
+    def test_previous_year_keeps_the_weekday(self):
+        data = self.compare(period='daily', compare_to='last_year', start_date='2024-03-09', end_date='2024-03-09T23:59:59')
+        
+        previous_start = datetime.fromisoformat(data['previous']['start_date'])
+        self.assertEqual(previous_start.date(), date(2023, 3, 11))
+        self.assertEqual(previous_start.weekday(), at(9).weekday())
+        self.assertEqual(data['previous']['total_revenue'], 50.0)
+        self.assertEqual(data['change']['total_revenue'], -20.0)
+        self.assertEqual(data['change_pct']['total_revenue'], -40.0)
+    
+    def test_zero_baseline_has_no_percentage(self):
+        data = self.compare(period='daily', start_date='2024-03-08', end_date='2024-03-08T23:59:59')
+        
+        self.assertEqual(data['previous']['total_sales'], 0)
+        self.assertEqual(data['change']['total_revenue'], 20.0)
+        self.assertEqual(set(data['change_pct'].values()), {None})
+    
+    def test_longer_windows_compare_with_the_same_length_before_them(self):
+        data = self.compare(period='daily', start_date='2024-03-08', end_date='2024-03-09T23:59:59')
+        
+        # Two days against the two days before, not against 7-8 March
+        self.assertEqual(
+            (data['previous']['start_date'], data['previous']['end_date']),
+            ('2024-03-06T00:00:00+00:00', '2024-03-07T23:59:59+00:00')
+        )
+        self.assertEqual((data['current']['total_sales'], data['previous']['total_sales']), (2, 0))
+        self.assertEqual(window_periods('weekly', at(1), at(14, 23, 59)), 2)
+        self.assertEqual(window_periods('monthly', at(1), at(31, 23, 59)), 1)
+    
+    def test_rejects_bad_period_and_compare_to(self):
+        self.assertEqual(self.api.get(self.URL, {'period': 'hourly'}).status_code, 400)
+        self.assertEqual(self.api.get(self.URL, {'compare_to': 'next_year'}).status_code, 400)
+
+
+class BreakdownTests(SalesFixtureMixin, TestCase):
+    URL = '/api/sales/reports/breakdown/'
+    
+    def setUp(self):
+        self.create_fixtures()
+        self.bakery = Category.objects.create(name='Bakery')
+        Product.objects.filter(pk=self.products[1].pk).update(category=self.bakery)
+        self.sell([(self.products[0], 2), (self.products[1], 1)])
+        self.sell([(self.products[0], 1)], payment_method='card')
+        self.sell([(self.products[1], 3)], user=self.south_staff, shop=self.shops[1])
+        self.api.force_authenticate(self.admin)
+    
+    def breakdown(self, **params):
+        response = self.api.get(self.URL, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['data']
+    
+    def test_groups_by_several_dimensions(self):
+        rows = self.breakdown(group_by='shop,payment_method')
+        
+        self.assertEqual(
+            [(row['shop_name'], row['payment_method'], row['total_sales'], row['total_revenue']) for row in rows],
+            [('North', 'card', 1, 10.0), ('North', 'cash', 1, 30.0), ('South', 'cash', 1, 30.0)]
+        )
+        self.assertNotIn('total', rows[0])
+    
+    def test_item_dimensions_count_bills_once(self):
+        rows = self.breakdown(group_by='shop,category')
+        
+        self.assertEqual(
+            [(row['shop_name'], row['category_name'], row['total_sales'], row['total_quantity']) for row in rows],
+            [('North', 'Dairy', 2, 3), ('North', 'Bakery', 1, 1), ('South', 'Bakery', 1, 3)]
+        )
+    
+    def test_subtotal_and_grand_total_rows(self):
+        rows = self.breakdown(group_by='shop,category', totals='true')
+        
+        self.assertEqual(
+            [
+                (row['total'], row['shop_name'], row['category_name'], row['total_sales'], row['total_quantity'], row['total_revenue'])
+                for row in rows
+            ],
+            [
+                (None, 'North', 'Dairy', 2, 3, 30.0),
+                (None, 'North', 'Bakery', 1, 1, 10.0),
+                # The first bill has both categories and counts once
+                ('shop', 'North', None, 2, 4, 40.0),
+                (None, 'South', 'Bakery', 1, 3, 30.0),
+                ('shop', 'South', None, 1, 3, 30.0),
+                ('all', None, None, 3, 7, 70.0),
+            ]
+        )
+    
+    def test_time_subtotals(self):
+        today = timezone.localdate().isoformat()
+        
+        rows = self.breakdown(group_by='time,payment_method', totals='true')
+        
+        self.assertEqual(
+            [(row['total'], row['period'], row['payment_method'], row['total_sales']) for row in rows],
+            [(None, today, 'card', 1), (None, today, 'cash', 2), ('time', today, None, 3), ('all', None, None, 3)]
+        )
+    
+    def test_fallback_matches_rollup(self):
+        # Runs the per-level queries used on databases without ROLLUP
+        with patch('apps.sales.breakdowns.connection') as fallback:
+            fallback.vendor = 'sqlite'
+            rows = breakdown_rows(['shop', 'category', 'time'], Q(), totals=True)
+        
+        self.assertEqual(rows, breakdown_rows(['shop', 'category', 'time'], Q(), totals=True))
+        self.assertEqual([row['total'] for row in rows[-4:]], [None, 'category', 'shop', 'all'])
+    
+    def test_rejects_invalid_dimensions(self):
+        for group_by in ['shop,aisle', ',', 'time']:
+            params = {'group_by': group_by}
+            if group_by == 'time':
+                params['period'] = 'fortnightly'
+            
+            self.assertEqual(self.api.get(self.URL, params).status_code, 400, group_by)
+        self.assertEqual(parse_group_by('shop, shop,time'), ['shop', 'time'])
+
+
+class StaffPerformanceTests(SalesFixtureMixin, TestCase):
+    URL = '/api/sales/reports/staff/'
+    
+    def setUp(self):
+        self.create_fixtures()
+        self.till2 = User.objects.create_user('till2', password='x', role='staff', shop=self.shops[0])
+        # (when, seller, shop index, [(product index, quantity)])
+        history = [
+            (at(5, 9), self.staff, 0, [(0, 2), (1, 1)]),
+            (at(5, 9, 30), self.staff, 0, [(0, 1)]),
+            (at(5, 14), self.staff, 0, [(2, 3)]),
+            (at(6, 10), self.till2, 0, [(0, 1)]),
+            (at(5, 10), self.south_staff, 1, [(1, 4)]),
+        ]
+        for when, user, shop, lines in history:
+            sale = self.sell([(self.products[index], quantity) for index, quantity in lines], user=user, shop=self.shops[shop])
+            Sale.objects.filter(pk=sale.pk).update(transaction_date=when)
+        self.api.force_authenticate(self.admin)
+    
+    def report(self, **params):
+        response = self.api.get(self.URL, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['data']
+    
+    def test_totals_and_averages_per_staff_member(self):
+        with self.assertNumQueries(2):
+            rows = self.report()
+        
+        self.assertEqual([row['staff_username'] for row in rows], ['staff', 'south', 'till2'])
+        self.assertEqual(rows[0], {
+            'staff_id': self.staff.id,
+            'staff_username': 'staff',
+            'total_sales': 3,
+            'total_revenue': 70.0,
+            'total_items': 7,
+            'average_basket': 23.33,
+            'items_per_sale': 2.33,
+            'active_hours': 2,
+            'sales_per_hour': 1.5,
+            'first_sale': at(5, 9),
+            'last_sale': at(5, 14),
+        })
+        self.assertEqual((rows[1]['total_items'], rows[2]['total_revenue']), (4, 10.0))
+    
+    def test_shop_staff_and_date_filters(self):
+        self.assertEqual([row['staff_username'] for row in self.report(shop_id=self.shops[1].id)], ['south'])
+        self.assertEqual([row['staff_username'] for row in self.report(staff_id=self.till2.id)], ['till2'])
+        
+        rows = self.report(start_date=at(5, 9, 15).isoformat(), end_date=at(5, 23).isoformat())
+        
+        self.assertEqual([(row['staff_username'], row['total_sales']) for row in rows], [('staff', 2), ('south', 1)])
+    
+    def test_manager_sees_own_shop_and_staff_are_forbidden(self):
+        self.api.force_authenticate(self.manager)
+        self.assertEqual([row['staff_username'] for row in self.report()], ['staff', 'till2'])
+        
+        self.api.force_authenticate(self.staff)
+        self.assertEqual(self.api.get(self.URL).status_code, 403)
+    
+    def test_csv_and_ndjson_stream_one_line_per_staff_member(self):
+        response = self.api.get(self.URL, {'format': 'csv'})
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(list(rows[0]), STAFF_COLUMNS)
+        self.assertEqual(
+            [(row['staff_username'], row['total_sales'], row['average_basket']) for row in rows],
+            [('staff', '3', '23.33'), ('south', '1', '40.0'), ('till2', '1', '10.0')]
+        )
+        response = self.api.get(self.URL, {'format': 'ndjson', 'staff_id': self.till2.id})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['total_items'] for line in lines], [1])
+
+
+class ReportFormatTests(SalesFixtureMixin, TestCase):
+    """Columnar format, ETag and compression of the report endpoints"""
+    
+    PARAMS = {'start_date': '2024-03-01', 'end_date': '2024-03-07', 'period': 'daily', 'fill_gaps': 'true'}
+    
+    def setUp(self):
+        self.create_fixtures()
+        sale = self.sell([(self.products[0], 2)])
+        Sale.objects.filter(pk=sale.pk).update(transaction_date=at(5, 10))
+        rebuild_daily_rollups()
+        rebuild_product_rollups()
+        self.api.force_authenticate(self.admin)
+    
+    def test_columnar_has_one_array_per_field(self):
+        rows = self.api.get('/api/sales/reports/', self.PARAMS).data['data']
+        
+        response = self.api.get('/api/sales/reports/', {**self.PARAMS, 'format': 'columnar'})
+        
+        columns = json.loads(response.content)['data']
+        self.assertEqual(columns['period'], [row['period'] for row in rows])
+        self.assertEqual(columns['total_sales'], [0, 0, 0, 0, 1, 0, 0])
+        self.assertLess(len(response.content), len(json.dumps({'data': rows})))
+    
+    def test_matching_etag_answers_not_modified(self):
+        etag = self.api.get('/api/sales/reports/', self.PARAMS)['ETag']
+        
+        response = self.api.get('/api/sales/reports/', self.PARAMS, HTTP_IF_NONE_MATCH=etag)
+        
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.api.get('/api/sales/reports/', self.PARAMS, HTTP_IF_NONE_MATCH='W/"stale"').status_code, 200)
+    
+    def test_etag_changes_with_the_report(self):
+        etag = self.api.get('/api/sales/reports/', self.PARAMS)['ETag']
+        
+        params = {**self.PARAMS, 'end_date': '2024-03-08'}
+        
+        self.assertNotEqual(self.api.get('/api/sales/reports/', params)['ETag'], etag)
+    
+    def test_gzip_when_accepted(self):
+        plain = self.api.get('/api/sales/reports/', self.PARAMS)
+        
+        response = self.api.get('/api/sales/reports/', self.PARAMS, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+    
+    def test_every_report_endpoint_is_tagged(self):
+        for url in ['', 'payment-methods/', 'top-products/', 'compare/', 'breakdown/']:
+            response = self.api.get(f'/api/sales/reports/{url}', {'start_date': '2024-03-01', 'end_date': '2024-03-07'})
+            
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(self.api.get(
+                f'/api/sales/reports/{url}', {'start_date': '2024-03-01', 'end_date': '2024-03-07'},
+                HTTP_IF_NONE_MATCH=response['ETag']
+            ).status_code, 304, url)
+    
+    def test_errors_are_not_tagged(self):
+        response = self.api.get('/api/sales/reports/', {'format': 'columnar', 'period': 'fortnightly'})
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('ETag', response)
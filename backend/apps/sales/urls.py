@@ -2,16 +2,21 @@
 URL patterns for sales app
 """
 from django.urls import path
-from .views import SaleListCreateView, SaleRetrieveView
-from .reports import SalesReportView, SalesByPaymentMethodView, TopProductsView
+from .views import SaleListCreateView, SaleRetrieveView, SaleReceiptView
+from .reports import SalesReportView, SalesByPaymentMethodView, TopProductsView, SalesComparisonView, SalesBreakdownView, StaffPerformanceView, ReportCacheStatsView
 
 app_name = 'sales'
 
 urlpatterns = [
     path('', SaleListCreateView.as_view(), name='sale-list-create'),
     path('<int:pk>/', SaleRetrieveView.as_view(), name='sale-detail'),
+    path('receipts/<int:shop_id>/<int:receipt_no>/', SaleReceiptView.as_view(), name='sale-receipt'),
     path('reports/', SalesReportView.as_view(), name='sales-report'),
     path('reports/payment-methods/', SalesByPaymentMethodView.as_view(), name='payment-methods-report'),
     path('reports/top-products/', TopProductsView.as_view(), name='top-products-report'),
+    path('reports/compare/', SalesComparisonView.as_view(), name='comparison-report'),
+    path('reports/breakdown/', SalesBreakdownView.as_view(), name='breakdown-report'),
+    path('reports/staff/', StaffPerformanceView.as_view(), name='staff-performance-report'),
+    path('reports/cache-stats/', ReportCacheStatsView.as_view(), name='report-cache-stats'),
 ]
 
@@ -6,11 +6,13 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import serializers as drf_serializers
 from django.db.models import Q, Sum, Count
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from datetime import timedelta
 from .models import Sale, SaleItem
-from .serializers import SaleSerializer, SaleCreateSerializer
+from .serializers import SaleSerializer, SaleSummarySerializer, SaleCreateSerializer
 from .permissions import IsStaffOrSalesManagerOrAdmin
+from supermarket_analysis.pagination import SalePagination
 
 
 class SaleListCreateView(generics.ListCreateAPIView):
@@ -18,21 +20,42 @@ class SaleListCreateView(generics.ListCreateAPIView):
     List all sales or create a new sale
     
     GET /api/sales/ - List all sales (all authenticated users)
+    GET /api/sales/?include_items=false - List sale summaries without nested items
     POST /api/sales/ - Create new sale (staff/sales_manager/admin only)
     """
     queryset = Sale.objects.select_related('shop', 'staff').prefetch_related('items__product').all()
     permission_classes = [IsAuthenticated, IsStaffOrSalesManagerOrAdmin]
+    pagination_class = SalePagination
+    
+    # Columns needed by SaleSummarySerializer
+    SUMMARY_FIELDS = [
+        'id', 'shop', 'shop__name', 'receipt_no', 'staff', 'staff__username', 'transaction_date',
+        'total_amount', 'discount', 'tax', 'final_amount', 'payment_method', 'created_at',
+    ]
+    
+    def include_items(self):
+        """Nested items are returned unless ?include_items=false is passed"""
+        include_items = self.request.query_params.get('include_items', 'true')
+        return include_items.lower() != 'false'
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return SaleCreateSerializer
+        if not self.include_items():
+            return SaleSummarySerializer
         return SaleSerializer
     
     def get_queryset(self):
         """
         Filter sales based on query parameters and user role
         """
-        queryset = Sale.objects.select_related('shop', 'staff').prefetch_related('items__product').all()
+        queryset = Sale.objects.select_related('shop', 'staff')
+        
+        if self.include_items():
+            queryset = queryset.prefetch_related('items__product')
+        else:
+            # Summary mode: count items in the same query and skip unused columns
+            queryset = queryset.only(*self.SUMMARY_FIELDS).annotate(num_items=Count('items'))
         
         # Sales Manager and Staff can only see their shop's sales
         if self.request.user.role in ['sales_manager', 'staff'] and self.request.user.shop:
@@ -62,7 +85,7 @@ class SaleListCreateView(generics.ListCreateAPIView):
         if payment_method:
             queryset = queryset.filter(payment_method=payment_method)
         
-        return queryset.order_by('-transaction_date', '-created_at')
+        return queryset.order_by('-transaction_date', '-id')
     
     def create(self, request, *args, **kwargs):
         """
@@ -99,3 +122,35 @@ class SaleRetrieveView(generics.RetrieveAPIView):
     serializer_class = SaleSerializer
     permission_classes = [IsAuthenticated, IsStaffOrSalesManagerOrAdmin]
     lookup_field = 'pk'
+
+
+class SaleReceiptView(generics.RetrieveAPIView):
+    """
+    Retrieve a sale by its per-shop receipt number (returns, reprints)
+    
+    GET /api/sales/receipts/{shop_id}/{receipt_no}/ - Get sale details (all authenticated users)
+    """
+    queryset = Sale.objects.select_related('shop', 'staff').prefetch_related('items__product').all()
+    serializer_class = SaleSerializer
+    permission_classes = [IsAuthenticated, IsStaffOrSalesManagerOrAdmin]
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        
+        # Sales Manager and Staff only find their shop's receipts
+        if self.request.user.role in ['sales_manager', 'staff'] and self.request.user.shop:
+            queryset = queryset.filter(shop=self.request.user.shop)
+        
+        return queryset
+    
+    def get_object(self):
+        """
+        Look up the sale on the unique (shop, receipt_no) index
+        """
+        sale = get_object_or_404(
+            self.get_queryset(),
+            shop_id=self.kwargs['shop_id'],
+            receipt_no=self.kwargs['receipt_no']
+        )
+        self.check_object_permissions(self.request, sale)
+        return sale
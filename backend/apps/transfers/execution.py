@@ -0,0 +1,249 @@
+"""
+Moving stock between shops
+
+Every stock row a transfer touches is locked in (shop_id, product_id) order,
+the same order checkout locks its rows in, so concurrent transfers and sales
+wait for each other instead of deadlocking. All quantities are then changed
+by one conditional UPDATE with F() expressions, so a decrement can never take
+a row below zero, however many lines a transfer batch has.
+
+Status changes of transfers and batches go through transition(), a
+conditional UPDATE on the status the caller expects. Of two admins acting on
+the same request at once, exactly one UPDATE matches; the other gets a
+TransitionConflict instead of silently overwriting the first.
+"""
+from django.db import transaction
+from django.db.models import F, Q, Case, When, Value, IntegerField
+from django.utils import timezone
+from apps.inventory.models import Stock, StockHistory
+from .models import StockTransfer, TransferBatch
+
+
+class TransferError(Exception):
+    """A transfer cannot be carried out; the message is safe to show"""
+
+
+class InsufficientStock(TransferError):
+    def __init__(self, stock, required):
+        self.stock = stock
+        self.required = required
+        available = stock.quantity if stock else 0
+        super().__init__(f'Insufficient stock. Available: {available}, Required: {required}')
+
+
+class TransitionConflict(TransferError):
+    """The transfer or batch was no longer in the expected status"""
+
+
+# action -> (status it applies to, status it sets)
+TRANSITIONS = {
+    'approve': ('pending', 'approved'),
+    'reject': ('pending', 'rejected'),
+    'cancel': ('pending', 'cancelled'),
+    'complete': ('approved', 'completed'),
+}
+
+
+def transition(instance, action, **fields):
+    """
+    Apply a status change to a StockTransfer or TransferBatch
+    
+    Only an UPDATE ... WHERE status = <expected> is issued, so no row lock
+    is needed up front. The instance gets the new status and fields.
+    
+    Args:
+        instance: StockTransfer or TransferBatch
+        action: Key of TRANSITIONS
+        **fields: Other columns to set, e.g. approved_by
+    
+    Raises:
+        TransitionConflict if the row is not in the expected status
+    """
+    expected, new_status = TRANSITIONS[action]
+    model = type(instance)
+    fields = {'status': new_status, 'updated_at': timezone.now(), **fields}
+    
+    if not model.objects.filter(pk=instance.pk, status=expected).update(**fields):
+        current = model.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+        raise TransitionConflict(
+            f'{model._meta.verbose_name.capitalize()} {instance.pk} is {current}, not {expected}; '
+            f'it may have just been changed by someone else.'
+        )
+    
+    for name, value in fields.items():
+        setattr(instance, name, value)
+
+
+def lock_stocks(pairs):
+    """
+    Lock the stock rows of (shop_id, product_id) pairs in deterministic order
+    
+    Returns:
+        Dict of (shop_id, product_id) -> Stock, with shop and product loaded
+    """
+    pairs = sorted(set(pairs))
+    pair_q = Q()
+    for shop_id, product_id in pairs:
+        pair_q |= Q(shop_id=shop_id, product_id=product_id)
+    stocks = Stock.objects.select_for_update(of=('self',)).select_related('shop', 'product').filter(
+        pair_q
+    ).order_by('shop_id', 'product_id')
+    return {(stock.shop_id, stock.product_id): stock for stock in stocks}
+
+
+def move_stock(transfers, changed_by=None):
+    """
+    Move the quantities of transfers from their source to their destination shop
+    
+    Must run inside a transaction. Destination stock records are created
+    when missing. Raises InsufficientStock (and so rolls the transaction
+    back) if a source shop cannot cover its lines.
+    
+    Args:
+        transfers: Iterable of StockTransfer (from_shop_id, to_shop_id,
+            product_id, quantity, id)
+        changed_by: Optional user recorded in the stock ledger
+    
+    Returns:
+        List of the changed Stock instances, holding their new quantities
+    """
+    transfers = list(transfers)
+    
+    # Net change per stock row
+    deltas = {}
+    for transfer in transfers:
+        source = (transfer.from_shop_id, transfer.product_id)
+        destination = (transfer.to_shop_id, transfer.product_id)
+        deltas[source] = deltas.get(source, 0) - transfer.quantity
+        deltas[destination] = deltas.get(destination, 0) + transfer.quantity
+    
+    # Missing destination rows; a concurrent insert of the same row is skipped
+    Stock.objects.bulk_create(
+        [
+            Stock(shop_id=shop_id, product_id=product_id, quantity=0)
+            for (shop_id, product_id), delta in deltas.items()
+            if delta > 0
+        ],
+        ignore_conflicts=True,
+    )
+    
+    stocks = lock_stocks(deltas)
+    
+    for pair, delta in deltas.items():
+        stock = stocks.get(pair)
+        if delta < 0 and (stock is None or stock.quantity < -delta):
+            raise InsufficientStock(stock, -delta)
+    
+    now = timezone.now()
+    running = {pair: stock.quantity for pair, stock in stocks.items()}
+    changed = [stocks[pair] for pair in sorted(deltas) if deltas[pair]]
+    
+    # All rows in one UPDATE; each decrement only applies while it still fits
+    guard = Q()
+    for stock in changed:
+        delta = deltas[(stock.shop_id, stock.product_id)]
+        guard |= Q(pk=stock.pk, quantity__gte=-delta) if delta < 0 else Q(pk=stock.pk)
+    if changed:
+        updated = Stock.objects.filter(guard).update(
+            quantity=F('quantity') + Case(
+                *[When(pk=stock.pk, then=Value(deltas[(stock.shop_id, stock.product_id)])) for stock in changed],
+                output_field=IntegerField(),
+            ),
+            last_updated=now,
+        )
+        if updated != len(changed):
+            raise TransferError('Stock changed while the transfer was being applied. Please retry.')
+    
+    for stock in changed:
+        stock.quantity += deltas[(stock.shop_id, stock.product_id)]
+        stock.last_updated = now
+    
+    # One ledger row per transfer and side, in transfer order
+    entries = []
+    for transfer in transfers:
+        for pair, change, change_type in [
+            ((transfer.from_shop_id, transfer.product_id), -transfer.quantity, 'transfer_out'),
+            ((transfer.to_shop_id, transfer.product_id), transfer.quantity, 'transfer_in'),
+        ]:
+            entries.append(StockHistory(
+                stock_id=stocks[pair].id,
+                previous_quantity=running[pair],
+                new_quantity=running[pair] + change,
+                change=change,
+                change_type=change_type,
+                reference_id=transfer.id,
+                changed_by=changed_by,
+                created_at=now,
+            ))
+            running[pair] += change
+    StockHistory.objects.bulk_create(entries)
+    
+    return changed
+
+
+def complete_transfer(transfer_id, user):
+    """
+    Complete an approved transfer: move its stock and mark it completed
+    
+    The status changes first, in the same transaction: of two concurrent
+    completions of the same transfer only one matches 'approved', and the
+    stock is only moved by that one.
+    
+    Returns:
+        The completed StockTransfer
+    
+    Raises:
+        TransitionConflict if the transfer is no longer approved,
+        InsufficientStock if the source shop cannot cover it
+    """
+    transfer = StockTransfer.objects.select_related('from_shop', 'to_shop', 'product').get(pk=transfer_id)
+    
+    with transaction.atomic():
+        transition(transfer, 'complete', completed_at=timezone.now())
+        stocks = move_stock([transfer], changed_by=user)
+        schedule_followups(stocks)
+    
+    return transfer
+
+
+def complete_batch(batch_id, user):
+    """
+    Complete an approved transfer batch: move every line and mark all completed
+    
+    All lines move in one transaction with one stock UPDATE; if any source
+    row cannot cover its lines nothing is moved.
+    
+    Returns:
+        The completed TransferBatch
+    
+    Raises:
+        TransitionConflict if the batch is no longer approved,
+        InsufficientStock if stock is short
+    """
+    batch = TransferBatch.objects.get(pk=batch_id)
+    now = timezone.now()
+    
+    with transaction.atomic():
+        transition(batch, 'complete', completed_at=now)
+        
+        lines = list(batch.lines.all())
+        stocks = move_stock(lines, changed_by=user)
+        batch.lines.update(status='completed', completed_at=now, updated_at=now)
+        
+        schedule_followups(stocks)
+    
+    return batch
+
+
+def schedule_followups(stocks):
+    """
+    After commit: low stock alerts raised or resolved for every moved row,
+    fresh availability, and report cache invalidation
+    """
+    from apps.analytics.alerts import schedule_low_stock_alerts
+    from apps.inventory.availability import schedule_availability_invalidation
+    from apps.sales.report_cache import schedule_report_invalidation
+    
+    schedule_low_stock_alerts(stocks)
+    schedule_availability_invalidation(stocks)
+    schedule_report_invalidation({stock.shop_id for stock in stocks})
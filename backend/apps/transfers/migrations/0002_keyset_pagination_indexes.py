@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stocktransfer',
+            index=models.Index(fields=['-requested_at', '-id'], name='transfers_requested_id_idx'),
+        ),
+    ]
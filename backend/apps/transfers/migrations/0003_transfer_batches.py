@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shops', '0001_initial'),
+        ('transfers', '0002_keyset_pagination_indexes'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='TransferBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], default='pending', max_length=20)),
+                ('notes', models.TextField(blank=True, help_text='Optional notes for the batch')),
+                ('requested_at', models.DateTimeField(auto_now_add=True)),
+                ('approved_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('approved_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='approved_transfer_batches', to=settings.AUTH_USER_MODEL)),
+                ('from_shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outgoing_transfer_batches', to='shops.shop')),
+                ('requested_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='requested_transfer_batches', to=settings.AUTH_USER_MODEL)),
+                ('to_shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='incoming_transfer_batches', to='shops.shop')),
+            ],
+            options={
+                'db_table': 'transfer_batches',
+                'ordering': ['-requested_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='stocktransfer',
+            name='batch',
+            field=models.ForeignKey(blank=True, help_text='Set for line items of a multi-product transfer', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='transfers.transferbatch'),
+        ),
+        migrations.AddIndex(
+            model_name='transferbatch',
+            index=models.Index(fields=['-requested_at', '-id'], name='transfer_batches_requested_idx'),
+        ),
+    ]
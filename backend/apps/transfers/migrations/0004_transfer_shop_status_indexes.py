@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0001_initial'),
+        ('transfers', '0003_transfer_batches'),
+    ]
+
+    operations = [
+        # Shop-leading indexes first, then the single-column FK indexes they replace
+        migrations.AddIndex(
+            model_name='stocktransfer',
+            index=models.Index(fields=['from_shop', 'status', '-requested_at', '-id'], name='transfers_from_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocktransfer',
+            index=models.Index(fields=['to_shop', 'status', '-requested_at', '-id'], name='transfers_to_status_idx'),
+        ),
+        migrations.AlterField(
+            model_name='stocktransfer',
+            name='from_shop',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='outgoing_transfers', to='shops.shop'),
+        ),
+        migrations.AlterField(
+            model_name='stocktransfer',
+            name='to_shop',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='incoming_transfers', to='shops.shop'),
+        ),
+    ]
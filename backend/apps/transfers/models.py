@@ -1,7 +1,20 @@
 from django.db import models
+from django.db.models import Q
 from django.core.validators import MinValueValidator
 
 
+class StockTransferQuerySet(models.QuerySet):
+    def involving_shop(self, shop):
+        """
+        Transfers from or to a shop
+        
+        Both sides go in one OR so the planner can combine scans of
+        transfers_from_status_idx and transfers_to_status_idx (a BitmapOr)
+        with the other filters, instead of reading the whole table.
+        """
+        return self.filter(Q(from_shop=shop) | Q(to_shop=shop))
+
+
 class StockTransfer(models.Model):
     """
     Stock transfer requests between shops
@@ -14,10 +27,15 @@ class StockTransfer(models.Model):
         ('cancelled', 'Cancelled'),
     ]
     
-    from_shop = models.ForeignKey('shops.Shop', on_delete=models.CASCADE, related_name='outgoing_transfers')
-    to_shop = models.ForeignKey('shops.Shop', on_delete=models.CASCADE, related_name='incoming_transfers')
+    # Indexed as the leading column of transfers_from_status_idx / transfers_to_status_idx
+    from_shop = models.ForeignKey('shops.Shop', on_delete=models.CASCADE, related_name='outgoing_transfers', db_index=False)
+    to_shop = models.ForeignKey('shops.Shop', on_delete=models.CASCADE, related_name='incoming_transfers', db_index=False)
     product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='transfers')
     quantity = models.IntegerField(validators=[MinValueValidator(1)])
+    batch = models.ForeignKey(
+        'TransferBatch', on_delete=models.CASCADE, null=True, blank=True, related_name='lines',
+        help_text="Set for line items of a multi-product transfer"
+    )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     notes = models.TextField(blank=True, help_text="Optional notes for the transfer request")
     
@@ -31,9 +49,17 @@ class StockTransfer(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = StockTransferQuerySet.as_manager()
+    
     class Meta:
         db_table = 'stock_transfers'
         ordering = ['-requested_at']
+        indexes = [
+            models.Index(fields=['-requested_at', '-id'], name='transfers_requested_id_idx'),
+            # One per side of the sales manager's "involving my shop" listing
+            models.Index(fields=['from_shop', 'status', '-requested_at', '-id'], name='transfers_from_status_idx'),
+            models.Index(fields=['to_shop', 'status', '-requested_at', '-id'], name='transfers_to_status_idx'),
+        ]
     
     def __str__(self):
         return f"Transfer {self.id}: {self.product.name} ({self.quantity}) from {self.from_shop.name} to {self.to_shop.name} - {self.status}"
@@ -53,3 +79,46 @@ class StockTransfer(models.Model):
     def can_be_rejected(self):
         """Check if transfer can be rejected (must be pending)"""
         return self.status == 'pending'
+
+
+class TransferBatch(models.Model):
+    """
+    Many products moved between the same two shops as one request
+    
+    Line items are StockTransfer rows pointing at the batch. They carry the
+    batch's status and are approved and completed together, in one
+    transaction, through the batch endpoints.
+    """
+    from_shop = models.ForeignKey('shops.Shop', on_delete=models.CASCADE, related_name='outgoing_transfer_batches')
+    to_shop = models.ForeignKey('shops.Shop', on_delete=models.CASCADE, related_name='incoming_transfer_batches')
+    status = models.CharField(max_length=20, choices=StockTransfer.STATUS_CHOICES, default='pending')
+    notes = models.TextField(blank=True, help_text="Optional notes for the batch")
+    
+    # User tracking
+    requested_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True, related_name='requested_transfer_batches')
+    approved_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='approved_transfer_batches')
+    
+    # Timestamps
+    requested_at = models.DateTimeField(auto_now_add=True)
+    approved_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'transfer_batches'
+        ordering = ['-requested_at']
+        indexes = [
+            models.Index(fields=['-requested_at', '-id'], name='transfer_batches_requested_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Transfer batch {self.id}: {self.from_shop_id} -> {self.to_shop_id} - {self.status}"
+    
+    def can_be_approved(self):
+        return self.status == 'pending'
+    
+    def can_be_completed(self):
+        return self.status == 'approved'
+    
+    def can_be_rejected(self):
+        return self.status == 'pending'
@@ -0,0 +1,196 @@
+"""
+Inter-shop rebalancing planner
+
+Finds shops at or below a product's minimum threshold and covers them from
+shops holding more than they need, moving only the units required. All
+stock rows are read in one query and the plan is computed with array
+operations over every product at once:
+
+- A receiver is brought up to its target level (threshold plus margin,
+  capped by max_capacity); a donor keeps that same level and gives the rest.
+- Within each product, donors and receivers are both sorted largest first
+  and laid end to end on one line of units. Every stretch where one donor
+  meets one receiver becomes one transfer, which gives at most
+  donors + receivers - 1 transfers per product.
+
+Quantities already on their way (pending or approved transfers) are counted,
+so running the planner twice does not double the plan.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum
+from apps.inventory.models import Stock
+from .models import StockTransfer, TransferBatch
+
+
+# Share of the minimum threshold kept on top of it, by donors and receivers
+DEFAULT_MARGIN = 0.5
+
+PLAN_NOTES = 'Suggested by the rebalancing planner'
+
+
+def load_stock_levels(shop_ids=None, category_id=None):
+    """
+    Stock of active products in active shops as parallel integer arrays
+    
+    Returns:
+        Dict of 'shop', 'product', 'quantity', 'min_threshold' and
+        'max_capacity' arrays (max_capacity -1 where unset)
+    """
+    stocks = Stock.objects.filter(shop__is_active=True, product__is_active=True)
+    if shop_ids:
+        stocks = stocks.filter(shop_id__in=shop_ids)
+    if category_id:
+        stocks = stocks.filter(product__category_id=category_id)
+    
+    rows = list(stocks.order_by().values_list('shop_id', 'product_id', 'quantity', 'min_threshold', 'max_capacity'))
+    columns = ['shop', 'product', 'quantity', 'min_threshold', 'max_capacity']
+    if not rows:
+        return {name: np.zeros(0, dtype=np.int64) for name in columns}
+    
+    shop, product, quantity, min_threshold, max_capacity = zip(*rows)
+    return {
+        'shop': np.array(shop, dtype=np.int64),
+        'product': np.array(product, dtype=np.int64),
+        'quantity': np.array(quantity, dtype=np.int64),
+        'min_threshold': np.array(min_threshold, dtype=np.int64),
+        'max_capacity': np.array([-1 if value is None else value for value in max_capacity], dtype=np.int64),
+    }
+
+
+def in_flight_quantities(levels):
+    """Net units per stock row from transfers that are pending or approved"""
+    index = {
+        (shop, product): i
+        for i, (shop, product) in enumerate(zip(levels['shop'].tolist(), levels['product'].tolist()))
+    }
+    net = np.zeros(len(levels['shop']), dtype=np.int64)
+    
+    transfers = StockTransfer.objects.filter(status__in=['pending', 'approved']).values(
+        'from_shop_id', 'to_shop_id', 'product_id'
+    ).annotate(total=Sum('quantity')).order_by()
+    for row in transfers:
+        source = index.get((row['from_shop_id'], row['product_id']))
+        if source is not None:
+            net[source] -= row['total']
+        destination = index.get((row['to_shop_id'], row['product_id']))
+        if destination is not None:
+            net[destination] += row['total']
+    return net
+
+
+def within_group_cumsum(groups, values):
+    """Running total of values restarting at each group (groups sorted)"""
+    totals = np.cumsum(values)
+    starts = np.searchsorted(groups, groups, side='left')
+    return totals - totals[starts] + values[starts]
+
+
+def plan_rebalancing(levels, in_flight=None, margin=DEFAULT_MARGIN):
+    """
+    Compute the transfers that rebalance the given stock levels
+    
+    Args:
+        levels: Arrays from load_stock_levels
+        in_flight: Optional per-row net quantity already being transferred
+        margin: Share of min_threshold kept above it (see DEFAULT_MARGIN)
+    
+    Returns:
+        (transfers, summary): transfers is a list of dicts with from_shop,
+        to_shop, product and quantity; summary has the totals
+    
+    Rows with no minimum threshold set never receive, and only give what
+    they hold above max_capacity.
+    """
+    quantity = levels['quantity'] + (in_flight if in_flight is not None else 0)
+    min_threshold = levels['min_threshold']
+    max_capacity = levels['max_capacity']
+    has_capacity = max_capacity >= 0
+    
+    target = np.maximum(np.ceil(min_threshold * (1 + margin)).astype(np.int64), min_threshold + 1)
+    target = np.where(has_capacity, np.minimum(target, max_capacity), target)
+    tracked = min_threshold > 0
+    
+    need = np.where(tracked & (quantity <= min_threshold), np.maximum(target - quantity, 0), 0)
+    keep = np.where(tracked, target, np.where(has_capacity, max_capacity, quantity))
+    surplus = np.maximum(quantity - keep, 0)
+    
+    products, product_index = np.unique(levels['product'], return_inverse=True)
+    needed = np.bincount(product_index, weights=need, minlength=len(products)).astype(np.int64)
+    available = np.bincount(product_index, weights=surplus, minlength=len(products)).astype(np.int64)
+    moved = np.minimum(needed, available)
+    base = np.concatenate([[0], np.cumsum(moved)[:-1]])
+    
+    def lay_out(amounts):
+        # Rows with something to give or take, by product then largest first,
+        # and where each one ends on the line of units
+        rows = np.flatnonzero(amounts > 0)
+        rows = rows[np.lexsort((-amounts[rows], product_index[rows]))]
+        groups = product_index[rows]
+        ends = base[groups] + np.minimum(within_group_cumsum(groups, amounts[rows]), moved[groups])
+        return rows, ends
+    
+    donors, donor_ends = lay_out(surplus)
+    receivers, receiver_ends = lay_out(need)
+    
+    breakpoints = np.unique(np.concatenate([donor_ends, receiver_ends]))
+    amounts = np.diff(np.concatenate([[0], breakpoints]))
+    breakpoints = breakpoints[amounts > 0]
+    amounts = amounts[amounts > 0]
+    
+    donor_rows = donors[np.searchsorted(donor_ends, breakpoints, side='left')]
+    receiver_rows = receivers[np.searchsorted(receiver_ends, breakpoints, side='left')]
+    
+    transfers = [
+        {'from_shop': from_shop, 'to_shop': to_shop, 'product': product, 'quantity': units}
+        for from_shop, to_shop, product, units in sorted(zip(
+            levels['shop'][donor_rows].tolist(),
+            levels['shop'][receiver_rows].tolist(),
+            levels['product'][donor_rows].tolist(),
+            amounts.tolist(),
+        ))
+    ]
+    summary = {
+        'stock_rows': len(quantity),
+        'rows_below_threshold': int(np.count_nonzero(need)),
+        'units_needed': int(needed.sum()),
+        'units_moved': int(moved.sum()),
+        'units_short': int((needed - moved).sum()),
+        'transfers': len(transfers),
+    }
+    return transfers, summary
+
+
+def create_planned_batches(transfers, user):
+    """
+    Save a plan as pending transfer batches, one per (from_shop, to_shop)
+    
+    Returns:
+        List of the created TransferBatch instances
+    """
+    by_route = {}
+    for transfer in transfers:
+        by_route.setdefault((transfer['from_shop'], transfer['to_shop']), []).append(transfer)
+    
+    with transaction.atomic():
+        batches = TransferBatch.objects.bulk_create([
+            TransferBatch(from_shop_id=from_shop, to_shop_id=to_shop, notes=PLAN_NOTES, requested_by=user)
+            for from_shop, to_shop in by_route
+        ])
+        StockTransfer.objects.bulk_create(
+            [
+                StockTransfer(
+                    batch=batch,
+                    from_shop_id=batch.from_shop_id,
+                    to_shop_id=batch.to_shop_id,
+                    product_id=transfer['product'],
+                    quantity=transfer['quantity'],
+                    notes=PLAN_NOTES,
+                    requested_by=user,
+                )
+                for batch, route_transfers in zip(batches, by_route.values())
+                for transfer in route_transfers
+            ],
+            batch_size=1000,
+        )
+    return batches
@@ -3,7 +3,7 @@ Serializers for transfers app
 """
 from rest_framework import serializers
 from django.db import transaction
-from .models import StockTransfer
+from .models import StockTransfer, TransferBatch
 from apps.inventory.models import Stock
 
 
@@ -109,6 +109,11 @@ class StockTransferActionSerializer(serializers.Serializer):
         transfer = self.context.get('transfer')
         action = self.context.get('action')
         
+        if transfer.batch_id:
+            raise serializers.ValidationError(
+                f'This transfer is a line of batch {transfer.batch_id}; use the batch endpoints instead.'
+            )
+        
         if action == 'approve' and not transfer.can_be_approved():
             raise serializers.ValidationError('Transfer can only be approved if it is pending.')
         
@@ -133,3 +138,115 @@ class StockTransferActionSerializer(serializers.Serializer):
         
         return data
 
+
+class TransferBatchLineSerializer(serializers.ModelSerializer):
+    """
+    Line item of a transfer batch
+    """
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    
+    class Meta:
+        model = StockTransfer
+        fields = ['id', 'product', 'product_name', 'quantity', 'status']
+        read_only_fields = ['id', 'product_name', 'status']
+    
+    def validate_quantity(self, value):
+        """Validate quantity"""
+        if value < 1:
+            raise serializers.ValidationError("Quantity must be at least 1.")
+        return value
+
+
+class TransferBatchSerializer(serializers.ModelSerializer):
+    """
+    Serializer for TransferBatch with its line items
+    """
+    from_shop_name = serializers.CharField(source='from_shop.name', read_only=True)
+    to_shop_name = serializers.CharField(source='to_shop.name', read_only=True)
+    requested_by_username = serializers.CharField(source='requested_by.username', read_only=True)
+    approved_by_username = serializers.CharField(source='approved_by.username', read_only=True)
+    lines = TransferBatchLineSerializer(many=True)
+    
+    class Meta:
+        model = TransferBatch
+        fields = [
+            'id', 'from_shop', 'from_shop_name', 'to_shop', 'to_shop_name',
+            'status', 'notes', 'lines', 'requested_by', 'requested_by_username',
+            'approved_by', 'approved_by_username', 'requested_at', 'approved_at',
+            'completed_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'id', 'status', 'requested_by', 'approved_by', 'requested_at',
+            'approved_at', 'completed_at', 'updated_at', 'from_shop_name',
+            'to_shop_name', 'requested_by_username', 'approved_by_username'
+        ]
+    
+    def validate_to_shop(self, value):
+        """Validate that sales manager can only request TO their shop"""
+        request = self.context.get('request')
+        if request and request.user.role == 'sales_manager':
+            if not request.user.shop:
+                raise serializers.ValidationError('You must be assigned to a shop to request transfers.')
+            if value.id != request.user.shop_id:
+                raise serializers.ValidationError('You can only request transfers TO your assigned shop.')
+        return value
+    
+    def validate_lines(self, value):
+        if not value:
+            raise serializers.ValidationError('A batch must have at least one line.')
+        product_ids = [line['product'].id for line in value]
+        if len(set(product_ids)) != len(product_ids):
+            raise serializers.ValidationError('Each product can only appear once in a batch.')
+        return value
+    
+    def validate(self, data):
+        """Check every line against the source shop's stock in one query"""
+        from_shop = data.get('from_shop')
+        to_shop = data.get('to_shop')
+        lines = data.get('lines', [])
+        
+        # Cannot transfer to the same shop
+        if from_shop.id == to_shop.id:
+            raise serializers.ValidationError({
+                'to_shop': 'Cannot transfer to the same shop.'
+            })
+        
+        available = dict(
+            Stock.objects.filter(
+                shop=from_shop, product_id__in=[line['product'].id for line in lines]
+            ).values_list('product_id', 'quantity')
+        )
+        issues = []
+        for line in lines:
+            product = line['product']
+            if product.id not in available:
+                issues.append(f'Product {product.name} is not available in {from_shop.name}.')
+            elif available[product.id] < line['quantity']:
+                issues.append(
+                    f'Insufficient stock for {product.name}. Available: {available[product.id]}, Requested: {line["quantity"]}'
+                )
+        if issues:
+            raise serializers.ValidationError({'lines': issues})
+        
+        return data
+    
+    def create(self, validated_data):
+        """Create the batch and all its lines with one insert"""
+        request = self.context.get('request')
+        lines = validated_data.pop('lines')
+        
+        with transaction.atomic():
+            batch = TransferBatch.objects.create(requested_by=request.user, **validated_data)
+            StockTransfer.objects.bulk_create([
+                StockTransfer(
+                    batch=batch,
+                    from_shop=batch.from_shop,
+                    to_shop=batch.to_shop,
+                    product=line['product'],
+                    quantity=line['quantity'],
+                    requested_by=request.user,
+                )
+                for line in lines
+            ])
+        
+        return batch
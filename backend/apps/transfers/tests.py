@@ -1,3 +1,487 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import numpy as np
+from unittest import skipUnless
+from unittest.mock import patch
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+from apps.accounts.models import User
+from apps.shops.models import Shop
+from apps.products.models import Category, Product
+from apps.inventory.models import Stock, StockHistory
+from .models import StockTransfer, TransferBatch
+from .rebalancing import plan_rebalancing
+from .execution import (
+    TRANSITIONS, TransferError, InsufficientStock, TransitionConflict, transition, complete_transfer, complete_batch
+)
 
-# Create your tests here.
+
+class TransferFixtureMixin:
+    """Two shops stocking two products, and an admin to approve and complete"""
+    
+    def create_fixtures(self, quantity=100):
+        self.admin = User.objects.create_user('admin', password='x', role='admin')
+        self.shops = [
+            Shop.objects.create(name='North', address='1 North Road'),
+            Shop.objects.create(name='South', address='2 South Road'),
+        ]
+        self.products = [
+            Product.objects.create(name='Milk', unit_price=Decimal('30.00'), barcode='1001'),
+            Product.objects.create(name='Bread', unit_price=Decimal('40.00'), barcode='1002'),
+        ]
+        for shop in self.shops:
+            for product in self.products:
+                Stock.objects.create(shop=shop, product=product, quantity=quantity, min_threshold=5)
+    
+    def approved_transfer(self, from_shop, to_shop, product, quantity):
+        return StockTransfer.objects.create(
+            from_shop=from_shop,
+            to_shop=to_shop,
+            product=product,
+            quantity=quantity,
+            status='approved',
+            requested_by=self.admin,
+            approved_by=self.admin,
+        )
+    
+    def quantity(self, shop, product):
+        return Stock.objects.get(shop=shop, product=product).quantity
+
+
+class CompleteTransferTests(TransferFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+    
+    def test_moves_stock_and_records_ledger(self):
+        north, south = self.shops
+        transfer = self.approved_transfer(north, south, self.products[0], 30)
+        
+        transfer = complete_transfer(transfer.pk, self.admin)
+        
+        self.assertEqual(transfer.status, 'completed')
+        self.assertIsNotNone(transfer.completed_at)
+        self.assertEqual(self.quantity(north, self.products[0]), 70)
+        self.assertEqual(self.quantity(south, self.products[0]), 130)
+        self.assertEqual(
+            sorted(StockHistory.objects.filter(reference_id=transfer.pk).values_list('change_type', 'change')),
+            [('transfer_in', 30), ('transfer_out', -30)]
+        )
+    
+    def test_creates_missing_destination_stock(self):
+        north, south = self.shops
+        Stock.objects.filter(shop=south, product=self.products[1]).delete()
+        transfer = self.approved_transfer(north, south, self.products[1], 10)
+        
+        complete_transfer(transfer.pk, self.admin)
+        
+        self.assertEqual(self.quantity(south, self.products[1]), 10)
+    
+    def test_insufficient_stock_changes_nothing(self):
+        north, south = self.shops
+        transfer = self.approved_transfer(north, south, self.products[0], 101)
+        
+        with self.assertRaises(InsufficientStock):
+            complete_transfer(transfer.pk, self.admin)
+        
+        transfer.refresh_from_db()
+        self.assertEqual(transfer.status, 'approved')
+        self.assertEqual(self.quantity(north, self.products[0]), 100)
+        self.assertEqual(self.quantity(south, self.products[0]), 100)
+        self.assertFalse(StockHistory.objects.filter(reference_id=transfer.pk).exists())
+    
+    def test_completes_only_once(self):
+        north, south = self.shops
+        transfer = self.approved_transfer(north, south, self.products[0], 10)
+        complete_transfer(transfer.pk, self.admin)
+        
+        with self.assertRaises(TransferError):
+            complete_transfer(transfer.pk, self.admin)
+        
+        self.assertEqual(self.quantity(north, self.products[0]), 90)
+
+
+
+class TransitionTests(TransferFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        north, south = self.shops
+        self.transfer = StockTransfer.objects.create(
+            from_shop=north, to_shop=south, product=self.products[0], quantity=5, requested_by=self.admin
+        )
+    
+    def test_applies_status_and_fields(self):
+        transition(self.transfer, 'approve', approved_by=self.admin)
+        
+        self.transfer.refresh_from_db()
+        self.assertEqual(self.transfer.status, 'approved')
+        self.assertEqual(self.transfer.approved_by, self.admin)
+    
+    def test_stale_instance_conflicts(self):
+        stale = StockTransfer.objects.get(pk=self.transfer.pk)
+        transition(self.transfer, 'cancel')
+        
+        with self.assertRaises(TransitionConflict):
+            transition(stale, 'approve', approved_by=self.admin)
+        
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'cancelled')
+        self.assertIsNone(stale.approved_by)
+    
+    def test_conflict_is_reported_as_409(self):
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        stale = StockTransfer.objects.get(pk=self.transfer.pk)
+        transition(self.transfer, 'reject', approved_by=self.admin)
+        
+        # The view read the transfer while it was still pending
+        with patch('apps.transfers.views.TransferApproveView.get_object', return_value=stale):
+            response = api.post(f'/api/transfers/{stale.pk}/approve/')
+        
+        self.assertEqual(response.status_code, 409)
+
+
+class CompleteBatchTests(TransferFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        north, south = self.shops
+        self.batch = TransferBatch.objects.create(
+            from_shop=north, to_shop=south, status='approved', requested_by=self.admin
+        )
+    
+    def add_line(self, product, quantity):
+        return StockTransfer.objects.create(
+            batch=self.batch,
+            from_shop=self.batch.from_shop,
+            to_shop=self.batch.to_shop,
+            product=product,
+            quantity=quantity,
+            status='approved',
+            requested_by=self.admin,
+        )
+    
+    def test_moves_every_line(self):
+        north, south = self.shops
+        lines = [self.add_line(self.products[0], 10), self.add_line(self.products[1], 25)]
+        
+        complete_batch(self.batch.pk, self.admin)
+        
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.status, 'completed')
+        self.assertEqual(set(self.batch.lines.values_list('status', flat=True)), {'completed'})
+        self.assertEqual(self.quantity(north, self.products[0]), 90)
+        self.assertEqual(self.quantity(south, self.products[1]), 125)
+        self.assertEqual(StockHistory.objects.filter(reference_id__in=[line.pk for line in lines]).count(), 4)
+    
+    def test_short_line_moves_nothing(self):
+        north, south = self.shops
+        self.add_line(self.products[0], 10)
+        self.add_line(self.products[1], 500)
+        
+        with self.assertRaises(InsufficientStock):
+            complete_batch(self.batch.pk, self.admin)
+        
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.status, 'approved')
+        self.assertEqual(self.quantity(north, self.products[0]), 100)
+        self.assertFalse(StockHistory.objects.exists())
+
+
+class BatchActionTests(TransferFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        north, south = self.shops
+        self.manager = User.objects.create_user('manager', password='x', role='sales_manager', shop=north)
+        self.batch = TransferBatch.objects.create(from_shop=north, to_shop=south, requested_by=self.manager)
+        for product in self.products:
+            StockTransfer.objects.create(
+                batch=self.batch, from_shop=north, to_shop=south, product=product, quantity=5,
+                requested_by=self.manager,
+            )
+        self.api = APIClient()
+    
+    def post(self, user, action):
+        self.api.force_authenticate(user)
+        return self.api.post(f'/api/transfers/batches/{self.batch.pk}/{action}/')
+    
+    def statuses(self):
+        self.batch.refresh_from_db()
+        return self.batch.status, set(self.batch.lines.values_list('status', flat=True))
+    
+    def test_admin_rejects_batch_and_lines(self):
+        response = self.post(self.admin, 'reject')
+        
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.statuses(), ('rejected', {'rejected'}))
+        self.assertEqual(set(self.batch.lines.values_list('approved_by', flat=True)), {self.admin.pk})
+    
+    def test_only_pending_batches_can_be_rejected(self):
+        self.post(self.admin, 'approve')
+        
+        response = self.post(self.admin, 'reject')
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.statuses(), ('approved', {'approved'}))
+        self.assertEqual(self.post(self.manager, 'reject').status_code, 403)
+    
+    def test_requester_cancels_batch_and_lines(self):
+        response = self.post(self.manager, 'cancel')
+        
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.statuses(), ('cancelled', {'cancelled'}))
+        # Nothing left to act on
+        self.assertEqual(self.post(self.admin, 'approve').status_code, 400)
+    
+    def test_other_managers_cannot_cancel(self):
+        other = User.objects.create_user('other', password='x', role='sales_manager', shop=self.shops[1])
+        
+        self.assertEqual(self.post(other, 'cancel').status_code, 403)
+        self.assertEqual(self.statuses(), ('pending', {'pending'}))
+    
+    def test_conflict_is_reported_as_409(self):
+        stale = TransferBatch.objects.get(pk=self.batch.pk)
+        self.post(self.admin, 'approve')
+        
+        # The views read the batch while it was still pending
+        for view, action, user in [
+            ('TransferBatchRejectView', 'reject', self.admin),
+            ('TransferBatchCancelView', 'cancel', self.manager),
+        ]:
+            with patch(f'apps.transfers.views.{view}.get_object', return_value=stale):
+                response = self.post(user, action)
+            
+            self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.statuses(), ('approved', {'approved'}))
+
+
+def stock_levels(shop, product, quantity, min_threshold, max_capacity=None):
+    """Planner input arrays from one list per column"""
+    return {
+        'shop': np.array(shop, dtype=np.int64),
+        'product': np.array(product, dtype=np.int64),
+        'quantity': np.array(quantity, dtype=np.int64),
+        'min_threshold': np.array(min_threshold, dtype=np.int64),
+        'max_capacity': np.array(max_capacity or [-1] * len(shop), dtype=np.int64),
+    }
+
+
+def routes(transfers):
+    return [(t['from_shop'], t['to_shop'], t['product'], t['quantity']) for t in transfers]
+
+
+class RebalancePlannerTests(TestCase):
+    """plan_rebalancing on hand-built stock arrays; targets are 15 for a threshold of 10"""
+    
+    def test_largest_donors_cover_largest_receivers(self):
+        levels = stock_levels([1, 2, 3, 4], [7, 7, 7, 7], [0, 30, 4, 25], [10, 10, 10, 10])
+        
+        transfers, summary = plan_rebalancing(levels)
+        
+        self.assertEqual(routes(transfers), [(2, 1, 7, 15), (4, 3, 7, 10)])
+        self.assertEqual(
+            (summary['rows_below_threshold'], summary['units_needed'], summary['units_moved'], summary['units_short']),
+            (2, 26, 25, 1)
+        )
+    
+    def test_one_donor_is_split_across_receivers(self):
+        levels = stock_levels([1, 2, 3, 1, 2], [7, 7, 7, 8, 8], [0, 40, 4, 20, 11], [10, 10, 10, 10, 10])
+        
+        transfers, summary = plan_rebalancing(levels)
+        
+        # Product 8 is above its threshold everywhere
+        self.assertEqual(routes(transfers), [(2, 1, 7, 15), (2, 3, 7, 10)])
+        self.assertEqual(summary['transfers'], 2)
+    
+    def test_in_flight_units_are_netted(self):
+        levels = stock_levels([1, 2], [7, 7], [0, 40], [10, 10])
+        
+        transfers, _ = plan_rebalancing(levels, np.array([10, -10]))
+        
+        self.assertEqual(routes(transfers), [(2, 1, 7, 5)])
+        self.assertEqual(plan_rebalancing(levels, np.array([15, -15]))[0], [])
+    
+    def test_margin_and_capacity_set_the_target(self):
+        levels = stock_levels([1, 2, 3], [7, 7, 7], [0, 0, 45], [10, 10, 10], [12, -1, -1])
+        
+        transfers, _ = plan_rebalancing(levels, margin=0)
+        
+        # Threshold + 1 without a margin, capped at 12 for shop 1
+        self.assertEqual(routes(transfers), [(3, 1, 7, 11), (3, 2, 7, 11)])
+        self.assertEqual(routes(plan_rebalancing(levels)[0]), [(3, 1, 7, 12), (3, 2, 7, 15)])
+
+
+class RebalancePlanViewTests(TransferFixtureMixin, TestCase):
+    URL = '/api/transfers/rebalance/'
+    
+    def setUp(self):
+        self.create_fixtures()
+        self.dairy = Category.objects.create(name='Dairy')
+        Product.objects.filter(pk=self.products[0].pk).update(category=self.dairy)
+        north, south = self.shops
+        # North is short of both products (targets are 8 for a threshold of 5)
+        for product in self.products:
+            Stock.objects.filter(shop=north, product=product).update(quantity=1)
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+    
+    def plan(self, **params):
+        response = self.api.get(self.URL, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+    
+    def test_preview_matches_senders_and_receivers(self):
+        north, south = (shop.id for shop in self.shops)
+        
+        data = self.plan()
+        
+        self.assertEqual(routes(data['transfers']), [(south, north, self.products[0].id, 7), (south, north, self.products[1].id, 7)])
+        self.assertEqual(data['summary']['units_moved'], 14)
+    
+    def test_category_filter_and_limit(self):
+        self.assertEqual([t['product'] for t in self.plan(category_id=self.dairy.id)['transfers']], [self.products[0].id])
+        
+        data = self.plan(limit=1)
+        
+        self.assertEqual(len(data['transfers']), 1)
+        self.assertEqual(data['summary']['transfers'], 2)
+    
+    def test_pending_transfers_are_not_planned_twice(self):
+        self.assertEqual(self.api.post(self.URL).status_code, 201)
+        
+        data = self.plan()
+        
+        self.assertEqual(data['transfers'], [])
+        self.assertEqual(set(StockTransfer.objects.values_list('status', flat=True)), {'pending'})
+    
+    def test_rejects_bad_parameters_and_non_admins(self):
+        for params in [{'margin': 'nan'}, {'margin': 'inf'}, {'margin': '-1'}, {'limit': '-1'}, {'shop_ids': 'x'}]:
+            self.assertEqual(self.api.get(self.URL, params).status_code, 400, params)
+        
+        manager = User.objects.create_user('manager', password='x', role='sales_manager', shop=self.shops[0])
+        self.api.force_authenticate(manager)
+        self.assertEqual(self.api.get(self.URL).status_code, 403)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs row-level locking (PostgreSQL)')
+class ConcurrentTransferTests(TransferFixtureMixin, TransactionTestCase):
+    """
+    Stress completions from many threads at once, each with its own connection
+    
+    Transfers run in both directions between the same rows, which deadlocks
+    without a fixed lock order, and more stock is requested than exists, so
+    the no-negative-stock guard is exercised under contention.
+    """
+    workers = 8
+    
+    def setUp(self):
+        self.create_fixtures(quantity=50)
+    
+    def run_concurrently(self, transfer_ids):
+        def complete(transfer_id):
+            try:
+                complete_transfer(transfer_id, self.admin)
+                return True
+            except TransferError:
+                return False
+            finally:
+                connection.close()
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(complete, transfer_ids))
+    
+    def test_concurrent_transfers_conserve_stock(self):
+        north, south = self.shops
+        transfers = []
+        for i in range(40):
+            product = self.products[i % 2]
+            from_shop, to_shop = (north, south) if i % 4 < 3 else (south, north)
+            transfers.append(self.approved_transfer(from_shop, to_shop, product, 5))
+        
+        results = self.run_concurrently([transfer.pk for transfer in transfers])
+        
+        completed = StockTransfer.objects.filter(status='completed')
+        self.assertEqual(completed.count(), sum(results))
+        for product in self.products:
+            stocks = Stock.objects.filter(product=product)
+            # Nothing created or lost, and no shop below zero
+            self.assertEqual(stocks.aggregate(total=Sum('quantity'))['total'], 100)
+            self.assertFalse(stocks.filter(quantity__lt=0).exists())
+            for stock in stocks:
+                # Every change is in the ledger
+                change = StockHistory.objects.filter(stock=stock).aggregate(total=Sum('change'))['total'] or 0
+                self.assertEqual(stock.quantity, 50 + change)
+    
+    def test_concurrent_completions_of_one_transfer_move_stock_once(self):
+        north, south = self.shops
+        transfer = self.approved_transfer(north, south, self.products[0], 20)
+        
+        results = self.run_concurrently([transfer.pk] * self.workers)
+        
+        self.assertEqual(sum(results), 1)
+        self.assertEqual(self.quantity(north, self.products[0]), 30)
+        self.assertEqual(self.quantity(south, self.products[0]), 70)
+    
+    def test_concurrent_actions_on_one_transfer_apply_once(self):
+        north, south = self.shops
+        transfer = StockTransfer.objects.create(
+            from_shop=north, to_shop=south, product=self.products[0], quantity=5, requested_by=self.admin
+        )
+        actions = ['approve', 'cancel', 'reject'] * 3
+        
+        def act(action):
+            # Every worker starts from the same pending snapshot
+            snapshot = StockTransfer.objects.get(pk=transfer.pk)
+            try:
+                transition(snapshot, action)
+                return action
+            except TransitionConflict:
+                return None
+            finally:
+                connection.close()
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            applied = [action for action in executor.map(act, actions) if action]
+        
+        self.assertEqual(len(applied), 1)
+        transfer.refresh_from_db()
+        self.assertEqual(transfer.status, TRANSITIONS[applied[0]][1])
+
+
+class TransferListingQueryTests(TransferFixtureMixin, TestCase):
+    """The sales manager's listing: one query, answered from the shop indexes"""
+    
+    def setUp(self):
+        self.create_fixtures()
+        north, south = self.shops
+        west = Shop.objects.create(name='West', address='3 West Road')
+        self.manager = User.objects.create_user('manager', password='x', role='sales_manager', shop=north)
+        self.involved = [
+            self.approved_transfer(north, south, self.products[0], 5).pk,
+            self.approved_transfer(south, north, self.products[1], 5).pk,
+            self.approved_transfer(west, north, self.products[0], 5).pk,
+        ]
+        self.approved_transfer(south, west, self.products[0], 5)
+        self.api = APIClient()
+        self.api.force_authenticate(self.manager)
+    
+    def test_lists_transfers_involving_own_shop_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.api.get('/api/transfers/')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([transfer['id'] for transfer in response.json()], self.involved[::-1])
+    
+    @skipUnless(connection.vendor == 'postgresql', 'EXPLAIN output is PostgreSQL specific')
+    def test_shop_filter_uses_both_shop_indexes(self):
+        queryset = StockTransfer.objects.involving_shop(self.shops[0]).filter(
+            status='pending'
+        ).order_by('-requested_at', '-id')
+        with connection.cursor() as cursor:
+            # The fixture table is tiny; rule out the sequential scan it would get
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        
+        plan = queryset.explain()
+        
+        self.assertIn('transfers_from_status_idx', plan)
+        self.assertIn('transfers_to_status_idx', plan)
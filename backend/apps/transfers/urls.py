@@ -8,7 +8,14 @@ from .views import (
     TransferApproveView,
     TransferRejectView,
     TransferCompleteView,
-    TransferCancelView
+    TransferCancelView,
+    TransferBatchListCreateView,
+    TransferBatchRetrieveView,
+    TransferBatchApproveView,
+    TransferBatchRejectView,
+    TransferBatchCancelView,
+    TransferBatchCompleteView,
+    RebalancePlanView,
 )
 
 app_name = 'transfers'
@@ -31,5 +38,16 @@ urlpatterns = [
     
     # Cancel transfer
     path('<int:pk>/cancel/', TransferCancelView.as_view(), name='transfer-cancel'),
+    
+    # Multi-product transfer batches
+    path('batches/', TransferBatchListCreateView.as_view(), name='batch-list-create'),
+    path('batches/<int:pk>/', TransferBatchRetrieveView.as_view(), name='batch-retrieve'),
+    path('batches/<int:pk>/approve/', TransferBatchApproveView.as_view(), name='batch-approve'),
+    path('batches/<int:pk>/reject/', TransferBatchRejectView.as_view(), name='batch-reject'),
+    path('batches/<int:pk>/complete/', TransferBatchCompleteView.as_view(), name='batch-complete'),
+    path('batches/<int:pk>/cancel/', TransferBatchCancelView.as_view(), name='batch-cancel'),
+    
+    # Rebalancing planner
+    path('rebalance/', RebalancePlanView.as_view(), name='rebalance'),
 ]
 
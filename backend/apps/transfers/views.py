@@ -1,21 +1,25 @@
 """
 Views for transfers app using Class-Based Views and Generic Views
 """
+import math
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.viewsets import ModelViewSet
 from django.db import transaction
+from django.db.models import Prefetch
 from django.utils import timezone
-from .models import StockTransfer
+from .models import StockTransfer, TransferBatch
 from .serializers import (
     StockTransferSerializer,
     StockTransferCreateSerializer,
-    StockTransferActionSerializer
+    StockTransferActionSerializer,
+    TransferBatchSerializer
 )
 from .permissions import CanRequestTransfer, CanManageTransfer, CanCancelTransfer
-from apps.inventory.models import Stock
+from .execution import TransferError, TransitionConflict, transition, complete_transfer, complete_batch
+from supermarket_analysis.pagination import TransferPagination, TransferBatchPagination
 
 
 class TransferListCreateView(generics.ListCreateAPIView):
@@ -29,6 +33,7 @@ class TransferListCreateView(generics.ListCreateAPIView):
         'from_shop', 'to_shop', 'product', 'requested_by', 'approved_by'
     ).all()
     permission_classes = [IsAuthenticated]
+    pagination_class = TransferPagination
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -51,11 +56,7 @@ class TransferListCreateView(generics.ListCreateAPIView):
         
         # Sales Manager can only see transfers involving their shop
         if self.request.user.role == 'sales_manager' and self.request.user.shop:
-            queryset = queryset.filter(
-                from_shop=self.request.user.shop
-            ) | queryset.filter(
-                to_shop=self.request.user.shop
-            )
+            queryset = queryset.involving_shop(self.request.user.shop)
         
         # Filter by status
         status_filter = self.request.query_params.get('status', None)
@@ -82,7 +83,7 @@ class TransferListCreateView(generics.ListCreateAPIView):
         if requested_by_id:
             queryset = queryset.filter(requested_by_id=requested_by_id)
         
-        return queryset.order_by('-requested_at')
+        return queryset.order_by('-requested_at', '-id')
     
     def create(self, request, *args, **kwargs):
         """
@@ -144,10 +145,13 @@ class TransferApproveView(generics.GenericAPIView):
         )
         
         if serializer.is_valid():
-            transfer.status = 'approved'
-            transfer.approved_by = request.user
-            transfer.approved_at = timezone.now()
-            transfer.save()
+            try:
+                transition(transfer, 'approve', approved_by=request.user, approved_at=timezone.now())
+            except TransitionConflict as e:
+                return Response(
+                    {'error': str(e)},
+                    status=status.HTTP_409_CONFLICT
+                )
             
             return Response(
                 StockTransferSerializer(transfer).data,
@@ -187,10 +191,13 @@ class TransferRejectView(generics.GenericAPIView):
         )
         
         if serializer.is_valid():
-            transfer.status = 'rejected'
-            transfer.approved_by = request.user
-            transfer.approved_at = timezone.now()
-            transfer.save()
+            try:
+                transition(transfer, 'reject', approved_by=request.user, approved_at=timezone.now())
+            except TransitionConflict as e:
+                return Response(
+                    {'error': str(e)},
+                    status=status.HTTP_409_CONFLICT
+                )
             
             return Response(
                 StockTransferSerializer(transfer).data,
@@ -231,56 +238,27 @@ class TransferCompleteView(generics.GenericAPIView):
         
         if serializer.is_valid():
             try:
-                with transaction.atomic():
-                    # Get source stock
-                    from_stock, created = Stock.objects.get_or_create(
-                        shop=transfer.from_shop,
-                        product=transfer.product,
-                        defaults={'quantity': 0}
-                    )
-                    
-                    # Check stock availability
-                    if from_stock.quantity < transfer.quantity:
-                        return Response(
-                            {'error': f'Insufficient stock. Available: {from_stock.quantity}, Required: {transfer.quantity}'},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                    
-                    # Reduce stock from source shop
-                    from_stock.quantity -= transfer.quantity
-                    from_stock.save()
-                    
-                    # Check and create alerts for source shop
-                    from apps.analytics.alerts import create_low_stock_alert
-                    create_low_stock_alert(from_stock)
-                    
-                    # Get or create destination stock
-                    to_stock, created = Stock.objects.get_or_create(
-                        shop=transfer.to_shop,
-                        product=transfer.product,
-                        defaults={'quantity': 0}
-                    )
-                    
-                    # Add stock to destination shop
-                    to_stock.quantity += transfer.quantity
-                    to_stock.save()
-                    
-                    # Note: No alert needed for destination shop (stock increased)
-                    
-                    # Update transfer status
-                    transfer.status = 'completed'
-                    transfer.completed_at = timezone.now()
-                    transfer.save()
-                
+                transfer = complete_transfer(transfer.pk, request.user)
+            except TransitionConflict as e:
+                return Response(
+                    {'error': str(e)},
+                    status=status.HTTP_409_CONFLICT
+                )
+            except TransferError as e:
                 return Response(
-                    StockTransferSerializer(transfer).data,
-                    status=status.HTTP_200_OK
+                    {'error': str(e)},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
             except Exception as e:
                 return Response(
                     {'error': f'Error completing transfer: {str(e)}'},
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
+            
+            return Response(
+                StockTransferSerializer(transfer).data,
+                status=status.HTTP_200_OK
+            )
         
         return Response(
             serializer.errors,
@@ -315,8 +293,13 @@ class TransferCancelView(generics.GenericAPIView):
         )
         
         if serializer.is_valid():
-            transfer.status = 'cancelled'
-            transfer.save()
+            try:
+                transition(transfer, 'cancel')
+            except TransitionConflict as e:
+                return Response(
+                    {'error': str(e)},
+                    status=status.HTTP_409_CONFLICT
+                )
             
             return Response(
                 StockTransferSerializer(transfer).data,
@@ -327,3 +310,258 @@ class TransferCancelView(generics.GenericAPIView):
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+
+def get_batch_queryset():
+    return TransferBatch.objects.select_related(
+        'from_shop', 'to_shop', 'requested_by', 'approved_by'
+    ).prefetch_related(
+        Prefetch('lines', queryset=StockTransfer.objects.select_related('product').order_by('id'))
+    )
+
+
+class TransferBatchListCreateView(generics.ListCreateAPIView):
+    """
+    List transfer batches or request a multi-product transfer
+    
+    GET /api/transfers/batches/ - List batches (all authenticated users)
+    POST /api/transfers/batches/ - Request a batch (sales_manager/admin only)
+    """
+    serializer_class = TransferBatchSerializer
+    pagination_class = TransferBatchPagination
+    
+    def get_permissions(self):
+        """Set permissions based on request method"""
+        if self.request.method == 'POST':
+            return [IsAuthenticated(), CanRequestTransfer()]
+        return [IsAuthenticated()]
+    
+    def get_queryset(self):
+        queryset = get_batch_queryset()
+        
+        # Sales Manager can only see batches involving their shop
+        if self.request.user.role == 'sales_manager' and self.request.user.shop:
+            queryset = queryset.filter(
+                from_shop=self.request.user.shop
+            ) | queryset.filter(
+                to_shop=self.request.user.shop
+            )
+        
+        status_filter = self.request.query_params.get('status', None)
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        
+        return queryset.order_by('-requested_at', '-id')
+    
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data, context={'request': request})
+        
+        if serializer.is_valid():
+            batch = serializer.save()
+            return Response(
+                TransferBatchSerializer(get_batch_queryset().get(pk=batch.pk)).data,
+                status=status.HTTP_201_CREATED
+            )
+        
+        return Response(
+            serializer.errors,
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+
+class TransferBatchRetrieveView(generics.RetrieveAPIView):
+    """
+    GET /api/transfers/batches/{id}/ - Batch with its lines
+    """
+    serializer_class = TransferBatchSerializer
+    permission_classes = [IsAuthenticated, CanManageTransfer]
+    lookup_field = 'pk'
+    
+    def get_queryset(self):
+        return get_batch_queryset()
+
+
+class TransferBatchApproveView(generics.GenericAPIView):
+    """
+    Approve a transfer batch and all its lines
+    
+    POST /api/transfers/batches/{id}/approve/ - Approve batch (admin only)
+    """
+    queryset = TransferBatch.objects.all()
+    permission_classes = [IsAuthenticated, CanManageTransfer]
+    lookup_field = 'pk'
+    
+    def post(self, request, pk):
+        batch = self.get_object()
+        if not batch.can_be_approved():
+            return Response(
+                {'error': 'Batch can only be approved if it is pending.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                transition(batch, 'approve', approved_by=request.user, approved_at=now)
+                batch.lines.update(status='approved', approved_by=request.user, approved_at=now, updated_at=now)
+        except TransitionConflict as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        return Response(TransferBatchSerializer(get_batch_queryset().get(pk=batch.pk)).data)
+
+
+class TransferBatchRejectView(generics.GenericAPIView):
+    """
+    Reject a pending transfer batch and all its lines
+    
+    POST /api/transfers/batches/{id}/reject/ - Reject batch (admin only)
+    """
+    queryset = TransferBatch.objects.all()
+    permission_classes = [IsAuthenticated, CanManageTransfer]
+    lookup_field = 'pk'
+    
+    def post(self, request, pk):
+        batch = self.get_object()
+        if not batch.can_be_rejected():
+            return Response(
+                {'error': 'Batch can only be rejected if it is pending.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                transition(batch, 'reject', approved_by=request.user, approved_at=now)
+                batch.lines.update(status='rejected', approved_by=request.user, approved_at=now, updated_at=now)
+        except TransitionConflict as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        return Response(TransferBatchSerializer(get_batch_queryset().get(pk=batch.pk)).data)
+
+
+class TransferBatchCancelView(generics.GenericAPIView):
+    """
+    Cancel a pending transfer batch and all its lines
+    
+    POST /api/transfers/batches/{id}/cancel/ - Cancel batch (sales_manager/admin)
+    """
+    queryset = TransferBatch.objects.all()
+    permission_classes = [IsAuthenticated, CanCancelTransfer]
+    lookup_field = 'pk'
+    
+    def post(self, request, pk):
+        # CanCancelTransfer only lets pending batches through
+        batch = self.get_object()
+        
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                transition(batch, 'cancel')
+                batch.lines.update(status='cancelled', updated_at=now)
+        except TransitionConflict as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        return Response(TransferBatchSerializer(get_batch_queryset().get(pk=batch.pk)).data)
+
+
+class TransferBatchCompleteView(generics.GenericAPIView):
+    """
+    Move the stock of every line of an approved batch in one transaction
+    
+    POST /api/transfers/batches/{id}/complete/ - Complete batch (admin only)
+    """
+    queryset = TransferBatch.objects.all()
+    permission_classes = [IsAuthenticated, CanManageTransfer]
+    lookup_field = 'pk'
+    
+    def post(self, request, pk):
+        batch = self.get_object()
+        if not batch.can_be_completed():
+            return Response(
+                {'error': 'Batch can only be completed if it is approved.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            complete_batch(batch.pk, request.user)
+        except TransitionConflict as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_409_CONFLICT
+            )
+        except TransferError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(TransferBatchSerializer(get_batch_queryset().get(pk=batch.pk)).data)
+
+
+class RebalancePlanView(generics.GenericAPIView):
+    """
+    Plan transfers that cover low stock from shops with surplus
+    
+    GET /api/transfers/rebalance/?shop_ids=1,2&category_id=3&margin=0.5&limit=500 - Preview the plan (admin only)
+    POST /api/transfers/rebalance/ (same parameters) - Save it as pending batches, one per shop pair (admin only)
+    """
+    permission_classes = [IsAuthenticated]
+    
+    # Transfers listed in a preview unless ?limit is given
+    preview_limit = 500
+    
+    def get_plan(self, request):
+        from .rebalancing import DEFAULT_MARGIN, load_stock_levels, in_flight_quantities, plan_rebalancing
+        
+        params = request.query_params
+        shop_ids = [int(shop_id) for shop_id in params.get('shop_ids', '').split(',') if shop_id.strip()]
+        margin = float(params.get('margin', DEFAULT_MARGIN))
+        # float() also parses 'nan' and 'inf', which would poison every target
+        if not math.isfinite(margin) or margin < 0:
+            raise ValueError(margin)
+        
+        levels = load_stock_levels(shop_ids=shop_ids, category_id=params.get('category_id', None))
+        return plan_rebalancing(levels, in_flight_quantities(levels), margin=margin)
+    
+    def handle(self, request, save):
+        if request.user.role != 'admin':
+            return Response(
+                {'error': 'Only admin can plan rebalancing transfers.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        try:
+            limit = int(request.query_params.get('limit', self.preview_limit))
+            if limit < 0:
+                raise ValueError(limit)
+            transfers, summary = self.get_plan(request)
+        except ValueError:
+            return Response(
+                {'error': 'shop_ids and limit must be whole numbers and margin a non-negative number.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not save:
+            return Response({'summary': summary, 'transfers': transfers[:limit]})
+        
+        from .rebalancing import create_planned_batches
+        batches = create_planned_batches(transfers, request.user)
+        return Response(
+            {'summary': summary, 'batches': [batch.id for batch in batches]},
+            status=status.HTTP_201_CREATED
+        )
+    
+    def get(self, request):
+        return self.handle(request, save=False)
+    
+    def post(self, request):
+        return self.handle(request, save=True)
@@ -0,0 +1,72 @@
+"""
+Cursor (keyset) pagination classes shared by the list endpoints
+"""
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination on a stable, indexed ordering
+    
+    Pages are fetched with a WHERE on the first ordering column instead of
+    an OFFSET scan, so every page costs the same at any depth.
+    
+    Unless PAGINATE_BY_DEFAULT is set, pagination is opt-in: responses are
+    only paginated when the client sends ?cursor= or ?page_size=, so
+    existing callers still receive a plain (unbounded) list. With the
+    setting on, every response is a page of at most max_page_size rows.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('-id',)
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            not settings.PAGINATE_BY_DEFAULT and
+            self.cursor_query_param not in request.query_params and
+            self.page_size_query_param not in request.query_params
+        ):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class SalePagination(KeysetPagination):
+    """Newest sales first (sales_txn_date_id_idx)"""
+    ordering = ('-transaction_date', '-id')
+
+
+class AlertPagination(KeysetPagination):
+    """Newest alerts first (alerts_created_id_idx)"""
+    ordering = ('-created_at', '-id')
+
+
+class TransferPagination(KeysetPagination):
+    """Newest transfer requests first (transfers_requested_id_idx)"""
+    ordering = ('-requested_at', '-id')
+
+
+class TransferBatchPagination(KeysetPagination):
+    """Newest transfer batches first (transfer_batches_requested_idx)"""
+    ordering = ('-requested_at', '-id')
+
+
+class UserPagination(KeysetPagination):
+    """Newest users first (users_created_id_idx)"""
+    ordering = ('-created_at', '-id')
+
+
+class ProductPagination(KeysetPagination):
+    """Products by name (products_name_id_idx)"""
+    ordering = ('name', 'id')
+
+
+class StockPagination(KeysetPagination):
+    """Stock records by primary key"""
+    ordering = ('id',)
+
+
+class StockHistoryPagination(KeysetPagination):
+    """Newest stock movements first (stock_history_stock_time_idx)"""
+    ordering = ('-created_at', '-id')
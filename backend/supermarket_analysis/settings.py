@@ -144,6 +144,46 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Caches
+# The report cache (apps/sales/report_cache.py) is process-local by default;
+# set REPORT_CACHE_BACKEND=file to share it between worker processes.
+REPORT_CACHE_BACKEND = os.getenv('REPORT_CACHE_BACKEND', 'locmem')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'reports': {
+        'BACKEND': (
+            'django.core.cache.backends.filebased.FileBasedCache'
+            if REPORT_CACHE_BACKEND == 'file'
+            else 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('REPORT_CACHE_LOCATION', str(BASE_DIR / 'cache' / 'reports')),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('REPORT_CACHE_MAX_ENTRIES', '5000')),
+        },
+    },
+    # Per-process stock quantities for availability lookups
+    'availability': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'availability',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('AVAILABILITY_CACHE_MAX_ENTRIES', '100000')),
+        },
+    },
+}
+
+# Seconds to keep reports whose date range ended before today
+REPORT_CACHE_CLOSED_TTL = int(os.getenv('REPORT_CACHE_CLOSED_TTL', str(60 * 60 * 24 * 7)))
+
+# Seconds to keep reports that include today (also dropped when the shop changes)
+REPORT_CACHE_OPEN_TTL = int(os.getenv('REPORT_CACHE_OPEN_TTL', '300'))
+
+# Seconds a cached stock quantity may be served (writes in this process drop it at once)
+AVAILABILITY_CACHE_TTL = int(os.getenv('AVAILABILITY_CACHE_TTL', '30'))
+
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
@@ -153,8 +193,17 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
+    # Cursor pagination, opt-in per request via ?cursor= or ?page_size=
+    # (always on with PAGINATE_BY_DEFAULT)
+    'DEFAULT_PAGINATION_CLASS': 'supermarket_analysis.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
 
+# Paginate list endpoints even without ?cursor= / ?page_size=. Off by default
+# because the current frontend expects plain lists; turn on once clients
+# follow `next` links, to bound every list response.
+PAGINATE_BY_DEFAULT = os.getenv('PAGINATE_BY_DEFAULT', 'False') == 'True'
+
 # JWT Settings
 from datetime import timedelta
 
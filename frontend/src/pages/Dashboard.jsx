@@ -94,42 +94,26 @@ export default function Dashboard() {
         }
       }
 
-      // Fetch data in parallel
-      const apiCalls = [
-        api.get('/shops/').catch(() => ({ data: [] })),
-        api.get('/products/categories/').catch(() => ({ data: [] })),
-        api.get('/products/').catch(() => ({ data: [] })),
-      ]
-
-      // Only fetch sales reports if not staff
-      if (!isStaff) {
-        apiCalls.push(api.get(`/sales/reports/?${params.toString()}`).catch(() => ({ data: null })))
-        apiCalls.push(api.get(`/sales/reports/payment-methods/?${params.toString()}`).catch(() => ({ data: { data: [] } })))
-        apiCalls.push(api.get(`/sales/reports/top-products/?${params.toString()}&limit=5`).catch(() => ({ data: { data: [] } })))
-      }
-
-      const results = await Promise.all(apiCalls)
-
-      const [shopsRes, categoriesRes, productsRes] = results
-      const salesRes = isStaff ? { data: null } : results[3]
-      const paymentRes = isStaff ? { data: { data: [] } } : results[4]
-      const topProductsRes = isStaff ? { data: { data: [] } } : results[5]
+      // One request returns counts, sales series, payment mix and top products
+      params.append('limit', '5')
+      const response = await api.get(`/analytics/dashboard/?${params.toString()}`)
+      const dashboard = response.data
 
-      setShopCount(shopsRes.data.length)
-      setCategoryCount(categoriesRes.data.length)
-      setProductCount(productsRes.data.length)
+      setShopCount(dashboard.counts?.shops || 0)
+      setCategoryCount(dashboard.counts?.categories || 0)
+      setProductCount(dashboard.counts?.products || 0)
 
-      if (salesRes.data) {
-        setSalesData(salesRes.data.data || [])
+      if (dashboard.sales) {
+        setSalesData(dashboard.sales.data || [])
         setSalesSummary({
-          total_revenue: salesRes.data.summary?.total_revenue || 0,
-          total_sales: salesRes.data.summary?.total_sales || 0,
-          average_sale: salesRes.data.summary?.average_sale || 0,
+          total_revenue: dashboard.sales.summary?.total_revenue || 0,
+          total_sales: dashboard.sales.summary?.total_sales || 0,
+          average_sale: dashboard.sales.summary?.average_sale || 0,
         })
       }
 
-      setPaymentData(paymentRes.data.data || [])
-      setTopProducts(topProductsRes.data.data || [])
+      setPaymentData(dashboard.payment_methods || [])
+      setTopProducts(dashboard.top_products || [])
     } catch (error) {
       console.error('Failed to fetch dashboard data:', error)
     } finally {
@@ -65,6 +65,8 @@ export default function Sales() {
       setLoading(true)
       let url = '/sales/'
       const params = new URLSearchParams()
+      // The list only shows item counts; line items are loaded per sale in the details view
+      params.append('include_items', 'false')
       
       if (filterShop !== 'all') {
         params.append('shop_id', filterShop)